@@ -26,10 +26,9 @@ func (m *MlPipeline) Download(
 	// +defaultPath="/"
 	src *dagger.Directory,
 ) *dagger.File {
+	// The registry only exists in the container, so the staging model is trained and selected first
 	container := m.Select(ctx, src).
-		WithExec([]string{"mlflow", "artifacts", "download", "-u", "models:/model@staging", "-d", "/tmp/model"}).
-		// Finds downloaded artifact
-		WithExec([]string{"bash", "-c", "cp /tmp/model/artifacts/*.pkl /tmp/model.pkl"})
+		WithExec([]string{"python", "itu_sdse_project/modeling/model_cache.py", "--output", "/tmp/model.pkl"})
 	return container.File("/tmp/model.pkl")
 }
 
@@ -73,6 +72,7 @@ func (m *MlPipeline) BuildEnv(
 	src *dagger.Directory,
 ) *dagger.Container {
 	pipCache := dag.CacheVolume("pip-cache")
+	stageCache := dag.CacheVolume("stage-cache")
 	opts := dagger.ContainerWithDirectoryOpts{
 		Exclude: []string{
 			".dagger/",
@@ -88,6 +88,9 @@ func (m *MlPipeline) BuildEnv(
 			".pytest_cache/",
 			"data/raw/raw_data.csv",
 			"mlruns/",
+			".stage_cache/",
+			".model_cache/",
+			"leaderboard.db",
 		},
 	}
 	return dag.
@@ -96,6 +99,7 @@ func (m *MlPipeline) BuildEnv(
 		WithDirectory("/app", src, opts).
 		WithWorkdir("/app").
 		WithMountedCache("/root/.cache/pip", pipCache).
+		WithMountedCache("/app/.stage_cache", stageCache).
 		WithExec([]string{"pip", "install", "-r", "requirements.txt"}).
 		WithExec([]string{"pip", "install", "dvc"}).
 		WithExec([]string{"dvc", "get", "https://github.com/Jeppe-T-K/itu-sdse-project-data", "raw_data.csv", "-o", "data/raw"})
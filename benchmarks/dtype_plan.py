@@ -0,0 +1,102 @@
+# Reports the in-memory size of every stage's data per artifact format, and checks that
+# models trained on the compact Parquet/Feather dtypes score the same as on CSV's float64
+
+import json
+from multiprocessing import get_context
+import os
+from pathlib import Path
+import runpy
+import tempfile
+
+from loguru import logger
+import typer
+
+from itu_sdse_project.synthetic import generate
+
+app = typer.Typer()
+
+PROJ_ROOT = Path(__file__).resolve().parents[1]
+FORMATS = ("csv", "parquet", "feather")
+
+
+def run(results):
+    """Runs the data stages and fits both families in the project of the environment."""
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.metrics import f1_score
+    from xgboost import XGBRFClassifier
+
+    from itu_sdse_project import features
+    from itu_sdse_project.config import TRACE_PATH
+    from itu_sdse_project.helpers import load_data
+
+    runpy.run_path(str(PROJ_ROOT / "data/interim/make_dataset.py"))["main"](force=True)
+    features.main(force=True)
+
+    scores = {}
+    models = {
+        "log_reg": ("float64", LogisticRegression(max_iter=1000)),
+        "xgboost": ("float32", XGBRFClassifier(random_state=42, max_depth=6, n_jobs=1)),
+    }
+    for family, (dtype, model) in models.items():
+        X_train, X_test, y_train, y_test = load_data(dtype=dtype)
+        model.fit(X_train, y_train.iloc[:, 0])
+        scores[family] = f1_score(y_test.iloc[:, 0], model.predict(X_test))
+
+    events = json.loads(TRACE_PATH.read_text().rstrip().rstrip(",") + "]")
+    memory = {
+        f"{event['name']}/{key.removesuffix('_mb')}": value
+        for event in events
+        for key, value in event["args"].items()
+        if key.endswith("_mb") and not key.startswith("peak_")
+    }
+    results.put((memory, scores))
+
+
+@app.command()
+def main(rows: int = 200_000, workdir: Path | None = None):
+    """
+    Runs `make_dataset.py`, `features.py` and `load_data` on `rows` synthetic raw leads
+    once per artifact format and reports the size of the frames each stage holds. Exits
+    non-zero if the F1-score of a model differs between the formats.
+    """
+    context = get_context("spawn")
+    memory, scores = {}, {}
+    with tempfile.TemporaryDirectory(prefix="dtype_plan_", dir=workdir) as directory:
+        raw_path = Path(directory) / "raw_data.csv"
+        generate(rows, raw_path)
+        for fmt in FORMATS:
+            root = Path(directory) / fmt
+            for subdir in ("data/raw", "data/interim", "data/processed"):
+                (root / subdir).mkdir(parents=True)
+            (root / "data/raw/raw_data.csv").symlink_to(raw_path)
+            # Read by config in the spawned process, which inherits the environment
+            os.environ["PROJ_ROOT"] = str(root)
+            os.environ["ARTIFACT_FORMAT"] = fmt
+            os.environ["PROFILE_TRACE"] = "1"
+
+            results = context.Queue()
+            process = context.Process(target=run, args=(results,))
+            process.start()
+            memory[fmt], scores[fmt] = results.get()
+            process.join()
+            if process.exitcode:
+                raise RuntimeError(f"Pipeline on {fmt} artifacts exited with {process.exitcode}")
+
+    logger.info("{:<26}{}", "MiB", "".join(f"{fmt:>10}" for fmt in FORMATS))
+    for frame in memory["csv"]:
+        sizes = "".join(f"{memory[fmt].get(frame, float('nan')):>10.1f}" for fmt in FORMATS)
+        logger.info("{:<26}{}", frame, sizes)
+    for family in scores["csv"]:
+        logger.info(
+            "{:<26}{}", f"{family} F1", "".join(f"{scores[fmt][family]:>10.4f}" for fmt in FORMATS)
+        )
+
+    changed = [fmt for fmt in FORMATS if scores[fmt] != scores["csv"]]
+    if changed:
+        logger.error("F1-scores on {} artifacts differ from CSV", changed)
+        raise typer.Exit(code=1)
+    logger.success("F1-scores are the same for every artifact format")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,87 @@
+# Compares the per-column dummy encoding features.py used to run with LeadPreprocessor.encode
+
+import time
+import tracemalloc
+
+from loguru import logger
+import numpy as np
+import pandas as pd
+import typer
+
+from itu_sdse_project.config import RANDOM_STATE
+from itu_sdse_project.helpers import create_dummy_cols
+from itu_sdse_project.preprocessing import CAT_COLS, LeadPreprocessor
+
+app = typer.Typer()
+
+
+def make_cleaned_data(rows: int, cardinality: int) -> pd.DataFrame:
+    """Synthetic rows in the `cleaned_data` layout with `cardinality` sources and groups."""
+    rng = np.random.default_rng(RANDOM_STATE)
+    sources = np.array([f"source_{i}" for i in range(cardinality)], dtype=object)
+    return pd.DataFrame(
+        {
+            "lead_indicator": rng.integers(0, 2, rows).astype("float64"),
+            "purchases": rng.random(rows),
+            "time_spent": rng.random(rows),
+            "n_visits": rng.random(rows),
+            "customer_group": rng.integers(0, cardinality, rows),
+            "onboarding": rng.random(rows) < 0.5,
+            "bin_source": rng.choice(["group1", "socials"], rows),
+            "source": sources[rng.integers(0, cardinality, rows)],
+        }
+    )
+
+
+def legacy_encode(data: pd.DataFrame) -> pd.DataFrame:
+    cat_vars = data[CAT_COLS]
+    other_vars = data.drop(CAT_COLS, axis=1)
+    for col in cat_vars:
+        cat_vars[col] = cat_vars[col].astype("category")
+        cat_vars = create_dummy_cols(cat_vars, col)
+    data = pd.concat([other_vars, cat_vars], axis=1)
+    for col in data:
+        data[col] = data[col].astype("float64")
+    return data.drop(["lead_indicator"], axis=1)
+
+
+def measure(encode, data):
+    start = time.perf_counter()
+    encode(data)
+    elapsed = time.perf_counter() - start
+
+    # Tracing slows allocations down, so memory is measured in a separate run
+    tracemalloc.start()
+    X = encode(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    size = X.data.nbytes if hasattr(X, "nnz") else X.memory_usage(index=False).sum()
+    return elapsed, peak, size
+
+
+@app.command()
+def main(rows: list[int] = [100_000, 1_000_000], cardinality: int = 50):
+    logger.disable("itu_sdse_project")
+    for n in rows:
+        data = make_cleaned_data(n, cardinality)
+        preprocessor = LeadPreprocessor([], [], {}, {}, None).fit_encoding(data)
+        encoders = {
+            "legacy": legacy_encode,
+            "float64": preprocessor.encode,
+            "uint8": lambda d: preprocessor.encode(d, dummy_dtype="uint8"),
+            "sparse": preprocessor.encode_sparse,
+        }
+        for name, encode in encoders.items():
+            elapsed, peak, size = measure(encode, data)
+            logger.info(
+                "rows={:>9} {:>8}: {:7.3f}s, peak {:8.1f} MiB, result {:8.1f} MiB",
+                n,
+                name,
+                elapsed,
+                peak / 2**20,
+                size / 2**20,
+            )
+
+
+if __name__ == "__main__":
+    app()
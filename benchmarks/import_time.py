@@ -0,0 +1,98 @@
+# Measures the cold-start import time of every CLI entry point with `python -X importtime`
+
+import json
+from pathlib import Path
+import subprocess
+import sys
+import time
+
+from loguru import logger
+import typer
+
+app = typer.Typer()
+
+PROJ_ROOT = Path(__file__).resolve().parents[1]
+
+ENTRY_POINTS = {
+    "make_dataset": "data/interim/make_dataset.py",
+    "features": "itu_sdse_project/features.py",
+    "train": "itu_sdse_project/modeling/train.py",
+    "selection": "itu_sdse_project/modeling/selection.py",
+    "predict": "itu_sdse_project/modeling/predict.py",
+    "serve": "itu_sdse_project/modeling/serve.py",
+}
+
+
+def import_profile(script: str) -> tuple[float, float, list[tuple[float, str]]]:
+    """
+    Imports `script` without running its command in a fresh interpreter. Returns the wall
+    time of the process, the summed import time and the slowest top-level imports, in ms.
+    """
+    # run_path executes the module body under a name other than __main__, so app() is skipped
+    code = f"import runpy; runpy.run_path({str(PROJ_ROOT / script)!r})"
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=PROJ_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    wall = (time.perf_counter() - start) * 1000
+
+    total, top_level = 0.0, []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        total += int(self_us) / 1000
+        # Nested imports are indented below the module that triggered them
+        if not name[1:].startswith(" "):
+            top_level.append((int(cumulative_us) / 1000, name.strip()))
+    return wall, total, sorted(top_level, reverse=True)[:5]
+
+
+@app.command()
+def main(
+    repeats: int = 3,
+    output: Path | None = None,
+    baseline: Path | None = None,
+    tolerance: float = 0.25,
+):
+    """
+    Reports the best of `repeats` cold starts per entry point. With `baseline`, a JSON file
+    written by `--output`, exits non-zero when an entry point got slower than `tolerance`.
+    """
+    results = {}
+    for name, script in ENTRY_POINTS.items():
+        runs = [import_profile(script) for _ in range(repeats)]
+        wall, total, top_level = min(runs, key=lambda run: run[1])
+        results[name] = {"wall_ms": wall, "import_ms": total}
+        logger.info(
+            "{:>12}: imports {:7.1f} ms, process {:7.1f} ms, slowest: {}",
+            name,
+            total,
+            wall,
+            ", ".join(f"{module} {ms:.0f} ms" for ms, module in top_level),
+        )
+
+    if output:
+        output.write_text(json.dumps(results, indent=2))
+        logger.info("Wrote results to {}", output)
+
+    if baseline:
+        regressions = []
+        for name, reference in json.loads(baseline.read_text()).items():
+            current = results.get(name)
+            if current and current["import_ms"] > reference["import_ms"] * (1 + tolerance):
+                regressions.append(
+                    f"{name}: {reference['import_ms']:.0f} -> {current['import_ms']:.0f} ms"
+                )
+        if regressions:
+            logger.error("Import time regressed: {}", "; ".join(regressions))
+            raise typer.Exit(code=1)
+        logger.success("No import time regressions over {:.0%} against {}", tolerance, baseline)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,67 @@
+# Compares file size, save time and load time of the model pickles per MODEL_FORMAT
+
+import tempfile
+import time
+from pathlib import Path
+
+from loguru import logger
+import typer
+
+from encoding import make_cleaned_data
+from itu_sdse_project.modeling.artifacts import MODEL_FORMATS, load_model, save_model
+from itu_sdse_project.preprocessing import LABEL_COL, LeadPreprocessor
+
+app = typer.Typer()
+
+
+def fit_models(rows: int, cardinality: int) -> dict:
+    from sklearn.linear_model import LogisticRegression
+    from xgboost import XGBRFClassifier
+
+    data = make_cleaned_data(rows, cardinality)
+    preprocessor = LeadPreprocessor([], [], {}, {}, None).fit_encoding(data)
+    X, y = preprocessor.encode(data, dummy_dtype="uint8"), data[LABEL_COL]
+    return {
+        "log_reg": LogisticRegression(max_iter=20).fit(X, y),
+        "xgboost": XGBRFClassifier(n_estimators=100, max_depth=8, n_jobs=1).fit(X, y),
+    }
+
+
+def best_of(repeats: int, work) -> float:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        work()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+@app.command()
+def main(rows: int = 20_000, cardinality: int = 1_000, repeats: int = 5):
+    """
+    Fits both model families on `rows` synthetic leads with `cardinality` sources and
+    groups, which sets the number of logistic regression coefficients, and saves and loads
+    them in every model format. Times are the best of `repeats`.
+    """
+    logger.disable("itu_sdse_project")
+    models = fit_models(rows, cardinality)
+
+    logger.info("{:<10}{:<12}{:>10}{:>12}{:>12}", "model", "format", "MiB", "save ms", "load ms")
+    with tempfile.TemporaryDirectory(prefix="model_format_") as directory:
+        for family, model in models.items():
+            for fmt in MODEL_FORMATS:
+                path = Path(directory) / f"{family}_{fmt}.pkl"
+                save = best_of(repeats, lambda: save_model(model, path, fmt=fmt))
+                load = best_of(repeats, lambda: load_model(path))
+                logger.info(
+                    "{:<10}{:<12}{:>10.2f}{:>12.1f}{:>12.1f}",
+                    family,
+                    fmt,
+                    path.stat().st_size / 1024**2,
+                    save * 1000,
+                    load * 1000,
+                )
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,224 @@
+# Measures how every pipeline stage scales with the number of raw rows
+
+import json
+from multiprocessing import get_context
+import os
+from pathlib import Path
+import platform
+import runpy
+import tempfile
+
+from loguru import logger
+import pandas as pd
+import typer
+
+from itu_sdse_project.synthetic import generate
+
+app = typer.Typer()
+
+PROJ_ROOT = Path(__file__).resolve().parents[1]
+
+# Stages in pipeline order, with the stages whose outputs they read
+STAGES = {
+    "make_dataset": [],
+    "features": ["make_dataset"],
+    "load_data": ["features"],
+    "train_log_reg": ["features"],
+    "train_xgboost": ["features"],
+    "predict": ["train_log_reg"],
+}
+# Compared against a baseline, lower is better for both
+CHECKED_METRICS = ("wall_seconds", "peak_rss_mb")
+
+
+def _make_dataset(chunksize: int | None):
+    main = runpy.run_path(str(PROJ_ROOT / "data/interim/make_dataset.py"))["main"]
+    return lambda: main(chunksize=chunksize, force=True)
+
+
+def _features():
+    from itu_sdse_project import features
+
+    return lambda: features.main(force=True)
+
+
+def _load_data():
+    from itu_sdse_project.helpers import load_data
+
+    return load_data
+
+
+def _train(family: str, cores: int):
+    from itu_sdse_project.config import MODELS_DIR
+    from itu_sdse_project.modeling import train
+    from itu_sdse_project.modeling.artifacts import flush_logging
+
+    def run():
+        # Includes logging the run, which the command leaves to a background thread
+        if family == "xgboost":
+            train.xgboost(MODELS_DIR / "xgboost.pkl", cores=cores, force=True)
+        else:
+            train.log_reg(MODELS_DIR / "logreg.pkl", cores=cores, force=True)
+        flush_logging()
+
+    return run
+
+
+def _predict():
+    import joblib
+
+    from itu_sdse_project.config import MODELS_DIR, PROCESSED_DATA_DIR, RAW_DATA_DIR
+    from itu_sdse_project.modeling.wrapper import MLFlowWrapper
+
+    preprocessor = joblib.load(PROCESSED_DATA_DIR / "preprocessor.joblib")
+    schema = {name: "float64" for name in preprocessor.feature_names}
+    model = MLFlowWrapper(joblib.load(MODELS_DIR / "logreg.pkl"), preprocessor, schema)
+    raw = pd.read_csv(RAW_DATA_DIR / "raw_data.csv")
+    return lambda: model.predict(None, raw)
+
+
+def run_stage(stage: str, chunksize: int | None, cores: int, results):
+    """
+    Times one stage in a fresh process, since peak RSS only ever grows within one.
+    Imports and loading the inputs of `predict` happen before the clock starts.
+    """
+    from itu_sdse_project.modeling.scheduler import measure_usage
+
+    # Search workers inherit the descriptors, so their progress output lands here as well
+    with open(Path(os.environ["PROJ_ROOT"]) / f"{stage}.log", "w") as log:
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+        if stage == "make_dataset":
+            work = _make_dataset(chunksize)
+        elif stage == "features":
+            work = _features()
+        elif stage == "load_data":
+            work = _load_data()
+        elif stage == "predict":
+            work = _predict()
+        else:
+            work = _train(stage.removeprefix("train_"), cores)
+
+        with measure_usage(cores) as usage:
+            work()
+    results.put(usage)
+
+
+def required_stages(selected: list[str]) -> list[str]:
+    """`selected` plus every stage they depend on, in pipeline order."""
+    required, pending = set(), list(selected)
+    while pending:
+        stage = pending.pop()
+        if stage not in STAGES:
+            raise typer.BadParameter(f"Unknown stage '{stage}', use some of {list(STAGES)}")
+        if stage not in required:
+            required.add(stage)
+            pending.extend(STAGES[stage])
+    return [stage for stage in STAGES if stage in required]
+
+
+def find_regressions(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for stage, sizes in baseline["results"].items():
+        for rows, reference in sizes.items():
+            current = results.get(stage, {}).get(rows)
+            if current is None:
+                continue
+            for metric in CHECKED_METRICS:
+                if current[metric] > reference[metric] * (1 + tolerance):
+                    regressions.append(
+                        f"{stage} at {rows} rows: {metric} "
+                        f"{reference[metric]:.2f} -> {current[metric]:.2f}"
+                    )
+    return regressions
+
+
+@app.command()
+def main(
+    rows: list[int] = [10_000, 100_000, 1_000_000],
+    stages: list[str] = list(STAGES),
+    cores: int = os.cpu_count() or 1,
+    chunksize: int | None = None,
+    workdir: Path | None = None,
+    output: Path | None = None,
+    baseline: Path | None = None,
+    tolerance: float = 0.25,
+):
+    """
+    Runs the pipeline on `rows` synthetic raw leads per size and reports wall time,
+    throughput and peak memory of every stage in `stages`. Stages they depend on run too,
+    but are not reported. Every size runs in a scratch project under `workdir`, so the
+    data, models and MLflow store of this checkout are left untouched.
+
+    With `baseline`, a JSON file written by `--output`, exits non-zero when a stage got
+    slower or used more memory than `tolerance` allows at a size both runs measured.
+    """
+    context = get_context("spawn")
+    results = {stage: {} for stage in stages}
+
+    for n in rows:
+        with tempfile.TemporaryDirectory(prefix="pipeline_", dir=workdir) as directory:
+            root = Path(directory)
+            for subdir in ("data/raw", "data/interim", "data/processed", "models"):
+                (root / subdir).mkdir(parents=True)
+            logger.info("Generating {} raw rows in {}", n, root)
+            # A spawned process starts with the peak RSS of its parent, so keep this one small
+            generator = context.Process(
+                target=generate,
+                args=(n, root / "data/raw/raw_data.csv"),
+                kwargs={"workers": cores},
+            )
+            generator.start()
+            generator.join()
+
+            # Read by config and MLflow in the stage processes, which inherit the environment
+            os.environ["PROJ_ROOT"] = str(root)
+            os.environ["MLFLOW_TRACKING_URI"] = f"sqlite:///{root / 'mlflow.db'}"
+
+            for stage in required_stages(stages):
+                queue = context.Queue()
+                process = context.Process(target=run_stage, args=(stage, chunksize, cores, queue))
+                process.start()
+                process.join()
+                if process.exitcode:
+                    log = (root / f"{stage}.log").read_text()
+                    raise RuntimeError(
+                        f"Stage {stage} at {n} rows exited with {process.exitcode}:\n{log[-2000:]}"
+                    )
+                usage = queue.get()
+                if stage not in stages:
+                    continue
+
+                usage["rows_per_second"] = n / usage["wall_seconds"]
+                results[stage][str(n)] = usage
+                logger.info(
+                    "rows={:>9} {:>13}: {:8.2f}s, {:>10.0f} rows/s, peak RSS {:8.1f} MiB, "
+                    "peak worker RSS {:8.1f} MiB",
+                    n,
+                    stage,
+                    usage["wall_seconds"],
+                    usage["rows_per_second"],
+                    usage["peak_rss_mb"],
+                    usage["peak_worker_rss_mb"],
+                )
+
+    if output:
+        machine = {
+            "cpu_count": os.cpu_count(),
+            "cores": cores,
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+        }
+        output.write_text(json.dumps({"machine": machine, "results": results}, indent=2))
+        logger.info("Wrote results to {}", output)
+
+    if baseline:
+        regressions = find_regressions(results, json.loads(baseline.read_text()), tolerance)
+        if regressions:
+            logger.error("Pipeline performance regressed: {}", "; ".join(regressions))
+            raise typer.Exit(code=1)
+        logger.success("No regressions over {:.0%} against {}", tolerance, baseline)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,73 @@
+# Compares peak RSS and search time of CV workers on a pandas frame and on shared buffers
+
+from multiprocessing import get_context
+
+from loguru import logger
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import RandomizedSearchCV
+import typer
+
+from encoding import make_cleaned_data
+from itu_sdse_project.helpers import share_array, share_sparse, shared_data_dir
+from itu_sdse_project.modeling.scheduler import measure_usage
+from itu_sdse_project.preprocessing import LABEL_COL, LeadPreprocessor
+
+app = typer.Typer()
+
+MODES = ("dataframe", "float32", "sparse")
+
+
+def search(X, y, workers: int):
+    params = {"C": [100, 10, 1.0, 0.1, 0.01]}
+    model = LogisticRegression(max_iter=20)
+    RandomizedSearchCV(model, params, n_iter=4, cv=4, n_jobs=workers).fit(X, y)
+
+
+def run(mode: str, rows: int, cardinality: int, workers: int, results):
+    # Runs in a fresh process, since peak RSS only ever grows within one
+    logger.disable("itu_sdse_project")
+    data = make_cleaned_data(rows, cardinality)
+    preprocessor = LeadPreprocessor([], [], {}, {}, None).fit_encoding(data)
+    y = data[LABEL_COL].to_numpy()
+
+    with shared_data_dir() as shared_dir, measure_usage(workers) as usage:
+        if mode == "dataframe":
+            X = preprocessor.encode(data)
+        elif mode == "float32":
+            X = preprocessor.encode(data, dummy_dtype="uint8")
+            buffer = share_array(X, shared_dir / "X.npy", "float32")
+            X = pd.DataFrame(buffer, columns=X.columns, copy=False)
+        else:
+            X = share_sparse(preprocessor.encode_sparse(data).astype("float32"), shared_dir, "X")
+        if mode != "dataframe":
+            y = share_array(y, shared_dir / "y.npy", y.dtype)
+        del data
+        search(X, y, workers)
+    results.put(usage)
+
+
+@app.command()
+def main(rows: list[int] = [200_000, 1_000_000], cardinality: int = 200, workers: int = 4):
+    context = get_context("spawn")
+    for n in rows:
+        for mode in MODES:
+            results = context.Queue()
+            process = context.Process(target=run, args=(mode, n, cardinality, workers, results))
+            process.start()
+            process.join()
+            if process.exitcode:
+                raise RuntimeError(f"Benchmark for {mode} exited with code {process.exitcode}")
+            usage = results.get()
+            logger.info(
+                "rows={:>9} {:>9}: {:7.2f}s, peak RSS {:8.1f} MiB, peak worker RSS {:8.1f} MiB",
+                n,
+                mode,
+                usage["wall_seconds"],
+                usage["peak_rss_mb"],
+                usage["peak_worker_rss_mb"],
+            )
+
+
+if __name__ == "__main__":
+    app()
@@ -2,56 +2,204 @@
 
 from pathlib import Path
 
+import joblib
+from loguru import logger
 import numpy as np
 import pandas as pd
 from sklearn.preprocessing import MinMaxScaler
+import typer
 
-from itu_sdse_project.config import INTERIM_DATA_DIR, RAW_DATA_DIR
-from itu_sdse_project.helpers import impute_missing_values
+from itu_sdse_project.cache import PACKAGE_DIR, run_stage
+from itu_sdse_project.config import ARTIFACT_FORMAT, INTERIM_DATA_DIR, RAW_DATA_DIR
+from itu_sdse_project.helpers import ArtifactWriter, artifact_path, write_artifact
+from itu_sdse_project.preprocessing import (
+    NON_NULL_COLS,
+    LeadPreprocessor,
+    filter_rows,
+    read_raw,
+    split_columns,
+)
+from itu_sdse_project.profiling import profile_stage
 
-output_path: Path = INTERIM_DATA_DIR / "cleaned_data.csv"
+output_path: Path = artifact_path(INTERIM_DATA_DIR, "cleaned_data")
 input_path: Path = RAW_DATA_DIR / "raw_data.csv"
+preprocessor_path: Path = INTERIM_DATA_DIR / "preprocessor.joblib"
+
+app = typer.Typer()
+
+
+def clean(input_path: Path, output_path: Path) -> LeadPreprocessor:
+    with profile_stage("make_dataset") as stage:
+        data = filter_rows(read_raw(input_path))
+        stage.record_memory("filtered", data)
+        preprocessor = LeadPreprocessor.from_data(data)
+        cleaned = preprocessor.clean(data)
+        stage.record_memory("cleaned", cleaned)
+        write_artifact(cleaned, output_path)
+        stage.rows = len(data)
+    return preprocessor
+
+
+def _common_dtype(dtypes):
+    dtypes = set(dtypes)
+    if len(dtypes) == 1:
+        return dtypes.pop()
+    if all(dtype.kind in "iuf" for dtype in dtypes):
+        return np.result_type(*dtypes)
+    return np.dtype("object")
+
+
+def _iter_chunks(input_path: Path, chunksize: int, dtype=None):
+    for chunk in read_raw(input_path, chunksize=chunksize, dtype=dtype):
+        yield chunk, filter_rows(chunk)
+
+
+def _scan_moments(input_path: Path, chunksize: int, dtype=None):
+    """
+    First pass: row count and sum of continuous columns and value counts of categorical
+    columns of the filtered data, plus the dtypes `read_csv` inferred for every raw chunk.
+    """
+    raw_dtypes: dict[str, list] = {}
+    count: dict[str, int] = {}
+    total: dict[str, float] = {}
+    cat_cols: list[str] = []
+    value_counts: dict[str, pd.Series] = {}
+
+    for raw_chunk, chunk in _iter_chunks(input_path, chunksize, dtype):
+        for col, col_dtype in raw_chunk.dtypes.items():
+            raw_dtypes.setdefault(col, []).append(col_dtype)
+
+        cont_cols, chunk_cat_cols = split_columns(chunk)
+        for col in cont_cols:
+            count[col] = count.get(col, 0) + int(chunk[col].count())
+            total[col] = total.get(col, 0.0) + float(chunk[col].sum())
+        for col in chunk_cat_cols:
+            if col not in cat_cols:
+                cat_cols.append(col)
+            if col not in NON_NULL_COLS:
+                counts = chunk[col].value_counts()
+                if isinstance(counts.index, pd.CategoricalIndex):
+                    # Chunks have their own categories, so count by value and skip unseen ones
+                    counts = counts[counts > 0]
+                    counts.index = np.asarray(counts.index)
+                if col in value_counts:
+                    counts = value_counts[col].add(counts, fill_value=0)
+                value_counts[col] = counts
+
+    dtypes = {col: _common_dtype(col_dtypes) for col, col_dtypes in raw_dtypes.items()}
+    mixed = [col for col, col_dtypes in raw_dtypes.items() if len(set(col_dtypes)) > 1]
+    means = {col: total[col] / count[col] for col in count}
+    return dtypes, mixed, count, means, cat_cols, value_counts
+
+
+def _scan_deviations(input_path: Path, chunksize: int, dtype, means):
+    """Second pass: sum of squared deviations from the mean, matching `Series.std`."""
+    squares = dict.fromkeys(means, 0.0)
+    for _, chunk in _iter_chunks(input_path, chunksize, dtype):
+        for col, mean in means.items():
+            squares[col] += float(((mean - chunk[col]) ** 2).sum())
+    return squares
+
+
+def _scan_clipped(input_path: Path, chunksize: int, dtype, bounds):
+    """Third pass: mean, min and max of the clipped continuous columns."""
+    count = dict.fromkeys(bounds, 0)
+    total = dict.fromkeys(bounds, 0.0)
+    minimum = dict.fromkeys(bounds, np.inf)
+    maximum = dict.fromkeys(bounds, -np.inf)
+    has_nulls = dict.fromkeys(bounds, False)
+
+    for _, chunk in _iter_chunks(input_path, chunksize, dtype):
+        for col, (lower, upper) in bounds.items():
+            clipped = chunk[col].clip(lower=lower, upper=upper)
+            count[col] += int(clipped.count())
+            total[col] += float(clipped.sum())
+            minimum[col] = min(minimum[col], clipped.min())
+            maximum[col] = max(maximum[col], clipped.max())
+            has_nulls[col] |= bool(clipped.isna().any())
+
+    means = {col: total[col] / count[col] for col in bounds}
+    # The imputed mean always lies inside [min, max], so it only matters for all-null columns
+    minimum = {
+        col: min(minimum[col], means[col]) if has_nulls[col] else minimum[col] for col in bounds
+    }
+    maximum = {
+        col: max(maximum[col], means[col]) if has_nulls[col] else maximum[col] for col in bounds
+    }
+    return means, minimum, maximum
+
+
+def _mode(counts: pd.Series):
+    return counts[counts == counts.max()].index.sort_values()[0]
+
+
+def clean_streaming(input_path: Path, output_path: Path, chunksize: int) -> LeadPreprocessor:
+    """
+    Out-of-core variant of `clean` that never holds more than one chunk in memory.
+
+    Statistics are gathered in scans over the raw file (moments, squared deviations,
+    clipped mean and range), then a final pass transforms each chunk and appends it to
+    `output_path`. Reductions run per chunk with the same pandas calls as `clean`, so a
+    file that fits in a single chunk is cleaned byte-identically; with several chunks
+    the means can differ from `clean` in the last bit of precision.
+    """
+    with profile_stage("make_dataset") as stage:
+        logger.info("Scanning {} in chunks of {} rows", input_path, chunksize)
+        dtypes, mixed, count, means, cat_cols, value_counts = _scan_moments(input_path, chunksize)
+        dtype = None
+        if mixed:
+            # Chunks disagreed on inferred types, so re-scan with what a full read would infer
+            dtype = {col: dtypes[col] for col in mixed}
+            logger.warning("Inferred dtypes differ between chunks for {}. Re-scanning.", mixed)
+            _, _, count, means, cat_cols, value_counts = _scan_moments(
+                input_path, chunksize, dtype
+            )
+
+        squares = _scan_deviations(input_path, chunksize, dtype, means)
+        stds = {col: np.sqrt(squares[col] / (count[col] - 1)) for col in means}
+        bounds = {col: (means[col] - 2 * stds[col], means[col] + 2 * stds[col]) for col in means}
+        logger.debug("Clip bounds: {}", bounds)
+
+        fill_values, minimum, maximum = _scan_clipped(input_path, chunksize, dtype, bounds)
+        fill_values.update({col: _mode(counts) for col, counts in value_counts.items()})
+        logger.debug("Imputation values: {}", fill_values)
+
+        cont_cols = list(bounds)
+        scaler = MinMaxScaler()
+        scaler.fit(pd.DataFrame([minimum, maximum], columns=cont_cols))
+        preprocessor = LeadPreprocessor(cont_cols, cat_cols, bounds, fill_values, scaler)
+
+        rows = 0
+        with ArtifactWriter(output_path) as writer:
+            for _, chunk in _iter_chunks(input_path, chunksize, dtype):
+                data = preprocessor.clean(chunk)
+                writer.write(data)
+                rows += len(data)
+        stage.rows = rows
+
+    logger.success("Wrote {} cleaned rows to {}", rows, output_path)
+    return preprocessor
+
+
+@app.command()
+def main(chunksize: int | None = None, force: bool = False):
+    def run():
+        if chunksize:
+            preprocessor = clean_streaming(input_path, output_path, chunksize)
+        else:
+            preprocessor = clean(input_path, output_path)
+        joblib.dump(value=preprocessor, filename=preprocessor_path)
+        logger.info("Saved fitted preprocessor to {}", preprocessor_path)
+
+    inputs = [
+        input_path,
+        Path(__file__),
+        PACKAGE_DIR / "preprocessing.py",
+        PACKAGE_DIR / "helpers.py",
+        {"chunksize": chunksize, "artifact_format": ARTIFACT_FORMAT},
+    ]
+    run_stage("make_dataset", inputs, [output_path, preprocessor_path], run, force=force)
+
 
 if __name__ == "__main__":
-    data = pd.read_csv(input_path)
-
-    data["date_part"] = pd.to_datetime(data["date_part"]).dt.date
-    data = data.drop(
-        ["is_active", "marketing_consent", "first_booking", "existing_customer", "last_seen"],
-        axis=1,
-    )
-    data = data.drop(
-        ["domain", "country", "visited_learn_more_before_booking", "visited_faq"], axis=1
-    )
-    data["lead_indicator"].replace("", np.nan, inplace=True)
-    data["lead_id"].replace("", np.nan, inplace=True)
-    data["customer_code"].replace("", np.nan, inplace=True)
-    data = data.dropna(axis=0, subset=["lead_indicator"])
-    data = data.dropna(axis=0, subset=["lead_id"])
-    data = data[data.source == "signup"]
-    vars = ["lead_id", "lead_indicator", "customer_group", "onboarding", "source", "customer_code"]
-
-    for col in vars:
-        data[col] = data[col].astype("object")
-
-    cont_vars = data.loc[:, ((data.dtypes == "float64") | (data.dtypes == "int64"))]
-    cat_vars = data.loc[:, (data.dtypes == "object")]
-
-    cont_vars = cont_vars.apply(
-        lambda x: x.clip(lower=(x.mean() - 2 * x.std()), upper=(x.mean() + 2 * x.std()))
-    )
-    cont_vars = cont_vars.apply(impute_missing_values)
-    cat_vars.loc[cat_vars["customer_code"].isna(), "customer_code"] = "None"
-    cat_vars = cat_vars.apply(impute_missing_values)
-
-    scaler = MinMaxScaler()
-    scaler.fit(cont_vars)
-    cont_vars = pd.DataFrame(scaler.transform(cont_vars), columns=cont_vars.columns)
-    cont_vars = cont_vars.reset_index(drop=True)
-    cat_vars = cat_vars.reset_index(drop=True)
-    data = pd.concat([cat_vars, cont_vars], axis=1)
-
-    mapping = {"li": "socials", "fb": "socials", "organic": "group1", "signup": "group1"}
-
-    data["bin_source"] = data["source"].map(mapping)
-    data.to_csv(output_path, index=False)
+    app()
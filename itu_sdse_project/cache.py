@@ -0,0 +1,154 @@
+from collections.abc import Callable
+import hashlib
+import json
+import os
+from pathlib import Path
+import shutil
+
+from loguru import logger
+
+from itu_sdse_project.config import STAGE_CACHE_DIR, STAGE_CACHE_MAX_BYTES
+
+PACKAGE_DIR = Path(__file__).resolve().parent
+
+_DIGESTS_FILE = "digests.json"
+
+
+def _describe(value):
+    # Frozen scipy distributions only have an address in their repr
+    if hasattr(value, "dist") and hasattr(value, "args"):
+        return [value.dist.name, list(value.args), value.kwds]
+    return repr(value)
+
+
+def file_digest(path: Path, cache_dir: Path = STAGE_CACHE_DIR) -> str:
+    """
+    SHA-256 of a file's content. Digests are remembered by path, size and mtime, so
+    unchanged multi-GB inputs are only hashed once.
+    """
+    path = Path(path)
+    stat = path.stat()
+    index_path = cache_dir / _DIGESTS_FILE
+    try:
+        index = json.loads(index_path.read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        index = {}
+
+    key = str(path.resolve())
+    entry = index.get(key)
+    if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+        return entry["digest"]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(1 << 20):
+            digest.update(block)
+
+    index[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "digest": digest.hexdigest()}
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = index_path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(index))
+    tmp_path.replace(index_path)
+    return index[key]["digest"]
+
+
+def fingerprint(*parts) -> str:
+    """
+    Hex digest over stage inputs. Paths contribute their content, anything else its
+    JSON form, so reordering a dict or moving the repository does not change the result.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, Path):
+            digest.update(file_digest(part).encode())
+        else:
+            digest.update(json.dumps(part, sort_keys=True, default=_describe).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class StageCache:
+    """
+    Stores the output files of a pipeline stage under `<root>/<stage>/<key>`.
+
+    Entries are restored by copying, since stages rewrite their outputs in place. When
+    the cache grows over `max_bytes`, least recently used entries are evicted first.
+    """
+
+    def __init__(self, root: Path = STAGE_CACHE_DIR, max_bytes: int = STAGE_CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+
+    def _entry(self, stage: str, key: str) -> Path:
+        return self.root / stage / key
+
+    def restore(self, stage: str, key: str, outputs: list[Path]) -> bool:
+        entry = self._entry(stage, key)
+        try:
+            manifest = json.loads((entry / "manifest.json").read_text())
+        except FileNotFoundError:
+            return False
+        if len(manifest["files"]) != len(outputs):
+            return False
+
+        for name, output in zip(manifest["files"], outputs):
+            Path(output).parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(entry / name, output)
+        # The entry's mtime is its last use, which drives eviction
+        os.utime(entry)
+        return True
+
+    def store(self, stage: str, key: str, outputs: list[Path]):
+        entry = self._entry(stage, key)
+        tmp_entry = entry.with_name(f"{key}.{os.getpid()}.tmp")
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+        tmp_entry.mkdir(parents=True)
+
+        files = [f"{i}-{Path(output).name}" for i, output in enumerate(outputs)]
+        for name, output in zip(files, outputs):
+            shutil.copyfile(output, tmp_entry / name)
+        (tmp_entry / "manifest.json").write_text(json.dumps({"files": files}))
+
+        shutil.rmtree(entry, ignore_errors=True)
+        tmp_entry.rename(entry)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for entry in self.root.glob("*/*"):
+            if entry.is_dir() and (entry / "manifest.json").exists():
+                size = sum(f.stat().st_size for f in entry.iterdir())
+                entries.append((entry.stat().st_mtime, size, entry))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            logger.info("Evicting stage cache entry {} ({} bytes)", entry, size)
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+
+def run_stage(
+    stage: str,
+    inputs: list,
+    outputs: list[Path],
+    run: Callable[[], object],
+    force: bool = False,
+    cache: StageCache | None = None,
+) -> str:
+    """
+    Runs `run` unless a cache entry for the fingerprint of `inputs` exists, in which case
+    the cached `outputs` are restored instead. Returns the fingerprint.
+    """
+    cache = cache or StageCache()
+    key = fingerprint(stage, *inputs)
+    if not force and cache.restore(stage, key, outputs):
+        logger.success(
+            "Inputs of stage '{}' unchanged ({}), reused cached outputs", stage, key[:12]
+        )
+        return key
+
+    run()
+    cache.store(stage, key, outputs)
+    return key
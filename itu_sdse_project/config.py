@@ -1,21 +1,36 @@
+import importlib.util
+import os
 from pathlib import Path
-import mlflow
 
 from dotenv import load_dotenv
 from loguru import logger
 
-mlflow.set_tracking_uri("sqlite:///mlflow.db")
-
 # Load environment variables from .env file if it exists
 load_dotenv()
 
+# MLflow reads the tracking URI from the environment on first use, so config does not
+# have to import it. Entry points that never log runs skip its import cost entirely.
+os.environ.setdefault("MLFLOW_TRACKING_URI", "sqlite:///mlflow.db")
+
 RANDOM_STATE = 42
 DATA_VERSION = "0000"
 EXPERIMENT_NAME = "my_project"
 MODEL_NAME = "model"
 
-# Paths
-PROJ_ROOT = Path(__file__).resolve().parents[1]
+# On-disk format of interim and processed artifacts: "csv", "parquet" or "feather"
+ARTIFACT_FORMAT = os.getenv("ARTIFACT_FORMAT", "csv")
+
+# On-disk format of model pickles: "mmap" (uncompressed, memory-mapped on load) or "compressed"
+MODEL_FORMAT = os.getenv("MODEL_FORMAT", "mmap")
+
+# Cores that training may use in total, across CV workers and estimator threads
+TRAINING_CORES = int(os.getenv("TRAINING_CORES", str(os.cpu_count() or 1)))
+
+# Incremental retraining refits from scratch instead once the last full refit is this old
+FULL_REFIT_DAYS = int(os.getenv("FULL_REFIT_DAYS", "7"))
+
+# Paths. PROJ_ROOT can point the pipeline at another data, models and cache directory
+PROJ_ROOT = Path(os.getenv("PROJ_ROOT", Path(__file__).resolve().parents[1]))
 logger.info(f"PROJ_ROOT path is: {PROJ_ROOT}")
 
 DATA_DIR = PROJ_ROOT / "data"
@@ -24,18 +39,49 @@ INTERIM_DATA_DIR = DATA_DIR / "interim"
 PROCESSED_DATA_DIR = DATA_DIR / "processed"
 EXTERNAL_DATA_DIR = DATA_DIR / "external"
 
+# Processed features indexed by lead_id, compacted once appends leave more segments than this
+FEATURE_STORE_DIR = PROCESSED_DATA_DIR / "feature_store"
+FEATURE_STORE_MAX_SEGMENTS = int(os.getenv("FEATURE_STORE_MAX_SEGMENTS", "8"))
+
 MODELS_DIR = PROJ_ROOT / "models"
 
+# Index of finished training runs that model selection reads instead of searching MLflow
+LEADERBOARD_PATH = PROJ_ROOT / "leaderboard.db"
+
+# Trials of `train.py --search queue` and their training data. Workers on other nodes need
+# it on a shared filesystem
+TRIAL_QUEUE_DIR = Path(os.getenv("TRIAL_QUEUE_DIR", PROJ_ROOT / ".trial_queue"))
+
+# Local copies of registered model versions, and how many stay deserialized per process
+MODEL_CACHE_DIR = PROJ_ROOT / ".model_cache"
+MODEL_CACHE_MAX_BYTES = int(os.getenv("MODEL_CACHE_MAX_BYTES", str(1024**3)))
+MODEL_CACHE_MAX_LOADED = int(os.getenv("MODEL_CACHE_MAX_LOADED", "2"))
+
+# Outputs of pipeline stages, keyed by a fingerprint of their inputs
+STAGE_CACHE_DIR = PROJ_ROOT / ".stage_cache"
+STAGE_CACHE_MAX_BYTES = int(os.getenv("STAGE_CACHE_MAX_BYTES", str(2 * 1024**3)))
+
 REPORTS_DIR = PROJ_ROOT / "reports"
 FIGURES_DIR = REPORTS_DIR / "figures"
 
+# Set PROFILE_TRACE=1 to append the timings of pipeline stages to TRACE_PATH, in Chrome's
+# trace event format
+PROFILE_TRACE = os.getenv("PROFILE_TRACE", "0") == "1"
+TRACE_PATH = REPORTS_DIR / "trace.json"
+# Set PROFILE_STAGES=1 to also sample the call stacks of every stage into PROFILE_DIR
+PROFILE_STAGES = os.getenv("PROFILE_STAGES", "0") == "1"
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+PROFILE_DIR = REPORTS_DIR / "profiles"
 
-# If tqdm is installed, configure loguru with tqdm.write
-# https://github.com/Delgan/loguru/issues/135
-try:
+
+def _tqdm_sink(msg):
     from tqdm import tqdm
 
+    tqdm.write(msg, end="")
+
+
+# If tqdm is installed, configure loguru with tqdm.write
+# https://github.com/Delgan/loguru/issues/135
+if importlib.util.find_spec("tqdm") is not None:
     logger.remove(0)
-    logger.add(lambda msg: tqdm.write(msg, end=""), colorize=True)
-except ModuleNotFoundError:
-    pass
+    logger.add(_tqdm_sink, colorize=True)
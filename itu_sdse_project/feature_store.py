@@ -0,0 +1,308 @@
+from itertools import zip_longest
+import json
+import os
+from pathlib import Path
+
+from loguru import logger
+import numpy as np
+import pandas as pd
+import typer
+
+from itu_sdse_project.cache import fingerprint
+from itu_sdse_project.config import (
+    FEATURE_STORE_DIR,
+    FEATURE_STORE_MAX_SEGMENTS,
+    INTERIM_DATA_DIR,
+    PROCESSED_DATA_DIR,
+)
+from itu_sdse_project.helpers import artifact_columns, artifact_path, iter_artifact
+from itu_sdse_project.preprocessing import ID_DTYPE
+from itu_sdse_project.profiling import profile_stage
+
+app = typer.Typer()
+
+features_path_default = artifact_path(PROCESSED_DATA_DIR, "features")
+ids_path_default = artifact_path(INTERIM_DATA_DIR, "cleaned_data")
+
+ID_COL = "lead_id"
+MANIFEST = "manifest.json"
+
+
+def source_fingerprint(features_path: Path, ids_path: Path) -> str:
+    """Fingerprint of the artifacts a store is built from, see `FeatureStore.sync`."""
+    return fingerprint(features_path, ids_path)
+
+
+class FeatureStore:
+    """
+    Processed feature vectors of leads, keyed by lead_id, in append-only segments under
+    `root`. Each segment is a row-major `.npy` matrix with the lead ids of its rows next to
+    it, memory-mapped on open, so a lookup pages in only the rows it reads. `manifest.json`
+    lists the segments and is replaced atomically, and a store notices a newer manifest on
+    its next lookup.
+
+    The index is a hash table from lead_id to the newest row of that lead, so single and
+    batch lookups take constant time per id. `append` adds a segment, and once there are
+    more than `max_segments`, `compact` rewrites the newest row of every lead into one.
+    """
+
+    def __init__(
+        self, root: Path = FEATURE_STORE_DIR, max_segments: int = FEATURE_STORE_MAX_SEGMENTS
+    ):
+        self.root = Path(root)
+        self.max_segments = max_segments
+        self.columns: list[str] = []
+        self.dtype = None
+        self.source: str | None = None
+        self._manifest = {"segments": []}
+        self._loaded_mtime = None
+        self._load()
+
+    def exists(self) -> bool:
+        return (self.root / MANIFEST).exists()
+
+    def _manifest_mtime(self) -> int | None:
+        try:
+            return (self.root / MANIFEST).stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _load(self):
+        mtime = self._manifest_mtime()
+        if mtime == self._loaded_mtime:
+            return
+        manifest = {"segments": []}
+        if mtime is not None:
+            manifest = json.loads((self.root / MANIFEST).read_text())
+        try:
+            self._open(manifest)
+        except FileNotFoundError:
+            # Compacted between reading the manifest and opening its segments
+            if self._manifest_mtime() == mtime:
+                raise
+            return self._load()
+        self._loaded_mtime = mtime
+
+    def _open(self, manifest: dict):
+        self._manifest = manifest
+        self.columns = manifest.get("columns", [])
+        self.dtype = np.dtype(manifest["dtype"]) if "dtype" in manifest else None
+        self.source = manifest.get("source")
+        self._values = [
+            np.load(self.root / f"{name}.features.npy", mmap_mode="r")
+            for name in manifest["segments"]
+        ]
+        ids = [np.load(self.root / f"{name}.ids.npy") for name in manifest["segments"]]
+        ids = np.concatenate(ids) if ids else np.empty(0, dtype=ID_DTYPE)
+        self._starts = np.cumsum([0] + [len(values) for values in self._values])
+
+        # Appended rows replace older rows of the same lead
+        latest = ~pd.Series(ids).duplicated(keep="last").to_numpy()
+        self._index = pd.Index(ids[latest])
+        self._rows = np.flatnonzero(latest)
+
+    def __len__(self) -> int:
+        self._load()
+        return len(self._index)
+
+    def __contains__(self, lead_id) -> bool:
+        self._load()
+        return lead_id in self._index
+
+    @property
+    def segments(self) -> int:
+        self._load()
+        return len(self._manifest["segments"])
+
+    def _gather(self, rows: np.ndarray) -> np.ndarray:
+        out = np.empty((len(rows), len(self.columns)), dtype=self.dtype)
+        segment = np.searchsorted(self._starts, rows, side="right") - 1
+        for i in np.unique(segment):
+            mask = segment == i
+            out[mask] = self._values[i][rows[mask] - self._starts[i]]
+        return out
+
+    def get(self, lead_id) -> np.ndarray:
+        """Feature vector of one lead, in `columns` order."""
+        self._load()
+        try:
+            row = self._rows[self._index.get_loc(lead_id)]
+        except KeyError:
+            raise KeyError(f"Lead {lead_id} is not in the feature store {self.root}") from None
+        segment = np.searchsorted(self._starts, row, side="right") - 1
+        return np.asarray(self._values[segment][row - self._starts[segment]])
+
+    def lookup(self, lead_ids) -> pd.DataFrame:
+        """Features of `lead_ids`, one row per id in the given order, indexed by lead_id."""
+        self._load()
+        lead_ids = np.asarray(lead_ids)
+        positions = self._index.get_indexer(lead_ids)
+        if (positions < 0).any():
+            missing = lead_ids[positions < 0]
+            raise KeyError(
+                f"{len(missing)} leads are not in the feature store {self.root}, "
+                f"e.g. {missing[:5].tolist()}"
+            )
+        return pd.DataFrame(
+            self._gather(self._rows[positions]),
+            columns=self.columns,
+            index=pd.Index(lead_ids, name=ID_COL),
+            copy=False,
+        )
+
+    def _write_manifest(self, segments: list[str], source: str | None):
+        manifest = {
+            "columns": self.columns,
+            "dtype": self.dtype.str,
+            "segments": segments,
+            "next_segment": self._manifest.get("next_segment", 0),
+            "source": source,
+        }
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.root / f"{MANIFEST}.{os.getpid()}.tmp"
+        tmp_path.write_text(json.dumps(manifest, indent=2))
+        tmp_path.replace(self.root / MANIFEST)
+        self._load()
+
+    def _new_segment(self, rows: int) -> tuple[str, np.memmap, np.memmap]:
+        number = self._manifest.get("next_segment", 0)
+        self._manifest["next_segment"] = number + 1
+        name = f"{number:06d}"
+        self.root.mkdir(parents=True, exist_ok=True)
+        values = np.lib.format.open_memmap(
+            self.root / f"{name}.features.npy",
+            mode="w+",
+            dtype=self.dtype,
+            shape=(rows, len(self.columns)),
+        )
+        ids = np.lib.format.open_memmap(
+            self.root / f"{name}.ids.npy", mode="w+", dtype=ID_DTYPE, shape=(rows,)
+        )
+        return name, values, ids
+
+    def _remove(self, segments: list[str]):
+        # Readers that still map these files keep their pages until they reload
+        for name in segments:
+            for suffix in ("features", "ids"):
+                (self.root / f"{name}.{suffix}.npy").unlink(missing_ok=True)
+
+    def append(self, lead_ids, features: pd.DataFrame, source: str | None = None):
+        """
+        Adds the feature rows of `lead_ids` as a new segment. Leads already in the store get
+        the new rows. `source` records which artifacts the store now matches.
+        """
+        self._load()
+        if not self.columns:
+            self.columns = list(features.columns)
+            self.dtype = np.result_type(*features.dtypes)
+        elif list(features.columns) != self.columns:
+            raise ValueError(f"Feature columns differ from those of the feature store {self.root}")
+        if len(lead_ids) != len(features):
+            raise ValueError(f"{len(lead_ids)} lead ids but {len(features)} feature rows")
+
+        name, values, ids = self._new_segment(len(features))
+        values[:] = features.to_numpy(dtype=self.dtype)
+        ids[:] = np.asarray(lead_ids, dtype=ID_DTYPE)
+        values.flush()
+        ids.flush()
+        self._write_manifest(self._manifest["segments"] + [name], source)
+        logger.info("Appended {} leads to the feature store {}", len(features), self.root)
+
+        if self.segments > self.max_segments:
+            self.compact()
+
+    def compact(self):
+        """Rewrites the newest row of every lead into a single segment, in store order."""
+        self._load()
+        old = list(self._manifest["segments"])
+        if len(old) <= 1 and len(self._rows) == self._starts[-1]:
+            return
+        with profile_stage("compact_feature_store", rows=len(self._rows)):
+            name, values, ids = self._new_segment(len(self._rows))
+            segment = np.searchsorted(self._starts, self._rows, side="right") - 1
+            for i in range(len(old)):
+                mask = segment == i
+                rows = self._rows[mask] - self._starts[i]
+                values[mask] = self._values[i][rows]
+            ids[:] = self._index.to_numpy(dtype=ID_DTYPE)
+            values.flush()
+            ids.flush()
+            self._write_manifest([name], self.source)
+        self._remove(old)
+        logger.info("Compacted {} segments of the feature store into {}", len(old), name)
+
+    def sync(self, features_path: Path, ids_path: Path, chunksize: int = 100_000) -> bool:
+        """
+        Rebuilds the store from a feature artifact and the lead ids of its rows, the
+        `lead_id` column of `ids_path`, unless it was built from the same files already.
+        Returns whether it was rebuilt.
+        """
+        source = source_fingerprint(features_path, ids_path)
+        self._load()
+        if self.source == source:
+            return False
+
+        with profile_stage("build_feature_store") as stage:
+            rows = sum(len(chunk) for chunk in iter_artifact(ids_path, chunksize, [ID_COL]))
+            old = list(self._manifest["segments"])
+            columns, dtype = self.columns, self.dtype
+            self.columns = artifact_columns(features_path)
+            self.dtype = None
+            name = values = ids = None
+            start = 0
+            chunks = zip_longest(
+                iter_artifact(features_path, chunksize),
+                iter_artifact(ids_path, chunksize, [ID_COL]),
+            )
+            try:
+                for X, lead_ids in chunks:
+                    if X is None or lead_ids is None or len(X) != len(lead_ids):
+                        raise ValueError(
+                            f"{features_path} and {ids_path} have different numbers of rows"
+                        )
+                    if values is None:
+                        self.dtype = np.result_type(*X.dtypes)
+                        name, values, ids = self._new_segment(rows)
+                    values[start : start + len(X)] = X.to_numpy(dtype=self.dtype)
+                    ids[start : start + len(X)] = lead_ids[ID_COL].to_numpy(dtype=ID_DTYPE)
+                    start += len(X)
+                if values is None:
+                    raise ValueError(f"{features_path} has no rows to build a feature store from")
+                values.flush()
+                ids.flush()
+            except BaseException:
+                # The manifest does not list the new segment yet, so nothing else removes it
+                self.columns, self.dtype = columns, dtype
+                if name is not None:
+                    del values, ids
+                    self._remove([name])
+                raise
+            self._write_manifest([name], source)
+            stage.rows = rows
+        self._remove(old)
+        logger.success(
+            "Built the feature store {} with {} leads from {}", self.root, len(self), features_path
+        )
+        return True
+
+
+@app.command()
+def main(
+    features_path: Path = features_path_default,
+    ids_path: Path = ids_path_default,
+    root: Path = FEATURE_STORE_DIR,
+    compact: bool = False,
+):
+    """
+    Brings the feature store up to date with the processed features, whose lead ids are
+    taken from the cleaned data they were encoded from. `--compact` only compacts it.
+    """
+    store = FeatureStore(root)
+    if compact:
+        store.compact()
+    elif not store.sync(features_path, ids_path):
+        logger.success("Feature store {} is up to date with {}", root, features_path)
+
+
+if __name__ == "__main__":
+    app()
@@ -1,48 +1,97 @@
-import pandas as pd
-import typer
+from pathlib import Path
+
+import joblib
 from loguru import logger
+import typer
 
-from itu_sdse_project.config import INTERIM_DATA_DIR, PROCESSED_DATA_DIR
-from itu_sdse_project.helpers import create_dummy_cols
+from itu_sdse_project.cache import PACKAGE_DIR, run_stage
+from itu_sdse_project.config import FEATURE_STORE_DIR, INTERIM_DATA_DIR, PROCESSED_DATA_DIR
+from itu_sdse_project.feature_store import FeatureStore, source_fingerprint
+from itu_sdse_project.helpers import (
+    artifact_columns,
+    artifact_path,
+    read_artifact,
+    write_artifact,
+)
+from itu_sdse_project.preprocessing import CAT_COLS, LABEL_COL, UNUSED_COLS
+from itu_sdse_project.profiling import profile_stage
+from itu_sdse_project.validation import validate
 
 app = typer.Typer()
 
+input_path = artifact_path(INTERIM_DATA_DIR, "cleaned_data")
+interim_preprocessor_path = INTERIM_DATA_DIR / "preprocessor.joblib"
+labels_path = artifact_path(PROCESSED_DATA_DIR, "labels")
+features_path = artifact_path(PROCESSED_DATA_DIR, "features")
+preprocessor_path = PROCESSED_DATA_DIR / "preprocessor.joblib"
+feature_store_dir = FEATURE_STORE_DIR
 
-@app.command()
-def main():
-    input_path = INTERIM_DATA_DIR / "cleaned_data.csv"
-    logger.info("Starting feature engineering from {}", input_path)
 
-    data = pd.read_csv(input_path)
-    data = data.drop(["lead_id", "customer_code", "date_part"], axis=1)
-    cat_cols = ["customer_group", "onboarding", "bin_source", "source"]
-    cat_vars = data[cat_cols]
-    other_vars = data.drop(cat_cols, axis=1)
+def feature_dtypes(path: Path) -> dict[str, str]:
+    """
+    Dtypes of the continuous features, dummies and labels stored at `path`. CSV carries no
+    dtypes, so everything stays float64 there to keep the file format unchanged. Elsewhere
+    the continuous features, scaled to [0, 1], are stored as float32, which is also what
+    XGBoost trains on, and dummies and labels as uint8.
+    """
+    if path.suffix == ".csv":
+        return {"numeric_dtype": "float64", "dummy_dtype": "float64", "label_dtype": "float64"}
+    return {"numeric_dtype": "float32", "dummy_dtype": "uint8", "label_dtype": "uint8"}
+
 
-    logger.info("Starting dummy encoding for categorical variables: {}", cat_cols)
-    for col in cat_vars:
-        cat_vars[col] = cat_vars[col].astype("category")
-        cat_vars = create_dummy_cols(cat_vars, col)
-        logger.debug("Dummy creation finished for '{}'. Current cat_vars shape: {}", col, cat_vars.shape)
+def build_features():
+    with profile_stage("features") as stage:
+        logger.info("Starting feature engineering from {}", input_path)
 
-    data = pd.concat([other_vars, cat_vars], axis=1)
-    logger.info("Recombined dataframe shape after dummy encoding: {}", data.shape)
+        columns = [col for col in artifact_columns(input_path) if col not in UNUSED_COLS]
+        data = read_artifact(input_path, columns=columns)
 
+        stage.record_memory("cleaned", data)
 
-    for col in data:
-        data[col] = data[col].astype("float64")
-        logger.debug("Converted column '{}' to float64", col)
+        preprocessor = joblib.load(interim_preprocessor_path)
+        preprocessor.fit_encoding(data, CAT_COLS)
 
-    y = data["lead_indicator"]
-    X = data.drop(["lead_indicator"], axis=1)
+        logger.info("Starting dummy encoding for categorical variables: {}", CAT_COLS)
+        dtypes = feature_dtypes(features_path)
+        X = preprocessor.encode(
+            data, dummy_dtype=dtypes["dummy_dtype"], numeric_dtype=dtypes["numeric_dtype"]
+        )
+        y = data[LABEL_COL].astype(dtypes["label_dtype"])
+        stage.rows = len(X)
+        stage.record_memory("features", X)
+        logger.info("Encoded feature matrix shape: {}", X.shape)
 
-    labels_path = PROCESSED_DATA_DIR / "labels.csv"
-    features_path = PROCESSED_DATA_DIR / "features.csv"
+        write_artifact(y, labels_path)
+        write_artifact(X, features_path)
 
-    y.to_csv(labels_path, index=False)
-    X.to_csv(features_path, index=False)
+        logger.success(
+            "Saved processed labels to {} and features to {}", labels_path, features_path
+        )
 
-    logger.success("Saved processed labels to {} and features to {}", labels_path, features_path)
+        joblib.dump(value=preprocessor, filename=preprocessor_path)
+        logger.info("Saved preprocessor with dummy vocabulary to {}", preprocessor_path)
+
+    # Training only starts from outputs that pass, a failure leaves nothing in the stage cache
+    validate(features_path, labels_path, preprocessor, dtypes)
+
+
+@app.command()
+def main(force: bool = False):
+    inputs = [
+        input_path,
+        interim_preprocessor_path,
+        Path(__file__),
+        PACKAGE_DIR / "preprocessing.py",
+        PACKAGE_DIR / "helpers.py",
+    ]
+    outputs = [labels_path, features_path, preprocessor_path]
+    run_stage("features", inputs, outputs, build_features, force=force)
+    # Also after a cache hit, which may have restored other features than the store holds
+    store = FeatureStore(feature_store_dir)
+    if store.source == source_fingerprint(features_path, input_path):
+        logger.info("Feature store {} is up to date", feature_store_dir)
+    else:
+        store.sync(features_path, input_path)
 
 
 if __name__ == "__main__":
@@ -1,59 +1,398 @@
-from typing import Any
+from contextlib import contextmanager
+import os
+from pathlib import Path
+import tempfile
 
 from loguru import logger
-from mlflow.pyfunc.model import PythonModel
+import numpy as np
 import pandas as pd
-from sklearn.model_selection import train_test_split
 
-from itu_sdse_project.config import PROCESSED_DATA_DIR, RANDOM_STATE
+from itu_sdse_project.config import (
+    ARTIFACT_FORMAT,
+    INTERIM_DATA_DIR,
+    PROCESSED_DATA_DIR,
+    RANDOM_STATE,
+)
+from itu_sdse_project.profiling import profile_stage
 
+ARTIFACT_FORMATS = ("csv", "parquet", "feather")
 
-def load_data():
-    features_path = PROCESSED_DATA_DIR / "features.csv"
-    labels_path = PROCESSED_DATA_DIR / "labels.csv"
 
-    logger.info("Loading processed features from {}", features_path)
-    logger.info("Loading processed labels from {}", labels_path)
+# Share of leads held out for testing
+TEST_SIZE = 0.15
 
-    X = pd.read_csv(features_path)
-    y = pd.read_csv(labels_path)
+# Like joblib, only use /dev/shm when it is large enough, Docker defaults it to 64 MB
+SHARED_MEMORY_MIN_BYTES = 2 * 1024**3
 
-    logger.info(
-        "Loaded processed data. X shape: {}, y shape: {}. Performing train/test split.",
-        X.shape,
-        y.shape,
-    )
 
-    x_train, x_test, y_train, y_test = train_test_split(
-        X,
-        y,
-        random_state=RANDOM_STATE,
-        test_size=0.15,
-        stratify=y,
-    )
+def __getattr__(name):
+    # MLFlowWrapper lives next to the training code so that importing helpers does not
+    # import MLflow. Models logged before the move still unpickle through this name.
+    if name == "MLFlowWrapper":
+        from itu_sdse_project.modeling.wrapper import MLFlowWrapper
 
-    logger.info(
-        "Completed split. X_train: {}, X_test: {}, y_train: {}, y_test: {}",
-        x_train.shape,
-        x_test.shape,
-        y_train.shape,
-        y_test.shape,
-    )
+        return MLFlowWrapper
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-    return x_train, x_test, y_train, y_test
 
+def artifact_path(directory: Path, name: str) -> Path:
+    if ARTIFACT_FORMAT not in ARTIFACT_FORMATS:
+        raise ValueError(
+            f"Unknown ARTIFACT_FORMAT '{ARTIFACT_FORMAT}', use one of {ARTIFACT_FORMATS}"
+        )
+    return directory / f"{name}.{ARTIFACT_FORMAT}"
+
+
+def artifact_columns(path: Path) -> list[str]:
+    """Column names of an artifact, read from its header or schema only."""
+    if path.suffix == ".csv":
+        return list(pd.read_csv(path, nrows=0).columns)
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if path.suffix == ".parquet":
+        return pq.read_schema(path).names
+    with pa.memory_map(str(path)) as source:
+        return pa.ipc.open_file(source).schema.names
+
+
+def read_artifact(path: Path, columns: list[str] | None = None) -> pd.DataFrame:
+    """
+    Reads a CSV, Parquet or Feather artifact, parsing only `columns` if given.
+    Feather files are uncompressed and memory-mapped, so untouched columns are never paged in.
+    """
+    if path.suffix == ".csv":
+        return pd.read_csv(path, usecols=columns)
+    if path.suffix == ".parquet":
+        return pd.read_parquet(path, columns=columns, memory_map=True)
+    if path.suffix == ".feather":
+        from pyarrow import feather
+
+        return feather.read_table(path, columns=columns, memory_map=True).to_pandas()
+    raise ValueError(f"Unsupported artifact type '{path.suffix}' for {path}")
+
+
+def iter_artifact(path: Path, chunksize: int, columns: list[str] | None = None):
+    """Yields an artifact as DataFrames of at most `chunksize` rows, in file order."""
+    if path.suffix == ".csv":
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunksize)
+    elif path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(path, memory_map=True)
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    elif path.suffix == ".feather":
+        from pyarrow import feather
+
+        table = feather.read_table(path, columns=columns, memory_map=True)
+        for offset in range(0, table.num_rows, chunksize):
+            yield table.slice(offset, chunksize).to_pandas()
+    else:
+        raise ValueError(f"Unsupported artifact type '{path.suffix}' for {path}")
+
+
+# Rows an `ArtifactWriter` holds back while a column has no values to infer its type from
+PENDING_MAX_ROWS = 1_000_000
+
+
+class ArtifactWriter:
+    """
+    Appends DataFrame chunks to a single CSV, Parquet or Feather artifact.
+    Parquet is zstd-compressed, Feather is left uncompressed so it can be memory-mapped.
+    Columns that are empty in the first chunks take their type from the first chunk in
+    which they hold a value, within PENDING_MAX_ROWS rows.
+    """
+
+    def __init__(self, path: Path):
+        if path.suffix not in {f".{fmt}" for fmt in ARTIFACT_FORMATS}:
+            raise ValueError(f"Unsupported artifact type '{path.suffix}' for {path}")
+        self.path = path
+        self._started = False
+        self._schema = None
+        self._writer = None
+        self._empty = None
+        self._pending = []
+        self._pending_rows = 0
+
+    def write(self, df: pd.DataFrame):
+        if self.path.suffix == ".csv":
+            mode = "a" if self._started else "w"
+            df.to_csv(self.path, index=False, header=not self._started, mode=mode)
+            self._started = True
+            return
+
+        if df.empty:
+            # Column types of an empty frame can't be inferred, only use it if nothing follows
+            self._empty = df
+            return
+
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is not None:
+            self._writer.write_table(table.cast(self._schema))
+            return
+
+        # A column without any value has no type to go by yet, e.g. all-NaN floats followed
+        # by strings, so the file is only opened once every column has shown one
+        self._pending.append(table)
+        self._pending_rows += table.num_rows
+        if self._untyped() and self._pending_rows < PENDING_MAX_ROWS:
+            return
+        self._flush_pending()
+
+    def _untyped(self) -> list[int]:
+        return [
+            i
+            for i in range(self._pending[0].num_columns)
+            if all(table.column(i).null_count == table.num_rows for table in self._pending)
+        ]
+
+    def _flush_pending(self):
+        schema = self._pending[0].schema
+        for i, field in enumerate(schema):
+            typed = next((t for t in self._pending if t.column(i).null_count < t.num_rows), None)
+            if typed is not None:
+                schema = schema.set(i, field.with_type(typed.schema.field(i).type))
+        self._open(schema)
+        for table in self._pending:
+            self._writer.write_table(table.cast(self._schema))
+        self._pending = []
+
+    def _open(self, schema):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # Every chunk of a categorical column has its own categories, and pandas picks the
+        # smallest index type for them. A Feather file can only hold one dictionary per
+        # column, so the values are stored there, Parquet dictionary-encodes them anyway.
+        for i, field in enumerate(schema):
+            if pa.types.is_dictionary(field.type):
+                value_type = field.type.value_type
+                if self.path.suffix == ".parquet":
+                    value_type = pa.dictionary(pa.int32(), value_type)
+                schema = schema.set(i, field.with_type(value_type))
+        self._schema = schema
+        if self.path.suffix == ".parquet":
+            self._writer = pq.ParquetWriter(self.path, schema, compression="zstd")
+        else:
+            self._writer = pa.ipc.new_file(str(self.path), schema)
+
+    def close(self):
+        if self._pending:
+            self._flush_pending()
+        if self._writer is None and self._empty is not None:
+            import pyarrow as pa
+
+            self._open(pa.Table.from_pandas(self._empty, preserve_index=False).schema)
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
 
-class MLFlowWrapper(PythonModel):
-    def __init__(self, model):
-        self.model = model
+    def __enter__(self):
+        return self
 
-    def load_context(self, context):
-        import joblib
+    def __exit__(self, *exc_info):
+        self.close()
 
-        self.model = joblib.load(context.artifacts["model"])
 
-    def predict(self, context, model_input: pd.DataFrame, params: dict[str, Any] | None = None)-> pd.DataFrame:
-        return self.model.predict_proba(model_input)[:, 1]
+def write_artifact(df: pd.DataFrame | pd.Series, path: Path):
+    if isinstance(df, pd.Series):
+        df = df.to_frame()
+    with ArtifactWriter(path) as writer:
+        writer.write(df)
+
+
+def append_artifact(df: pd.DataFrame | pd.Series, path: Path, chunksize: int = 100_000):
+    """
+    Appends rows to an existing artifact, in its column order. CSV files are appended in
+    place. Parquet and Feather files cannot grow, so they are copied chunk by chunk into
+    a new file together with the rows, which then replaces the old one.
+    """
+    if isinstance(df, pd.Series):
+        df = df.to_frame()
+    df = df[artifact_columns(path)]
+    if path.suffix == ".csv":
+        df.to_csv(path, index=False, header=False, mode="a")
+        return
+
+    partial = path.with_name(f"{path.stem}.partial{path.suffix}")
+    with ArtifactWriter(partial) as writer:
+        for chunk in iter_artifact(path, chunksize):
+            writer.write(chunk)
+        writer.write(df)
+    os.replace(partial, path)
+
+
+@contextmanager
+def shared_data_dir():
+    """Temporary directory for training buffers shared with worker processes."""
+    root = None
+    if os.path.isdir("/dev/shm"):
+        stats = os.statvfs("/dev/shm")
+        if stats.f_frsize * stats.f_blocks >= SHARED_MEMORY_MIN_BYTES:
+            root = "/dev/shm"
+    with tempfile.TemporaryDirectory(prefix="itu_sdse_", dir=root) as directory:
+        yield Path(directory)
+
+
+def share_array(array: np.ndarray | pd.DataFrame, path: Path, dtype: str, chunksize=65_536):
+    """
+    Copies `array` into a C-contiguous .npy file of `dtype` and maps it read-only.
+    joblib sends memory-mapped arrays to workers by file name, so every worker reads the
+    same pages instead of receiving a pickled copy. Rows are converted in chunks to
+    avoid a second full-size copy.
+    """
+    out = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=array.shape)
+    for start in range(0, array.shape[0], chunksize):
+        rows = slice(start, start + chunksize)
+        out[rows] = np.asarray(array.iloc[rows] if hasattr(array, "iloc") else array[rows], dtype)
+    out.flush()
+    del out
+    return np.load(path, mmap_mode="r")
+
+
+def share_sparse(matrix, directory: Path, name: str):
+    """Maps the arrays of a CSR matrix read-only from `directory`, see `share_array`."""
+    from scipy.sparse import csr_matrix
+
+    parts = [
+        share_array(part, directory / f"{name}_{field}.npy", part.dtype)
+        for field, part in (
+            ("data", matrix.data),
+            ("indices", matrix.indices),
+            ("indptr", matrix.indptr),
+        )
+    ]
+    return csr_matrix(tuple(parts), shape=matrix.shape, copy=False)
+
+
+def read_sparse(path: Path, dtype: str, columns: list[str] | None = None, chunksize=100_000):
+    """
+    Reads an artifact into a CSR matrix of `dtype`, converting `chunksize` rows at a time,
+    so only one dense chunk is held next to the sparse result.
+    """
+    from scipy import sparse
+
+    chunks = [
+        sparse.csr_matrix(chunk.to_numpy(dtype=dtype))
+        for chunk in iter_artifact(path, chunksize, columns=columns)
+    ]
+    if not chunks:
+        return sparse.csr_matrix((0, len(columns or artifact_columns(path))), dtype=dtype)
+    return sparse.vstack(chunks, format="csr")
+
+
+def split_rows(lead_ids, labels) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Positions of the training and test rows of appended leads. Within each label class a
+    row is held out when a hash of its lead_id, RANDOM_STATE and the class falls in the
+    lowest TEST_SIZE of the hash range, so about TEST_SIZE of every class is held out and
+    appending more leads never moves a row to the other side. Both sides are ordered by
+    the hash, which shuffles them the same way on every load.
+    """
+    ids = np.asarray(lead_ids, dtype=np.uint64) ^ np.uint64(RANDOM_STATE)
+    labels = np.asarray(labels).ravel()
+    hashes = np.empty(len(ids), dtype=np.uint64)
+    for i, label in enumerate(np.unique(labels)):
+        rows = labels == label
+        hashes[rows] = pd.util.hash_array(ids[rows] + np.uint64(i))
+    order = np.argsort(hashes, kind="stable")
+    test = hashes[order] / 2.0**64 < TEST_SIZE
+    return order[~test], order[test]
+
+
+def load_data(
+    columns: list[str] | None = None,
+    sparse: bool = False,
+    dtype: str = "float64",
+    shared_dir: Path | None = None,
+    stable_from: int | None = None,
+):
+    """
+    Loads processed features and labels and splits them for training, stratified on the
+    label. With `stable_from`, only the first `stable_from` rows are split that way and
+    the rows appended after them are split by the lead_id of the cleaned data they were
+    encoded from (see `split_rows`), so incremental updates test on the same rows as the
+    full run they started from. With `sparse`, features come back as a CSR matrix built
+    chunk by chunk (see `read_sparse`), so wide one-hot matrices are never held dense as a
+    whole. With `shared_dir`, the training features and labels are memory-mapped from
+    files in that directory (see `shared_data_dir`), so search workers share one copy of
+    them.
+    """
+    with profile_stage("load_data") as stage:
+        features_path = artifact_path(PROCESSED_DATA_DIR, "features")
+        labels_path = artifact_path(PROCESSED_DATA_DIR, "labels")
+
+        logger.info("Loading processed features from {}", features_path)
+        logger.info("Loading processed labels from {}", labels_path)
+
+        y = read_artifact(labels_path)
+        if sparse:
+            X = read_sparse(features_path, dtype, columns=columns)
+        else:
+            X = read_artifact(features_path, columns=columns)
+            stage.record_memory("stored", X)
+            if shared_dir is None:
+                X = X.astype(dtype)
+            stage.record_memory("features", X)
+        stage.rows = X.shape[0]
+
+        logger.info(
+            "Loaded processed data. X shape: {}, y shape: {}. Performing train/test split.",
+            X.shape,
+            y.shape,
+        )
+
+        from sklearn.model_selection import train_test_split
+
+        rows = X.shape[0] if stable_from is None else stable_from
+        # The same rows as splitting X and y themselves would give
+        train_rows, test_rows = train_test_split(
+            np.arange(rows),
+            random_state=RANDOM_STATE,
+            test_size=TEST_SIZE,
+            stratify=y.iloc[:rows],
+        )
+        if rows < X.shape[0]:
+            ids_path = artifact_path(INTERIM_DATA_DIR, "cleaned_data")
+            lead_ids = read_artifact(ids_path, columns=["lead_id"])["lead_id"]
+            if len(lead_ids) != X.shape[0]:
+                raise ValueError(
+                    f"{features_path} has {X.shape[0]} rows but {ids_path} has {len(lead_ids)}"
+                )
+            new_train, new_test = split_rows(lead_ids.iloc[rows:], y.iloc[rows:])
+            train_rows = np.concatenate([train_rows, new_train + rows])
+            test_rows = np.concatenate([test_rows, new_test + rows])
+        if sparse:
+            x_train, x_test = X[train_rows], X[test_rows]
+        else:
+            x_train, x_test = X.iloc[train_rows], X.iloc[test_rows]
+        y_train, y_test = y.iloc[train_rows], y.iloc[test_rows]
+
+        if shared_dir is not None:
+            if sparse:
+                x_train = share_sparse(x_train, shared_dir, "X_train")
+            else:
+                buffer = share_array(x_train, shared_dir / "X_train.npy", dtype)
+                x_train = pd.DataFrame(buffer, columns=x_train.columns, copy=False)
+                x_test = x_test.astype(dtype)
+            y_train = share_array(
+                y_train.iloc[:, 0], shared_dir / "y_train.npy", y_train.dtypes.iloc[0]
+            )
+            logger.info("Shared training buffers in {}", shared_dir)
+
+        logger.info(
+            "Completed split. X_train: {}, X_test: {}, y_train: {}, y_test: {}",
+            x_train.shape,
+            x_test.shape,
+            y_train.shape,
+            y_test.shape,
+        )
+
+    return x_train, x_test, y_train, y_test
 
 
 def describe_numeric_col(x):
@@ -0,0 +1,119 @@
+import atexit
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+import os
+from pathlib import Path
+import pickle
+import threading
+
+import joblib
+from loguru import logger
+
+from itu_sdse_project.config import MODEL_FORMAT
+from itu_sdse_project.profiling import profile_stage
+
+MODEL_FORMATS = ("mmap", "compressed")
+# joblib's suggested trade-off, most of lzma's ratio at a fraction of its time
+COMPRESSION = ("zlib", 3)
+
+_background_logger = None
+
+
+class BackgroundLogger:
+    """
+    Runs logging jobs on one background thread, in the order they were submitted, so the
+    next training job does not wait for MLflow to copy artifacts. Each job declares the
+    files it reads, and `save_model` waits for the jobs that still read a file before
+    overwriting it. `flush` waits for all jobs and raises the first error.
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="artifact-logger")
+        self._pending: list[tuple[Future, set[Path]]] = []
+        self._lock = threading.Lock()
+
+    def submit(self, job, *args, paths=(), **kwargs) -> Future:
+        future = self._executor.submit(job, *args, **kwargs)
+        with self._lock:
+            self._pending.append((future, {Path(path) for path in paths}))
+        return future
+
+    def wait_for(self, path: Path):
+        with self._lock:
+            futures = [future for future, paths in self._pending if Path(path) in paths]
+        wait(futures)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if pending:
+            logger.info("Waiting for {} queued logging job(s)", len(pending))
+        errors = [future.exception() for future, _ in pending]
+        errors = [error for error in errors if error is not None]
+        if errors:
+            raise errors[0]
+
+
+def background_logger() -> BackgroundLogger:
+    """The logger of this process, flushed at exit if nobody did before."""
+    global _background_logger
+    if _background_logger is None:
+        _background_logger = BackgroundLogger()
+        atexit.register(_flush_at_exit)
+    return _background_logger
+
+
+def flush_logging(*_):
+    """Waits for the queued logging jobs. Takes any arguments, as a Typer `result_callback`."""
+    background_logger().flush()
+
+
+def _flush_at_exit():
+    try:
+        _background_logger.flush()
+    except Exception:  # noqa: BLE001 - at exit there is nobody left to raise to
+        logger.exception("Queued logging job failed")
+
+
+def save_model(model, path: Path, fmt: str = MODEL_FORMAT):
+    """
+    Pickles `model` to `path`, zlib-compressed for "compressed" or uncompressed for "mmap",
+    whose NumPy arrays `load_model` maps into memory instead of reading them. The pickle is
+    written next to `path` and renamed over it, so processes that still map the old file
+    keep reading it. Logs the save time and file size as the `save_model` stage.
+    """
+    if fmt not in MODEL_FORMATS:
+        raise ValueError(f"Unknown model format '{fmt}', use one of {MODEL_FORMATS}")
+    background_logger().wait_for(path)
+    with profile_stage("save_model") as stage:
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            joblib.dump(model, tmp_path, compress=COMPRESSION if fmt == "compressed" else 0)
+            tmp_path.replace(path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        stage.metrics["model_size_mb"] = path.stat().st_size / 1024**2
+
+
+def load_model(path: Path):
+    """
+    Loads a model written by `save_model`, memory-mapping the arrays of uncompressed
+    pickles, and logs the load time as the `load_model` stage.
+    """
+    with open(path, "rb") as f:
+        # Compressed files start with the compressor's magic number, not the pickle protocol
+        compressed = f.read(1) != pickle.PROTO
+    with profile_stage("load_model"):
+        return joblib.load(path, mmap_mode=None if compressed else "r")
+
+
+def detach_run() -> str:
+    """
+    Takes the active MLflow run off this thread's run stack without ending it, so that a
+    logging job can resume it with `mlflow.start_run(run_id=...)` and end it. Leaving its
+    `with mlflow.start_run()` block then no longer ends it. Returns the run id.
+    """
+    import mlflow
+
+    run_id = mlflow.active_run().info.run_id
+    mlflow.end_run(status="RUNNING")
+    return run_id
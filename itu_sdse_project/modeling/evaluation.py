@@ -0,0 +1,127 @@
+from loguru import logger
+import numpy as np
+
+from itu_sdse_project.profiling import profile_stage
+
+# Threshold of `predict`, which the f1_score that selection ranks on is computed at
+DEFAULT_THRESHOLD = 0.5
+# Shares of the highest scored rows that lift is reported for
+LIFT_FRACTIONS = (0.01, 0.05, 0.1)
+# Points of the logged precision/recall curve, spread evenly over its thresholds
+CURVE_POINTS = 1_000
+CURVE_ARTIFACT = "evaluation/pr_curve.json"
+
+
+def threshold_curves(y_true, scores) -> dict:
+    """
+    Confusion counts, precision, recall and F1 at every distinct score, where a row counts as
+    positive if its score is at least the threshold. One sort and two cumulative sums over
+    the rows, instead of scoring the predictions again for every threshold.
+    """
+    y_true = np.asarray(y_true).ravel()
+    scores = np.asarray(scores).ravel()
+    if len(y_true) != len(scores):
+        raise ValueError(f"{len(y_true)} labels but {len(scores)} scores")
+
+    order = np.argsort(scores, kind="stable")[::-1]
+    ranked = scores[order]
+    tp = np.cumsum(y_true[order] == 1, dtype=np.int64)
+    # The last row of each run of equal scores, so tied rows fall on the same side
+    cuts = np.flatnonzero(np.diff(ranked, append=-np.inf))
+    tp = tp[cuts]
+    fp = cuts + 1 - tp
+    positives = tp[-1] if len(tp) else 0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = tp / (tp + fp)
+        recall = tp / positives if positives else np.zeros(len(tp))
+        f1 = np.nan_to_num(2 * precision * recall / (precision + recall))
+    return {
+        "thresholds": ranked[cuts],
+        "tp": tp,
+        "fp": fp,
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+        "rows": len(scores),
+        "positives": int(positives),
+    }
+
+
+def _at_threshold(curves: dict, threshold: float) -> tuple[int, int]:
+    # Rows scored above `threshold`, which is what `predict` labels positive
+    above = np.searchsorted(-curves["thresholds"], -threshold, side="left")
+    if above == 0:
+        return 0, 0
+    return int(curves["tp"][above - 1]), int(curves["fp"][above - 1])
+
+
+def summarize(curves: dict, threshold: float = DEFAULT_THRESHOLD) -> dict[str, float]:
+    """
+    F1, precision and recall at `threshold`, PR-AUC, the threshold with the best F1 and
+    the lift of the highest scored LIFT_FRACTIONS of the rows.
+    """
+    rows, positives = curves["rows"], curves["positives"]
+    tp, fp = _at_threshold(curves, threshold)
+    errors = fp + positives - tp
+
+    best = int(np.argmax(curves["f1"])) if rows else None
+    # Average precision: precision at each threshold, weighted by the recall it adds
+    gained = np.diff(curves["recall"], prepend=0.0)
+    metrics = {
+        "f1_score": 2 * tp / (2 * tp + errors) if tp or errors else 0.0,
+        "precision": tp / (tp + fp) if tp + fp else 0.0,
+        "recall": tp / positives if positives else 0.0,
+        "pr_auc": np.sum(gained * curves["precision"]),
+        "best_f1_score": curves["f1"][best] if best is not None else 0.0,
+        "best_threshold": curves["thresholds"][best] if best is not None else threshold,
+    }
+
+    counts = curves["tp"] + curves["fp"]
+    for fraction in LIFT_FRACTIONS:
+        top = max(1, int(np.ceil(fraction * rows)))
+        lift = 0.0
+        if positives:
+            # Rows tied with the last one in the top share count in proportion to how
+            # many of them fit, so the lift does not depend on how ties are sorted
+            group = int(np.searchsorted(counts, top))
+            tp_above = int(curves["tp"][group - 1]) if group else 0
+            rows_above = int(counts[group - 1]) if group else 0
+            tied_tp = int(curves["tp"][group]) - tp_above
+            tied_rows = int(counts[group]) - rows_above
+            hits = tp_above + tied_tp * (top - rows_above) / tied_rows
+            lift = (hits / top) / (positives / rows)
+        metrics[f"lift_top_{fraction * 100:g}pct"] = lift
+    return {name: float(value) for name, value in metrics.items()}
+
+
+def curve_points(curves: dict, points: int = CURVE_POINTS) -> dict[str, list[float]]:
+    """At most `points` thresholds of the curves, evenly spaced, for logging as JSON."""
+    count = len(curves["thresholds"])
+    index = np.unique(np.linspace(0, count - 1, min(points, count)).astype(int))
+    return {
+        name: curves[name][index].astype(float).tolist()
+        for name in ("thresholds", "precision", "recall", "f1")
+    }
+
+
+def evaluate(y_true, scores, threshold: float = DEFAULT_THRESHOLD) -> tuple[dict, dict]:
+    """
+    Metrics of one `predict_proba` column over every threshold, with the precision/recall
+    curve to log next to them as CURVE_ARTIFACT.
+    """
+    with profile_stage("evaluate", rows=len(scores)):
+        curves = threshold_curves(y_true, scores)
+        metrics = summarize(curves, threshold)
+    return metrics, curve_points(curves)
+
+
+def log_evaluation(name: str, metrics: dict):
+    logger.info(
+        "{} Test F1-score: {:.4f}, PR-AUC: {:.4f}, best F1-score {:.4f} at threshold {:.3f}",
+        name,
+        metrics["f1_score"],
+        metrics["pr_auc"],
+        metrics["best_f1_score"],
+        metrics["best_threshold"],
+    )
@@ -0,0 +1,141 @@
+import json
+from pathlib import Path
+import sqlite3
+
+from loguru import logger
+import mlflow
+
+from itu_sdse_project.config import EXPERIMENT_NAME, LEADERBOARD_PATH
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    family TEXT,
+    data_version TEXT,
+    f1_score REAL,
+    metrics TEXT NOT NULL,
+    model_uri TEXT NOT NULL,
+    start_time INTEGER NOT NULL
+);
+-- Same order as search_runs(order_by=["metrics.f1_score DESC"]), including its tie-breakers
+CREATE INDEX IF NOT EXISTS runs_by_score ON runs (f1_score DESC, start_time DESC, run_id);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+# Runs and logged models are fetched from MLflow in pages of this size
+PAGE_SIZE = 500
+
+
+def _family(run) -> str:
+    # Older runs predate the model_family tag, their names are "<family>_<date>_<time>"
+    return run.data.tags.get("model_family") or run.info.run_name.rsplit("_", 2)[0]
+
+
+class Leaderboard:
+    """
+    Local sqlite index of finished training runs with a logged model: run id, family, data
+    version, metrics and model URI. Training adds its run when it finishes, and `sync`
+    picks up anything else that finished in MLflow since the last sync, so a lost index
+    file is rebuilt from MLflow on first use.
+    """
+
+    def __init__(self, path: Path = LEADERBOARD_PATH, experiment_name: str = EXPERIMENT_NAME):
+        self.experiment_name = experiment_name
+        self._db = sqlite3.connect(path)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(SCHEMA)
+
+        source = f"{mlflow.get_tracking_uri()}#{experiment_name}"
+        if self._meta("source") != source:
+            with self._db:
+                self._db.execute("DELETE FROM runs")
+                self._db.execute("DELETE FROM meta")
+            self._set_meta("source", source)
+
+    def _meta(self, key: str) -> str | None:
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def _set_meta(self, key: str, value):
+        with self._db:
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+
+    def record(self, run, model_name: str):
+        """Adds or updates a finished run whose model was logged under `model_name`."""
+        metrics = run.data.metrics
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    run.info.run_id,
+                    _family(run),
+                    run.data.params.get("data_version"),
+                    metrics.get("f1_score"),
+                    json.dumps(metrics),
+                    f"runs:/{run.info.run_id}/{model_name}",
+                    run.info.start_time,
+                ),
+            )
+
+    def sync(self) -> int:
+        """Indexes the runs that finished since the last sync. Returns how many were added."""
+        experiment = mlflow.get_experiment_by_name(self.experiment_name)
+        if experiment is None:
+            return 0
+
+        client = mlflow.MlflowClient()
+        watermark = int(self._meta("end_time") or 0)
+        finished = f"attributes.status = 'FINISHED' AND attributes.end_time > {watermark}"
+        added, page_token = 0, None
+        while True:
+            runs = client.search_runs(
+                [experiment.experiment_id],
+                filter_string=finished,
+                order_by=["attributes.end_time ASC"],
+                max_results=PAGE_SIZE,
+                page_token=page_token,
+            )
+            if runs:
+                run_ids = ", ".join(f"'{run.info.run_id}'" for run in runs)
+                models = mlflow.search_logged_models(
+                    experiment_ids=[experiment.experiment_id],
+                    filter_string=f"source_run_id IN ({run_ids})",
+                    output_format="list",
+                )
+                model_names = {model.source_run_id: model.name for model in models}
+                for run in runs:
+                    if run.info.run_id in model_names:
+                        self.record(run, model_names[run.info.run_id])
+                        added += 1
+                self._set_meta("end_time", max(run.info.end_time for run in runs))
+
+            page_token = runs.token
+            if not page_token:
+                break
+
+        if added:
+            logger.info("Added {} finished runs to the leaderboard", added)
+        return added
+
+    def best(self, data_version: str | None = None, family: str | None = None) -> dict | None:
+        """Highest f1_score run, optionally restricted to a data version and model family."""
+        conditions, args = ["f1_score IS NOT NULL"], []
+        if data_version is not None:
+            conditions.append("data_version = ?")
+            args.append(data_version)
+        if family is not None:
+            conditions.append("family = ?")
+            args.append(family)
+
+        row = self._db.execute(
+            f"SELECT * FROM runs WHERE {' AND '.join(conditions)} "
+            "ORDER BY f1_score DESC, start_time DESC, run_id LIMIT 1",
+            args,
+        ).fetchone()
+        if row is None:
+            return None
+        return {**dict(row), "metrics": json.loads(row["metrics"])}
+
+    def remove(self, run_id: str):
+        with self._db:
+            self._db.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
@@ -0,0 +1,160 @@
+from collections import OrderedDict
+import os
+from pathlib import Path
+import shutil
+import tempfile
+import threading
+
+from loguru import logger
+import typer
+
+from itu_sdse_project.config import (
+    MODEL_CACHE_DIR,
+    MODEL_CACHE_MAX_BYTES,
+    MODEL_CACHE_MAX_LOADED,
+    MODEL_NAME,
+)
+from itu_sdse_project.profiling import profile_stage
+
+app = typer.Typer()
+
+
+def load_wrapper(path: Path):
+    """
+    The `MLFlowWrapper` of a downloaded model directory, scoring with its compiled scorer
+    if selection stored one.
+    """
+    import mlflow
+
+    from itu_sdse_project.modeling.compiled import SCORER_ARTIFACT, load_scorer
+
+    wrapper = mlflow.pyfunc.load_model(str(path)).unwrap_python_model()
+    scorer_path = Path(path) / SCORER_ARTIFACT
+    if scorer_path.exists():
+        # Same probabilities as the pickled model, at a fraction of its per-request overhead
+        wrapper.model = load_scorer(scorer_path)
+        logger.info("Scoring with the compiled {} scorer", wrapper.model.kind)
+    else:
+        logger.info("No compiled scorer for this model version, scoring with the pickle")
+    return wrapper
+
+
+class ModelCache:
+    """
+    Local copies of the versions of a registered model under `<root>/<name>/<key>`, where
+    the key is the version number and the run it came from, since a recreated registry
+    numbers its versions from 1 again.
+
+    `get` resolves an alias with one registry lookup, downloads the version only if no
+    copy exists and deserializes it only if this process does not hold it yet. Copies
+    beyond `max_bytes` and models beyond `max_loaded` are evicted least recently used first.
+    """
+
+    def __init__(
+        self,
+        name: str = MODEL_NAME,
+        root: Path = MODEL_CACHE_DIR,
+        max_bytes: int = MODEL_CACHE_MAX_BYTES,
+        max_loaded: int = MODEL_CACHE_MAX_LOADED,
+    ):
+        self.name = name
+        self.root = Path(root) / name
+        self.max_bytes = max_bytes
+        self.max_loaded = max_loaded
+        self._loaded: OrderedDict[str, object] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resolve(self, alias: str = "staging") -> str:
+        """Key of the version `alias` points at."""
+        import mlflow
+
+        version = mlflow.MlflowClient().get_model_version_by_alias(self.name, alias)
+        return f"{version.version}-{version.run_id}"
+
+    def path(self, key: str) -> Path:
+        """Local directory of the version with `key`, downloaded if it is not cached yet."""
+        entry = self.root / key
+        if not (entry / "MLmodel").exists():
+            self._download(key, entry)
+        # The entry's mtime is its last use, which drives eviction
+        os.utime(entry)
+        return entry
+
+    def _download(self, key: str, entry: Path):
+        import mlflow
+
+        version = key.split("-", 1)[0]
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_entry = Path(tempfile.mkdtemp(prefix=f"{key}.", suffix=".tmp", dir=self.root))
+        with profile_stage("download_model"):
+            mlflow.artifacts.download_artifacts(
+                f"models:/{self.name}/{version}", dst_path=str(tmp_entry)
+            )
+        if not (entry / "MLmodel").exists():
+            # Left behind by an interrupted eviction
+            shutil.rmtree(entry, ignore_errors=True)
+        try:
+            tmp_entry.rename(entry)
+        except OSError:
+            # Another process finished downloading the same version first
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+        logger.info("Cached version {} of model '{}' in {}", version, self.name, entry)
+        self.evict(keep=entry)
+
+    def load(self, key: str):
+        """The scoring wrapper of the version with `key`, deserialized once per process."""
+        with self._lock:
+            if key in self._loaded:
+                self._loaded.move_to_end(key)
+                return self._loaded[key]
+
+        with profile_stage("load_model_version"):
+            wrapper = load_wrapper(self.path(key))
+        with self._lock:
+            self._loaded[key] = wrapper
+            while len(self._loaded) > self.max_loaded:
+                self._loaded.popitem(last=False)
+        return wrapper
+
+    def get(self, alias: str = "staging"):
+        """The scoring wrapper of the version `alias` points at, with its key."""
+        key = self.resolve(alias)
+        return self.load(key), key
+
+    def evict(self, keep: Path | None = None):
+        entries = []
+        for entry in self.root.iterdir():
+            if entry.is_dir() and (entry / "MLmodel").exists():
+                size = sum(f.stat().st_size for f in entry.rglob("*") if f.is_file())
+                entries.append((entry.stat().st_mtime, size, entry))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            if entry == keep:
+                continue
+            logger.info("Evicting cached model version {} ({} bytes)", entry.name, size)
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+
+@app.command()
+def main(alias: str = "staging", output: Path | None = None):
+    """
+    Caches the version of the registered model that `alias` points at, if it is not cached
+    yet, and logs its directory. `--output` also copies its pickled model there.
+    """
+    import mlflow
+
+    cache = ModelCache()
+    entry = cache.path(cache.resolve(alias))
+    logger.success("Version '{}' of model '{}' is cached in {}", alias, cache.name, entry)
+    if output is not None:
+        flavor = mlflow.models.Model.load(str(entry / "MLmodel")).flavors["python_function"]
+        shutil.copyfile(entry / flavor["artifacts"]["model"]["path"], output)
+        logger.info("Copied its pickled model to {}", output)
+
+
+if __name__ == "__main__":
+    app()
@@ -1,4 +1,5 @@
-# TODO: move this to test, then delete this file
+from collections import deque
+from multiprocessing import Pool
 from pathlib import Path
 
 import joblib
@@ -6,23 +7,37 @@ from loguru import logger
 import pandas as pd
 import typer
 
-from itu_sdse_project.config import MODELS_DIR, PROCESSED_DATA_DIR
+from itu_sdse_project.config import FEATURE_STORE_DIR, MODELS_DIR, PROCESSED_DATA_DIR
+from itu_sdse_project.feature_store import ID_COL, FeatureStore
+from itu_sdse_project.helpers import ArtifactWriter, artifact_path, iter_artifact, read_artifact
+from itu_sdse_project.modeling.artifacts import load_model
+from itu_sdse_project.profiling import profile_stage
 
 app = typer.Typer()
 
+features_path_default = artifact_path(PROCESSED_DATA_DIR, "features")
+predictions_path_default = artifact_path(PROCESSED_DATA_DIR, "predictions")
+lead_predictions_path_default = artifact_path(PROCESSED_DATA_DIR, "lead_predictions")
+# Written by `train.py xgboost`
+model_path_default = MODELS_DIR / "xgboost.pkl"
 
+# Model of the current scoring process, loaded once per worker by `_load_model`
+_model = None
+
+
+# TODO: move this to test, then delete this command
 @app.command()
 def main(
     features_path: Path = PROCESSED_DATA_DIR / "X_test.csv",
-    model_path: Path = MODELS_DIR / "model.pkl",
+    model_path: Path = model_path_default,
     predictions_path: Path = PROCESSED_DATA_DIR / "y_test.csv",
 ):
     logger.info("Starting inference.")
     with open(model_path, "rb") as f:
         model = joblib.load(f)
 
-    X = pd.read_csv(features_path)
-    y = pd.read_csv(predictions_path)
+    X = read_artifact(features_path)
+    y = read_artifact(predictions_path)
 
     predictions = model.predict(X.head(5))
     logger.debug("Sample predictions: {}", predictions)
@@ -30,5 +45,102 @@ def main(
     logger.success("Inference complete.")
 
 
+def _load_model(model_path: Path, single_threaded: bool):
+    global _model
+    _model = load_model(model_path)
+    if single_threaded and "n_jobs" in _model.get_params():
+        # Parallelism comes from the worker processes, threads would only oversubscribe
+        _model.set_params(n_jobs=1)
+
+
+def _score_chunk(X: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame({"probability": _model.predict_proba(X)[:, 1]})
+
+
+@app.command()
+def batch(
+    features_path: Path = features_path_default,
+    model_path: Path = model_path_default,
+    output_path: Path = predictions_path_default,
+    chunksize: int = 100_000,
+    workers: int = 1,
+):
+    """
+    Scores a feature artifact in chunks, optionally across several worker processes.
+
+    The positive class probability of every row is appended to `output_path` in input
+    order. Each worker loads the model once and at most two chunks per worker are in
+    flight, so memory is bounded by the chunk size rather than the file size.
+    """
+    logger.info(
+        "Batch scoring {} with {} in chunks of {} rows on {} worker(s)",
+        features_path,
+        model_path,
+        chunksize,
+        workers,
+    )
+    with profile_stage("predict") as stage:
+        chunks = iter_artifact(features_path, chunksize)
+        rows = 0
+
+        with ArtifactWriter(output_path) as writer:
+            if workers == 1:
+                _load_model(model_path, single_threaded=False)
+                for X in chunks:
+                    writer.write(_score_chunk(X))
+                    rows += len(X)
+            else:
+                with Pool(workers, initializer=_load_model, initargs=(model_path, True)) as pool:
+                    pending = deque()
+                    for X in chunks:
+                        pending.append(pool.apply_async(_score_chunk, (X,)))
+                        if len(pending) >= 2 * workers:
+                            scores = pending.popleft().get()
+                            writer.write(scores)
+                            rows += len(scores)
+                    while pending:
+                        scores = pending.popleft().get()
+                        writer.write(scores)
+                        rows += len(scores)
+        stage.rows = rows
+
+    logger.success("Scored {} rows into {}", rows, output_path)
+
+
+@app.command()
+def leads(
+    lead_ids_path: Path,
+    model_path: Path = model_path_default,
+    output_path: Path = lead_predictions_path_default,
+    feature_store: Path = FEATURE_STORE_DIR,
+    chunksize: int = 100_000,
+):
+    """
+    Scores the leads listed in the `lead_id` column of `lead_ids_path` with their features
+    from the feature store, instead of cleaning and encoding them again. Every lead id is
+    written to `output_path` with its positive class probability, in input order.
+    """
+    store = FeatureStore(feature_store)
+    logger.info(
+        "Scoring the leads in {} from the feature store {} ({} leads) with {}",
+        lead_ids_path,
+        feature_store,
+        len(store),
+        model_path,
+    )
+    _load_model(model_path, single_threaded=False)
+    with profile_stage("predict_leads") as stage, ArtifactWriter(output_path) as writer:
+        rows = 0
+        for chunk in iter_artifact(lead_ids_path, chunksize, columns=[ID_COL]):
+            X = store.lookup(chunk[ID_COL].to_numpy())
+            scores = _score_chunk(X)
+            scores.insert(0, ID_COL, X.index.to_numpy())
+            writer.write(scores)
+            rows += len(scores)
+        stage.rows = rows
+
+    logger.success("Scored {} leads into {}", rows, output_path)
+
+
 if __name__ == "__main__":
     app()
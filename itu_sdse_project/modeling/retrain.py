@@ -0,0 +1,242 @@
+import datetime
+from pathlib import Path
+import runpy
+import time
+
+import joblib
+from loguru import logger
+import mlflow
+import numpy as np
+import pandas as pd
+import typer
+
+from itu_sdse_project import features
+from itu_sdse_project.cache import PACKAGE_DIR
+from itu_sdse_project.config import (
+    EXPERIMENT_NAME,
+    FEATURE_STORE_DIR,
+    FULL_REFIT_DAYS,
+    INTERIM_DATA_DIR,
+    MODELS_DIR,
+    PROCESSED_DATA_DIR,
+    RAW_DATA_DIR,
+    TRAINING_CORES,
+)
+from itu_sdse_project.feature_store import FeatureStore, source_fingerprint
+from itu_sdse_project.helpers import append_artifact, artifact_path, load_data, read_artifact
+from itu_sdse_project.modeling import train
+from itu_sdse_project.modeling.artifacts import (
+    background_logger,
+    detach_run,
+    flush_logging,
+    save_model,
+)
+from itu_sdse_project.modeling.evaluation import evaluate, log_evaluation
+from itu_sdse_project.modeling.wrapper import feature_schema
+from itu_sdse_project.preprocessing import LABEL_COL, filter_rows, read_raw
+from itu_sdse_project.profiling import profile_stage
+from itu_sdse_project.validation import validate
+
+# Updates return while their runs are still being logged, the CLI waits for that
+app = typer.Typer(result_callback=flush_logging)
+
+raw_path = RAW_DATA_DIR / "raw_data.csv"
+cleaned_path = artifact_path(INTERIM_DATA_DIR, "cleaned_data")
+features_path = artifact_path(PROCESSED_DATA_DIR, "features")
+labels_path = artifact_path(PROCESSED_DATA_DIR, "labels")
+feature_store_dir = FEATURE_STORE_DIR
+make_dataset_path = PACKAGE_DIR.parent / "data" / "interim" / "make_dataset.py"
+
+# Families in training order, with the pickle each one writes
+FAMILIES = {"xgboost": MODELS_DIR / "xgboost.pkl", "log_reg": MODELS_DIR / "logreg.pkl"}
+
+
+def find_new_leads(raw_path: Path, cleaned_path: Path, chunksize: int = 100_000) -> pd.DataFrame:
+    """Labelled signup rows of the raw file whose lead_id is not in the cleaned store yet."""
+    known = set(read_artifact(cleaned_path, columns=["lead_id"])["lead_id"].astype(str))
+    new = []
+    for chunk in read_raw(raw_path, chunksize=chunksize):
+        rows = filter_rows(chunk)
+        new.append(rows[~rows["lead_id"].astype(str).isin(known)])
+    return pd.concat(new, ignore_index=True)
+
+
+def append_leads(leads: pd.DataFrame, preprocessor) -> int:
+    """
+    Cleans and encodes new leads with the frozen statistics and vocabulary of the last
+    full run and appends them to the cleaned data, features, labels and feature store.
+    Returns the number of feature rows before the new ones.
+    """
+    first_new_row = len(read_artifact(labels_path))
+    cleaned = preprocessor.clean(leads)
+    dtypes = features.feature_dtypes(features_path)
+    X = preprocessor.encode(
+        cleaned, dummy_dtype=dtypes["dummy_dtype"], numeric_dtype=dtypes["numeric_dtype"]
+    )
+    store = FeatureStore(feature_store_dir)
+    store_in_sync = store.source == source_fingerprint(features_path, cleaned_path)
+    append_artifact(cleaned, cleaned_path)
+    append_artifact(X, features_path)
+    append_artifact(cleaned[LABEL_COL].astype(dtypes["label_dtype"]), labels_path)
+
+    # A store that already lagged behind the artifacts is rebuilt rather than appended to
+    if store_in_sync:
+        source = source_fingerprint(features_path, cleaned_path)
+        store.append(cleaned["lead_id"], X, source=source)
+    else:
+        store.sync(features_path, cleaned_path)
+    return first_new_row
+
+
+def latest_run(family: str):
+    runs = mlflow.search_runs(
+        experiment_names=[EXPERIMENT_NAME],
+        filter_string=f"tags.model_family = '{family}' and attributes.status = 'FINISHED'",
+        order_by=["attributes.start_time DESC"],
+        max_results=1,
+        output_format="list",
+    )
+    return runs[0] if runs else None
+
+
+def full_refit_run(run):
+    """The full training run that `run` was incrementally updated from, or `run` itself."""
+    run_id = run.data.tags.get("full_refit_run_id", run.info.run_id)
+    return run if run_id == run.info.run_id else mlflow.get_run(run_id)
+
+
+def full_refit_due(parents: dict, days: int) -> bool:
+    if any(parent is None for parent in parents.values()):
+        return True
+    oldest = min(full_refit_run(parent).info.start_time for parent in parents.values())
+    age_days = (time.time() * 1000 - oldest) / (24 * 60 * 60 * 1000)
+    logger.info("Last full refit was {:.1f} days ago, refitting every {} days", age_days, days)
+    return age_days >= days
+
+
+def update_model(family: str, model, X_train: pd.DataFrame, y_train: pd.Series, new_rows):
+    """
+    XGBoost continues boosting from the parent's trees on the new rows only. Logistic
+    regression has no `partial_fit`, so it warm-starts its solver from the parent's
+    coefficients on all rows, which takes a few iterations (liblinear starts over).
+    """
+    if family == "xgboost":
+        booster = model.get_booster()
+        return model.fit(X_train[new_rows], y_train[new_rows], xgb_model=booster)
+    return model.set_params(warm_start=True).fit(X_train, y_train)
+
+
+def update(family: str, parent, first_new_row: int, cores: int) -> str | None:
+    """
+    Updates the model of `parent` with the new rows and logs it as a child run, on the
+    background logger while the next family updates.
+    """
+    # The same split and dtype as full training, see `train.xgboost` and `train.log_reg`.
+    # Full runs logged without `split_rows` fall back to the rows of the parent.
+    split_rows = int(full_refit_run(parent).data.tags.get("split_rows", first_new_row))
+    X_train, X_test, y_train, y_test = load_data(
+        dtype="float32" if family == "xgboost" else "float64", stable_from=split_rows
+    )
+    y_train, y_test = y_train.iloc[:, 0], y_test.iloc[:, 0]
+    new_rows = np.asarray(X_train.index >= first_new_row)
+    if not new_rows.any():
+        logger.warning("No new {} training rows, keeping run {}", family, parent.info.run_id)
+        return None
+
+    model_uri = f"runs:/{parent.info.run_id}/{train.LOGGED_MODELS[family]}"
+    model = mlflow.pyfunc.load_model(model_uri).unwrap_python_model().model
+    if "n_jobs" in model.get_params():
+        model.set_params(n_jobs=cores)
+
+    version = train.data_version()
+    run_name = f"{family}_update_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    tags = {
+        # Shows the update nested under its parent in the MLflow UI
+        "mlflow.parentRunId": parent.info.run_id,
+        "model_family": family,
+        "training_mode": "incremental",
+        "full_refit_run_id": full_refit_run(parent).info.run_id,
+    }
+    with mlflow.start_run(run_name=run_name, tags=tags):
+        logger.info(
+            "Updating {} of run {} with {} new training rows",
+            family,
+            parent.info.run_id,
+            int(new_rows.sum()),
+        )
+        with profile_stage("update_fit", rows=int(new_rows.sum())):
+            model = update_model(family, model, X_train, y_train, new_rows)
+        metrics, curve = evaluate(y_test, model.predict_proba(X_test)[:, 1])
+        log_evaluation(f"Updated {family}", metrics)
+
+        preprocessor = joblib.load(train.preprocessor_path)
+        save_model(model, FAMILIES[family])
+        run_id = detach_run()
+        background_logger().submit(
+            train.log_training_run,
+            run_id,
+            family,
+            FAMILIES[family],
+            feature_schema(X_test, preprocessor.feature_names),
+            params={
+                **parent.data.params,
+                "data_version": version,
+                "cores": cores,
+                "new_rows": int(new_rows.sum()),
+            },
+            metrics=metrics,
+            tags={},
+            curve=curve,
+            paths=[FAMILIES[family], train.preprocessor_path],
+        )
+    return run_id
+
+
+def full_refit(cores: int):
+    """The regular pipeline: re-clean and re-encode all raw rows, then search and fit anew."""
+    runpy.run_path(str(make_dataset_path))["main"]()
+    features.main()
+    train.train_all(cores=cores)
+
+
+@app.command()
+def main(
+    cores: int = TRAINING_CORES,
+    full_refit_days: int = FULL_REFIT_DAYS,
+    full: bool = False,
+):
+    """
+    Adds the leads that arrived in raw_data.csv since the last run to the processed data
+    and updates the latest model of every family with them. Refits everything from
+    scratch instead with `--full`, when a family has no run yet, or once the last full
+    refit is `--full-refit-days` old.
+    """
+    mlflow.set_experiment(EXPERIMENT_NAME)
+    parents = {family: latest_run(family) for family in FAMILIES}
+    if full or full_refit_due(parents, full_refit_days):
+        logger.info("Running a full refit")
+        full_refit(cores)
+        return
+
+    with profile_stage("append_leads") as stage:
+        leads = find_new_leads(raw_path, cleaned_path)
+        stage.rows = len(leads)
+        stage.record_memory("new_leads", leads)
+        if leads.empty:
+            logger.success("No new leads in {}, models are up to date", raw_path)
+            return
+        dates = pd.to_datetime(leads["date_part"])
+        logger.info(
+            "Found {} new leads from {} to {}", len(leads), dates.min().date(), dates.max().date()
+        )
+        preprocessor = joblib.load(train.preprocessor_path)
+        first_new_row = append_leads(leads, preprocessor)
+    validate(features_path, labels_path, preprocessor, features.feature_dtypes(features_path))
+
+    for family, parent in parents.items():
+        update(family, parent, first_new_row, cores)
+    logger.success("Incremental retraining complete")
+
+
+if __name__ == "__main__":
+    app()
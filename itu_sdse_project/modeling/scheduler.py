@@ -0,0 +1,59 @@
+from contextlib import contextmanager
+import time
+
+from itu_sdse_project.profiling import cpu_seconds, peak_rss_mb
+
+
+def split_budget(cores: int, n_fits: int, max_estimator_threads: int = 1) -> tuple[int, int]:
+    """
+    Splits a core budget into (cv_jobs, estimator_threads) with a product of at most `cores`.
+
+    Independent CV fits scale better than threads inside one fit, so fits get cores
+    first and estimator threads only use what is left once every fit runs in parallel.
+    """
+    cores = max(1, cores)
+    cv_jobs = min(cores, n_fits)
+    estimator_threads = max(1, min(max_estimator_threads, cores // cv_jobs))
+    return cv_jobs, estimator_threads
+
+
+def share_budget(cores: int, weights: dict[str, int]) -> dict[str, int] | None:
+    """
+    Divides `cores` between concurrent jobs in proportion to `weights`, at least one each
+    and exactly `cores` in total. Returns None if there are fewer cores than jobs, which
+    then have to run one after another.
+    """
+    if cores < len(weights):
+        return None
+    total = sum(weights.values())
+    shares = {name: max(1, cores * weight // total) for name, weight in weights.items()}
+    largest = max(weights, key=weights.get)
+    shares[largest] += max(0, cores - sum(shares.values()))
+    # Jobs rounded up to one core are paid for by the largest shares
+    while sum(shares.values()) > cores:
+        shares[max(shares, key=shares.get)] -= 1
+    return shares
+
+
+@contextmanager
+def measure_usage(cores: int):
+    """
+    Measures wall time and CPU time of the block, including its worker processes, and
+    the peak RSS reached so far.
+
+    joblib keeps its loky workers alive between calls, and a process' CPU time only
+    reaches its parent once it is reaped, so the workers are shut down at the end.
+    """
+    from joblib.externals.loky import get_reusable_executor
+
+    usage = {}
+    start_wall, start_cpu = time.perf_counter(), cpu_seconds()
+    yield usage
+    get_reusable_executor().shutdown(wait=True)
+
+    wall = time.perf_counter() - start_wall
+    cpu = cpu_seconds() - start_cpu
+    usage["wall_seconds"] = wall
+    usage["cpu_seconds"] = cpu
+    usage["cpu_utilization"] = cpu / (wall * cores) if wall else 0.0
+    usage.update(peak_rss_mb())
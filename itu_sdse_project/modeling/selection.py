@@ -1,15 +1,48 @@
+from pathlib import Path
+import tempfile
+
 import mlflow
-from mlflow.entities import Run
+from mlflow.exceptions import MlflowException
 import typer
 from loguru import logger
 
 from itu_sdse_project.config import EXPERIMENT_NAME, MODEL_NAME
+from itu_sdse_project.modeling.compiled import SCORER_ARTIFACT, compile_model
+from itu_sdse_project.modeling.leaderboard import Leaderboard
 
 app = typer.Typer()
 
 
+def is_active(client: mlflow.MlflowClient, run_id: str) -> bool:
+    try:
+        return client.get_run(run_id).info.lifecycle_stage == "active"
+    except MlflowException:
+        return False
+
+
+def export_compiled_scorer(client: mlflow.MlflowClient, model_uri: str):
+    """
+    Stores a NumPy-only copy of the model next to its pickle in the logged model, which
+    `serve` loads instead of the pickle. Models that cannot be compiled are left as they are.
+    """
+    model = mlflow.pyfunc.load_model(model_uri).unwrap_python_model().model
+    try:
+        scorer = compile_model(model)
+    except ValueError as e:
+        logger.warning("Not compiling the selected model: {}", e)
+        return
+
+    model_id = mlflow.models.get_model_info(model_uri).model_id
+    directory, name = SCORER_ARTIFACT.rsplit("/", 1)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / name
+        scorer.save(path)
+        client.log_model_artifact(model_id, str(path), artifact_path=directory)
+    logger.info("Stored compiled {} scorer at {}/{}", scorer.kind, model_uri, SCORER_ARTIFACT)
+
+
 @app.command()
-def main():
+def main(data_version: str | None = None, family: str | None = None):
     logger.info(
         "Starting model selection. Experiment name='{}', model name='{}'",
         EXPERIMENT_NAME,
@@ -19,59 +52,38 @@ def main():
     mlflow.set_experiment(EXPERIMENT_NAME)
     client = mlflow.MlflowClient()
 
-    run_id = None
-    exp_ids: list[str] = [mlflow.get_experiment_by_name(EXPERIMENT_NAME).experiment_id]
-    logger.info("Using experiment IDs: {}", exp_ids)
-
-    logger.info("Searching for best run ordered by metrics.f1_score DESC")
-    best_run_exp = mlflow.search_runs(
-        experiment_ids=exp_ids,
-        order_by=["metrics.f1_score DESC"],
-        max_results=1,
-        output_format="list",
-    )[0]
-
-    assert isinstance(best_run_exp, Run), "Type of `best_run_exp` should be `Run`"
-
-    run_id = best_run_exp.info.run_id
-    logger.info("Best run id selected: {}", run_id)
-
-    if run_id:
-        logger.info(
-            "Searching for logged models for run_id='{}' to register under name='{}'",
-            run_id,
-            MODEL_NAME,
-        )
-
-        models = mlflow.search_logged_models(
-            output_format="list", filter_string=f"source_run_id='{run_id}'"
-        )
-
-        logger.info(
-            "Number of logged models found for run_id='{}': {}",
-            run_id,
-            len(models),
-        )
-
-        assert len(models) == 1, "There should be only one model"
+    leaderboard = Leaderboard()
+    leaderboard.sync()
 
-        model_name = models[0].name
-        model_uri = f"runs:/{run_id}/{model_name}"
-        result = mlflow.register_model(model_uri=model_uri, name=MODEL_NAME)
-        client.set_registered_model_alias(MODEL_NAME, "staging", result.version)
-
-        logger.success(
-            "Alias 'staging' set for model='{}', version={}",
-            MODEL_NAME,
-            result.version,
-        )
-    else:
+    logger.info(
+        "Looking up best run by f1_score (data_version={}, family={})", data_version, family
+    )
+    best = leaderboard.best(data_version=data_version, family=family)
+    # Runs deleted in MLflow are only noticed here, since syncing only looks at new runs
+    while best is not None and not is_active(client, best["run_id"]):
+        logger.info("Run {} no longer exists in MLflow, removing it", best["run_id"])
+        leaderboard.remove(best["run_id"])
+        best = leaderboard.best(data_version=data_version, family=family)
+
+    if best is None:
         logger.error(
             "No run_id was found while selecting best model for experiment='{}'",
             EXPERIMENT_NAME,
         )
         return
 
+    logger.info("Best run id selected: {} (f1_score={})", best["run_id"], best["f1_score"])
+
+    result = mlflow.register_model(model_uri=best["model_uri"], name=MODEL_NAME)
+    export_compiled_scorer(client, best["model_uri"])
+    client.set_registered_model_alias(MODEL_NAME, "staging", result.version)
+
+    logger.success(
+        "Alias 'staging' set for model='{}', version={}",
+        MODEL_NAME,
+        result.version,
+    )
+
 
 if __name__ == "__main__":
     app()
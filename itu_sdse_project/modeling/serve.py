@@ -0,0 +1,333 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+from pathlib import Path
+from queue import Empty, Queue
+import threading
+import time
+import urllib.request
+
+from loguru import logger
+import numpy as np
+import pandas as pd
+import typer
+
+from itu_sdse_project.config import FEATURE_STORE_DIR, PROCESSED_DATA_DIR
+from itu_sdse_project.feature_store import ID_COL, FeatureStore
+from itu_sdse_project.helpers import artifact_path, read_artifact
+
+app = typer.Typer()
+
+features_path_default = artifact_path(PROCESSED_DATA_DIR, "features")
+
+# How long a request waits for its micro-batch to be scored
+REQUEST_TIMEOUT_SECONDS = 30.0
+
+
+class LatencyTracker:
+    """Keeps the most recent request latencies and reports percentiles over them."""
+
+    def __init__(self, window: int = 10_000):
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.batched_rows = 0
+
+    def record_request(self, seconds: float):
+        with self._lock:
+            self._latencies.append(seconds)
+            self.requests += 1
+
+    def record_batch(self, rows: int):
+        with self._lock:
+            self.batches += 1
+            self.batched_rows += rows
+
+    def summary(self) -> dict:
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000
+            summary = {
+                "requests": self.requests,
+                "batches": self.batches,
+                "mean_batch_rows": self.batched_rows / self.batches if self.batches else 0.0,
+            }
+        for q in (50, 90, 95, 99):
+            summary[f"p{q}_ms"] = float(np.percentile(latencies, q)) if len(latencies) else 0.0
+        return summary
+
+
+class MicroBatcher:
+    """
+    Collects records from concurrent requests and scores them together.
+
+    A background thread waits for the first pending request, then keeps collecting for
+    at most `max_wait_ms` or until `max_batch_rows` rows are queued, and calls
+    `model.predict` once per distinct column set in the batch. `swap` replaces the model
+    between two batches.
+    """
+
+    def __init__(
+        self,
+        model,
+        max_batch_rows: int = 1024,
+        max_wait_ms: float = 2.0,
+        version: str | None = None,
+    ):
+        self.model = model
+        self.version = version
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000
+        self.metrics = LatencyTracker()
+        self._queue: Queue[tuple[pd.DataFrame, Future]] = Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def swap(self, model, version: str | None = None):
+        self.model, self.version = model, version
+
+    def submit(self, records: pd.DataFrame) -> Future:
+        future = Future()
+        self._queue.put((records, future))
+        return future
+
+    def _collect(self) -> list[tuple[pd.DataFrame, Future]]:
+        batch = [self._queue.get()]
+        rows = len(batch[0][0])
+        deadline = time.perf_counter() + self.max_wait
+        while rows < self.max_batch_rows:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except Empty:
+                break
+            batch.append(item)
+            rows += len(item[0])
+        return batch
+
+    def _score(self, model, items: list[tuple[pd.DataFrame, Future]]):
+        frames = [records for records, _ in items]
+        try:
+            scores = np.asarray(model.predict(None, pd.concat(frames)))
+        except Exception as e:  # noqa: BLE001 - whatever the model raises belongs to a request
+            if len(items) > 1:
+                # Score every request on its own, so one bad record only fails its request
+                for item in items:
+                    self._score(model, [item])
+            else:
+                items[0][1].set_exception(e)
+            return
+        self.metrics.record_batch(len(scores))
+        offsets = np.cumsum([0] + [len(frame) for frame in frames])
+        for (_, future), start, end in zip(items, offsets[:-1], offsets[1:]):
+            future.set_result(scores[start:end])
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                # Read once, so a swap never splits a batch between two models
+                model = self.model
+                groups: dict[tuple, list[tuple[pd.DataFrame, Future]]] = {}
+                for records, future in batch:
+                    groups.setdefault(tuple(records.columns), []).append((records, future))
+                for items in groups.values():
+                    self._score(model, items)
+            except Exception as e:  # noqa: BLE001 - the thread must outlive a failed batch
+                logger.exception("Scoring a batch of {} requests failed", len(batch))
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+
+def parse_records(body: bytes) -> pd.DataFrame:
+    """Parses a single JSON record, a JSON list of records or JSON lines into a frame."""
+    text = body.decode("utf-8").strip()
+    try:
+        records = json.loads(text)
+    except json.JSONDecodeError:
+        records = [json.loads(line) for line in text.splitlines() if line.strip()]
+    if isinstance(records, dict):
+        records = [records]
+    return pd.DataFrame.from_records(records)
+
+
+def lookup_leads(store: FeatureStore | None, records: pd.DataFrame) -> pd.DataFrame:
+    """Stored features of the leads in the `lead_id` column of `records`."""
+    if store is None:
+        raise KeyError("No feature store is configured, send features to /predict instead")
+    if ID_COL not in records:
+        raise ValueError(f"Records need a '{ID_COL}' to be scored from the feature store")
+    return store.lookup(records[ID_COL].to_numpy())
+
+
+def make_handler(batcher: MicroBatcher, store: FeatureStore | None = None):
+    class ScoringHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, payload: dict):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send_json(200, {"status": "ok"})
+            elif self.path == "/metrics":
+                self._send_json(200, {**batcher.metrics.summary(), "version": batcher.version})
+            else:
+                self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+        def do_POST(self):
+            if self.path not in ("/predict", "/predict/leads"):
+                self._send_json(404, {"error": f"Unknown path {self.path}"})
+                return
+
+            start = time.perf_counter()
+            try:
+                records = parse_records(self.rfile.read(int(self.headers["Content-Length"])))
+                if self.path == "/predict/leads":
+                    try:
+                        records = lookup_leads(store, records)
+                    except KeyError as e:
+                        self._send_json(404, {"error": e.args[0]})
+                        return
+                scores = batcher.submit(records).result(timeout=REQUEST_TIMEOUT_SECONDS)
+            except ValueError as e:
+                # Includes JSONDecodeError, and records the model cannot take
+                self._send_json(400, {"error": str(e)})
+                return
+            except TimeoutError:
+                self._send_json(503, {"error": "Scoring timed out"})
+                return
+            except Exception as e:  # noqa: BLE001 - the client gets a 500 instead of a reset
+                logger.exception("Scoring a request failed")
+                self._send_json(500, {"error": str(e)})
+                return
+            batcher.metrics.record_request(time.perf_counter() - start)
+            self._send_json(200, {"probabilities": scores.tolist()})
+
+        def log_message(self, format, *args):
+            logger.trace(format, *args)
+
+    return ScoringHandler
+
+
+class ScoringServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 makes bursts of concurrent clients wait on SYN retries
+    request_queue_size = 128
+
+
+class ModelRefresher(threading.Thread):
+    """
+    Resolves `alias` every `interval` seconds and, once it points at another version,
+    loads that version through the model cache on this thread and swaps it into the
+    batcher. Requests keep being scored by the previous version until then.
+    """
+
+    def __init__(self, batcher: MicroBatcher, cache, alias: str, interval: float):
+        super().__init__(daemon=True)
+        self.batcher = batcher
+        self.cache = cache
+        self.alias = alias
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def refresh(self) -> bool:
+        key = self.cache.resolve(self.alias)
+        if key == self.batcher.version:
+            return False
+        self.batcher.swap(self.cache.load(key), key)
+        logger.success("Now scoring with version {} of '{}'", key, self.alias)
+        return True
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as e:  # noqa: BLE001 - a broken version must not stop refreshing
+                logger.warning("Keeping version {}, refresh failed: {}", self.batcher.version, e)
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+@app.command()
+def serve(
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    max_batch_rows: int = 1024,
+    max_wait_ms: float = 2.0,
+    alias: str = "staging",
+    refresh_seconds: float = 30.0,
+    feature_store: Path = FEATURE_STORE_DIR,
+):
+    """
+    Serves the `alias` version of the registered model over HTTP: POST /predict, GET
+    /metrics and GET /health. Checks every `refresh_seconds` whether the alias moved and
+    then swaps in the new version without pausing requests. POST /predict/leads scores
+    leads by `lead_id` with their features from `feature_store`.
+    """
+    from itu_sdse_project.modeling.model_cache import ModelCache
+
+    cache = ModelCache()
+    model, key = cache.get(alias)
+    batcher = MicroBatcher(model, max_batch_rows, max_wait_ms, version=key)
+    refresher = ModelRefresher(batcher, cache, alias, refresh_seconds)
+    refresher.start()
+    store = FeatureStore(feature_store)
+    server = ScoringServer((host, port), make_handler(batcher, store))
+    logger.success("Scoring service listening on http://{}:{} with version {}", host, port, key)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down scoring service. Metrics: {}", batcher.metrics.summary())
+    finally:
+        refresher.stop()
+        server.server_close()
+
+
+@app.command()
+def load_test(
+    url: str = "http://127.0.0.1:8080",
+    features_path: Path = features_path_default,
+    requests: int = 2000,
+    concurrency: int = 16,
+):
+    """Sends single-record requests from `features_path` and reports client-side latency."""
+    records = read_artifact(features_path).head(requests).to_dict(orient="records")
+    bodies = [json.dumps(records[i % len(records)]).encode("utf-8") for i in range(requests)]
+
+    def send(body: bytes) -> float:
+        start = time.perf_counter()
+        request = urllib.request.Request(
+            f"{url}/predict", data=body, headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(request) as response:
+            response.read()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        latencies = np.array(list(executor.map(send, bodies))) * 1000
+    elapsed = time.perf_counter() - start
+
+    logger.info(
+        "{} requests in {:.2f}s ({:.0f} req/s). p50={:.2f}ms p95={:.2f}ms p99={:.2f}ms",
+        requests,
+        elapsed,
+        requests / elapsed,
+        *np.percentile(latencies, [50, 95, 99]),
+    )
+    with urllib.request.urlopen(f"{url}/metrics") as response:
+        logger.info("Server metrics: {}", json.loads(response.read()))
+
+
+if __name__ == "__main__":
+    app()
@@ -1,28 +1,204 @@
+from concurrent.futures import ProcessPoolExecutor
 import datetime
+from multiprocessing import get_context
 from pathlib import Path
 
 import joblib
 import mlflow
-from sklearn.metrics import f1_score
 from sklearn.model_selection import RandomizedSearchCV
 import typer
 from loguru import logger
 
-from itu_sdse_project.config import DATA_VERSION, EXPERIMENT_NAME, MODELS_DIR, RANDOM_STATE
-from itu_sdse_project.helpers import MLFlowWrapper, load_data
+from itu_sdse_project.cache import PACKAGE_DIR, StageCache, fingerprint
+from itu_sdse_project.config import (
+    DATA_VERSION,
+    EXPERIMENT_NAME,
+    INTERIM_DATA_DIR,
+    MODEL_FORMAT,
+    MODELS_DIR,
+    PROCESSED_DATA_DIR,
+    RANDOM_STATE,
+    TRAINING_CORES,
+)
+from itu_sdse_project.helpers import artifact_path, load_data, shared_data_dir
+from itu_sdse_project.modeling.artifacts import (
+    background_logger,
+    detach_run,
+    flush_logging,
+    save_model,
+)
+from itu_sdse_project.modeling.evaluation import CURVE_ARTIFACT, evaluate, log_evaluation
+from itu_sdse_project.modeling.leaderboard import Leaderboard
+from itu_sdse_project.modeling.scheduler import measure_usage, share_budget, split_budget
+from itu_sdse_project.modeling.wrapper import MLFlowWrapper, feature_schema
+from itu_sdse_project.profiling import profile_stage
 
-app = typer.Typer()
+# Commands return while their runs are still being logged, the CLI waits for that
+app = typer.Typer(result_callback=flush_logging)
+
+preprocessor_path = PROCESSED_DATA_DIR / "preprocessor.joblib"
+# Rows appended since the last full run are split by the lead ids stored here
+cleaned_path = artifact_path(INTERIM_DATA_DIR, "cleaned_data")
+
+# Name of the logged model in the runs of each family
+LOGGED_MODELS = {"xgboost": "xgb_model_tuned", "log_reg": "lr_model_tuned"}
+
+# RandomizedSearchCV settings per model family, n_iter * cv fits each
+SEARCH = {
+    "xgboost": {"n_iter": 10, "cv": 10},
+    "log_reg": {"n_iter": 10, "cv": 3},
+}
+
+SEARCH_MODES = ("random", "halving", "queue")
+# Successive halving keeps the best 1 / HALVING_FACTOR of the candidates per round
+HALVING_FACTOR = 3
+
+
+def data_version() -> str:
+    """Schema version plus a short fingerprint of the processed features and labels."""
+    digest = fingerprint(
+        artifact_path(PROCESSED_DATA_DIR, "features"), artifact_path(PROCESSED_DATA_DIR, "labels")
+    )
+    return f"{DATA_VERSION}-{digest[:12]}"
+
+
+def training_fingerprint(stage: str, version: str, params: dict, search: dict) -> str:
+    return fingerprint(
+        stage,
+        version,
+        preprocessor_path,
+        cleaned_path,
+        Path(__file__),
+        PACKAGE_DIR / "helpers.py",
+        PACKAGE_DIR / "modeling" / "evaluation.py",
+        params,
+        search,
+        RANDOM_STATE,
+        # A cache hit restores the pickle, which must be in the format asked for
+        MODEL_FORMAT,
+    )
+
+
+def build_search(
+    mode: str,
+    model,
+    params: dict,
+    n_iter: int,
+    cv: int,
+    n_jobs: int,
+    resource: str = "n_samples",
+    max_resources: int | str = "auto",
+):
+    """
+    Hyperparameter search over `params`. "random" fits every candidate on all rows,
+    "halving" fits all candidates on a small share of `resource` and gives HALVING_FACTOR
+    times more to the best third in each round, until the survivors use `max_resources`.
+    "queue" is a random search whose CV fits are shared out through a `TrialQueue` to
+    `n_jobs` local workers and any started on other nodes.
+    """
+    if mode == "random":
+        return RandomizedSearchCV(
+            model, param_distributions=params, n_jobs=n_jobs, verbose=3, n_iter=n_iter, cv=cv
+        )
+    if mode == "queue":
+        from itu_sdse_project.modeling.trial_queue import QueueSearchCV
+
+        return QueueSearchCV(model, params, n_iter=n_iter, cv=cv, n_jobs=n_jobs)
+    if mode == "halving":
+        from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+        from sklearn.model_selection import HalvingRandomSearchCV
+
+        return HalvingRandomSearchCV(
+            model,
+            param_distributions=params,
+            n_candidates=n_iter,
+            factor=HALVING_FACTOR,
+            resource=resource,
+            max_resources=max_resources,
+            min_resources="exhaust",
+            cv=cv,
+            n_jobs=n_jobs,
+            verbose=3,
+            random_state=RANDOM_STATE,
+        )
+    raise ValueError(f"Unknown search mode '{mode}', use one of {SEARCH_MODES}")
+
+
+def reuse_cached_run(stage: str, key: str, output_path: Path) -> bool:
+    """Restores `output_path` if a finished run was already trained on the same inputs."""
+    runs = mlflow.search_runs(
+        experiment_names=[EXPERIMENT_NAME],
+        filter_string=f"tags.stage_fingerprint = '{key}' and attributes.status = 'FINISHED'",
+        max_results=1,
+        output_format="list",
+    )
+    if not runs or not StageCache().restore(stage, key, [output_path]):
+        return False
+    logger.success(
+        "Inputs of stage '{}' unchanged, reusing run {} and {}",
+        stage,
+        runs[0].info.run_id,
+        output_path,
+    )
+    return True
+
+
+def log_training_run(
+    run_id: str,
+    family: str,
+    output_path: Path,
+    schema: dict[str, str],
+    params: dict,
+    metrics: dict,
+    tags: dict,
+    key: str | None = None,
+    curve: dict | None = None,
+):
+    """
+    Logs the fitted model at `output_path` and its results into `run_id`, ends the run and
+    records it on the leaderboard. Submitted to the background logger, so the next job
+    trains meanwhile. `key` also stores the model in the stage cache, `curve` is logged as
+    the run's precision/recall curve.
+    """
+    with mlflow.start_run(run_id=run_id):
+        mlflow.log_metrics(metrics)
+        if curve is not None:
+            mlflow.log_dict(curve, CURVE_ARTIFACT)
+        mlflow.log_params(params)
+        mlflow.set_tags(tags)
+        with profile_stage("log_model"):
+            mlflow.pyfunc.log_model(
+                name=LOGGED_MODELS[family],
+                # `load_context` loads both from the artifacts, pickling them into the
+                # wrapper as well would only store them twice
+                python_model=MLFlowWrapper(None, schema=schema),
+                artifacts={"model": str(output_path), "preprocessor": str(preprocessor_path)},
+            )
+        if key is not None:
+            StageCache().store(family, key, [output_path])
+
+    Leaderboard().record(mlflow.get_run(run_id), LOGGED_MODELS[family])
 
 
 @app.command()
-def xgboost(output_path: Path = MODELS_DIR / "xgboost.pkl"):
+def xgboost(
+    output_path: Path = MODELS_DIR / "xgboost.pkl",
+    cores: int = TRAINING_CORES,
+    search: str = "random",
+    resource: str = "n_samples",
+    tree_method: str = "hist",
+    force: bool = False,
+):
+    """
+    Tunes an XGBoost random forest. `--search halving` runs successive halving over rows
+    (`--resource n_samples`) or trees (`--resource n_estimators`) instead of fitting every
+    candidate in full. `--search queue` hands the CV fits to trial queue workers.
+    """
     from scipy.stats import randint, uniform
     from xgboost import XGBRFClassifier
 
     logger.info("Starting XGBoost training. Output path: {}", output_path)
 
-    X_train, X_test, y_train, y_test = load_data()
-
     # TODO: The parameters are defined incorrectly
     params = {
         "learning_rate": uniform(1e-2, 3e-1),
@@ -34,46 +210,105 @@ def xgboost(output_path: Path = MODELS_DIR / "xgboost.pkl"):
     }
     logger.debug("Hyperparameter search space: {}", params)
 
+    settings = SEARCH["xgboost"]
+    cv_jobs, estimator_threads = split_budget(
+        cores, settings["n_iter"] * settings["cv"], max_estimator_threads=cores
+    )
+    model = XGBRFClassifier(
+        random_state=RANDOM_STATE, n_jobs=estimator_threads, tree_method=tree_method
+    )
+    # Halving over trees grows the forest up to XGBoost's default size
+    max_resources = 100 if resource == "n_estimators" else "auto"
+    model_grid = build_search(
+        search,
+        model,
+        params,
+        **settings,
+        n_jobs=cv_jobs,
+        resource=resource,
+        max_resources=max_resources,
+    )
+
+    version = data_version()
+    options = {"search": search, "resource": resource, "tree_method": tree_method}
+    key = training_fingerprint("xgboost", version, params, {**settings, **options})
     mlflow.set_experiment(EXPERIMENT_NAME)
-    run_name = f"xgboost_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    if not force and reuse_cached_run("xgboost", key, output_path):
+        return
 
-    with mlflow.start_run(run_name=run_name):
-        model = XGBRFClassifier(random_state=RANDOM_STATE)
+    run_name = f"xgboost_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
 
-        logger.info("Starting RandomizedSearchCV for XGBoost...")
-        model_grid = RandomizedSearchCV(
-            model, param_distributions=params, n_jobs=-1, verbose=3, n_iter=10, cv=10
+    with shared_data_dir() as shared_dir, mlflow.start_run(run_name=run_name):
+        # XGBoost bins float32 values internally, so this loses nothing and halves the buffer
+        X_train, X_test, y_train, y_test = load_data(dtype="float32", shared_dir=shared_dir)
+        logger.info(
+            "Starting {} search for XGBoost on {} cores: {} CV jobs x {} threads",
+            search,
+            cores,
+            cv_jobs,
+            estimator_threads,
         )
-        model_grid.fit(X_train, y_train)
+        with profile_stage("search_fit", rows=X_train.shape[0]), measure_usage(cores) as usage:
+            model_grid.fit(X_train, y_train)
         best_model = model_grid.best_estimator_
+        # Refitting the best candidate on all training rows is the last step of the search fit
+        mlflow.log_metric("refit/wall_seconds", model_grid.refit_time_)
 
-        y_pred_test = model_grid.predict(X_test)
-        score = f1_score(y_test, y_pred_test)
-        logger.info("XGBoost Test F1-score: {:.4f}", score)
+        # One probability per row, every threshold's metrics are derived from it
+        with profile_stage("predict_test", rows=X_test.shape[0]):
+            scores = best_model.predict_proba(X_test)[:, 1]
+        metrics, curve = evaluate(y_test, scores)
+        log_evaluation("XGBoost", metrics)
 
-        joblib.dump(value=best_model, filename=output_path)
-
-        mlflow.log_metric("f1_score", f1_score(y_test, y_pred_test))
-        mlflow.log_params(model_grid.best_params_)
-        mlflow.log_param("data_version", DATA_VERSION)
-
-        mlflow.pyfunc.log_model(
-            name="xgb_model_tuned",
-            python_model=MLFlowWrapper(best_model),
-            artifacts={"model": str(output_path)},
+        save_model(best_model, output_path)
+        preprocessor = joblib.load(preprocessor_path)
+        background_logger().submit(
+            log_training_run,
+            detach_run(),
+            "xgboost",
+            output_path,
+            feature_schema(X_test, preprocessor.feature_names),
+            params={
+                **model_grid.best_params_,
+                "data_version": version,
+                "cores": cores,
+                "cv_jobs": cv_jobs,
+                "estimator_threads": estimator_threads,
+                "search": search,
+            },
+            metrics={**metrics, **usage},
+            tags={
+                "stage_fingerprint": key,
+                "model_family": "xgboost",
+                "training_mode": "full",
+                # Updates split these rows like this run did, see `load_data`
+                "split_rows": X_train.shape[0] + X_test.shape[0],
+            },
+            key=key,
+            curve=curve,
+            paths=[output_path, preprocessor_path],
         )
 
-        logger.success("XGBoost training pipeline complete.")
+    logger.success("XGBoost training pipeline complete.")
 
 
 @app.command()
-def log_reg(output_path: Path = MODELS_DIR / "logreg.pkl"):
+def log_reg(
+    output_path: Path = MODELS_DIR / "logreg.pkl",
+    cores: int = TRAINING_CORES,
+    search: str = "random",
+    sparse: bool = False,
+    force: bool = False,
+):
+    """
+    Tunes a logistic regression. `--search halving` runs successive halving over rows,
+    `--search queue` hands the CV fits to trial queue workers. `--sparse` trains on a CSR
+    matrix, which keeps wide one-hot features small.
+    """
     from sklearn.linear_model import LogisticRegression
 
     logger.info("Starting Logistic Regression training. Output path: {}", output_path)
 
-    X_train, X_test, y_train, y_test = load_data()
-
     params = {
         "solver": ["newton-cg", "lbfgs", "liblinear", "sag", "saga"],
         "penalty": ["none", "l1", "l2", "elasticnet"],
@@ -81,35 +316,104 @@ def log_reg(output_path: Path = MODELS_DIR / "logreg.pkl"):
     }
     logger.debug("Hyperparameter search space: {}", params)
 
+    settings = SEARCH["log_reg"]
+    # The solvers are single-threaded, so the whole budget goes to CV-level parallelism
+    cv_jobs, estimator_threads = split_budget(cores, settings["n_iter"] * settings["cv"])
+    model_grid = build_search(search, LogisticRegression(), params, **settings, n_jobs=cv_jobs)
+
+    version = data_version()
+    options = {"search": search, "sparse": sparse}
+    key = training_fingerprint("log_reg", version, params, {**settings, **options})
     mlflow.set_experiment(EXPERIMENT_NAME)
+    if not force and reuse_cached_run("log_reg", key, output_path):
+        return
+
     run_name = f"log_reg_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
 
-    with mlflow.start_run(run_name=run_name):
-        model = LogisticRegression()
-        model_grid = RandomizedSearchCV(
-            model, param_distributions=params, verbose=3, n_iter=10, cv=3
+    with shared_data_dir() as shared_dir, mlflow.start_run(run_name=run_name):
+        X_train, X_test, y_train, y_test = load_data(sparse=sparse, shared_dir=shared_dir)
+        logger.info(
+            "Starting {} search for LogReg on {} cores: {} CV jobs", search, cores, cv_jobs
         )
-        model_grid.fit(X_train, y_train)
+        with profile_stage("search_fit", rows=X_train.shape[0]), measure_usage(cores) as usage:
+            model_grid.fit(X_train, y_train)
         best_model = model_grid.best_estimator_
+        # Refitting the best candidate on all training rows is the last step of the search fit
+        mlflow.log_metric("refit/wall_seconds", model_grid.refit_time_)
         logger.success("Best Logistic Regression model selected: {}", model_grid.best_params_)
 
-        y_pred_test = model_grid.predict(X_test)
-        score = f1_score(y_test, y_pred_test)
-        logger.info("LogReg Test F1-score: {:.4f}", score)
+        # One probability per row, every threshold's metrics are derived from it
+        with profile_stage("predict_test", rows=X_test.shape[0]):
+            scores = best_model.predict_proba(X_test)[:, 1]
+        metrics, curve = evaluate(y_test, scores)
+        log_evaluation("LogReg", metrics)
+
+        save_model(best_model, output_path)
+        preprocessor = joblib.load(preprocessor_path)
+        background_logger().submit(
+            log_training_run,
+            detach_run(),
+            "log_reg",
+            output_path,
+            feature_schema(X_test, preprocessor.feature_names),
+            params={
+                **model_grid.best_params_,
+                "data_version": version,
+                "cores": cores,
+                "cv_jobs": cv_jobs,
+                "estimator_threads": estimator_threads,
+                "search": search,
+            },
+            metrics={**metrics, **usage},
+            tags={
+                "stage_fingerprint": key,
+                "model_family": "log_reg",
+                "training_mode": "full",
+                "split_rows": X_train.shape[0] + X_test.shape[0],
+            },
+            key=key,
+            curve=curve,
+            paths=[output_path, preprocessor_path],
+        )
 
-        joblib.dump(value=best_model, filename=output_path)
+    logger.success("Logistic Regression training pipeline complete.")
 
-        mlflow.log_metric("f1_score", f1_score(y_test, y_pred_test))
-        mlflow.log_params(model_grid.best_params_)
-        mlflow.log_param("data_version", DATA_VERSION)
 
-        mlflow.pyfunc.log_model(
-            name="lr_model_tuned",
-            python_model=MLFlowWrapper(best_model),
-            artifacts={"model": str(output_path)},
-        )
+def _train_and_flush(family: str, **options):
+    # A worker process must not report its family as trained before its run is logged
+    {"xgboost": xgboost, "log_reg": log_reg}[family](**options)
+    flush_logging()
+
+
+@app.command("all")
+def train_all(cores: int = TRAINING_CORES, search: str = "random", force: bool = False):
+    """
+    Trains both model families concurrently under one core budget, shared in proportion
+    to the number of CV fits each search runs. With fewer cores than families they are
+    trained one after another, each with the whole budget.
+    """
+    shares = share_budget(
+        cores, {name: settings["n_iter"] * settings["cv"] for name, settings in SEARCH.items()}
+    )
+    if shares is None:
+        logger.info("Training {} one after another, {} cores are too few", list(SEARCH), cores)
+        for name in SEARCH:
+            _train_and_flush(name, cores=cores, search=search, force=force)
+        logger.success("Trained {} on {} cores", list(SEARCH), cores)
+        return
+    logger.info("Training {} concurrently with core shares {}", list(SEARCH), shares)
+
+    # Created up front so the concurrent runs do not race to create the experiment
+    mlflow.set_experiment(EXPERIMENT_NAME)
+    with ProcessPoolExecutor(len(SEARCH), mp_context=get_context("spawn")) as executor:
+        futures = [
+            executor.submit(_train_and_flush, name, cores=shares[name], search=search, force=force)
+            for name in SEARCH
+        ]
+        for future in futures:
+            future.result()
 
-        logger.success("Logistic Regression training pipeline complete.")
+    logger.success("Trained {} on {} cores", list(SEARCH), cores)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,478 @@
+from contextlib import contextmanager
+import json
+import math
+from multiprocessing import get_context
+import os
+from pathlib import Path
+import pickle
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from loguru import logger
+import numpy as np
+import typer
+
+from itu_sdse_project.config import RANDOM_STATE, TRIAL_QUEUE_DIR
+from itu_sdse_project.helpers import share_array, share_sparse
+
+app = typer.Typer()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS searches (
+    search_id TEXT PRIMARY KEY,
+    estimator BLOB NOT NULL,
+    layout TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS trials (
+    search_id TEXT NOT NULL,
+    candidate INTEGER NOT NULL,
+    fold INTEGER NOT NULL,
+    params BLOB NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    score REAL,
+    fit_seconds REAL,
+    error TEXT,
+    PRIMARY KEY (search_id, candidate, fold)
+);
+CREATE INDEX IF NOT EXISTS trials_by_state ON trials (search_id, state, lease_until);
+"""
+
+# A claimed trial goes back to the queue when its worker stops renewing the lease this long
+TRIAL_LEASE_SECONDS = 60
+# Trials whose worker died this often are given up, and score like a failed fit
+MAX_TRIAL_ATTEMPTS = 3
+POLL_SECONDS = 1.0
+PROGRESS_LOG_SECONDS = 10.0
+
+
+class TrialQueue:
+    """
+    Durable queue of CV fits in a sqlite database, shared by a coordinator and any number
+    of workers, on this node or on others that mount the same directory. A trial is one
+    fold of one candidate. Workers lease the trials they claim and renew the lease while
+    fitting, so the trials of a worker that died are claimed again once it runs out.
+    """
+
+    def __init__(self, directory: Path = TRIAL_QUEUE_DIR):
+        self.directory = directory
+        directory.mkdir(parents=True, exist_ok=True)
+        # Transactions are opened explicitly, see `_transaction`
+        self._db = sqlite3.connect(directory / "queue.db", timeout=60, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        # IMMEDIATE takes the write lock up front, so two workers never claim the same trial
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._db
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    def data_dir(self, search_id: str) -> Path:
+        return self.directory / search_id
+
+    def publish(self, estimator, candidates: list[dict], X, y, folds: np.ndarray) -> str:
+        """
+        Writes the training data and the fold of every row next to the queue and adds one
+        trial per candidate and fold. Returns the id of the search.
+        """
+        search_id = uuid.uuid4().hex
+        data_dir = self.data_dir(search_id)
+        data_dir.mkdir()
+        sparse = hasattr(X, "tocsr")
+        if sparse:
+            share_sparse(X.tocsr(), data_dir, "X")
+        else:
+            dtype = np.result_type(*X.dtypes) if hasattr(X, "dtypes") else X.dtype
+            share_array(X, data_dir / "X.npy", dtype)
+        share_array(np.asarray(y).ravel(), data_dir / "y.npy", np.asarray(y).dtype)
+        share_array(folds, data_dir / "folds.npy", folds.dtype)
+
+        layout = {"sparse": sparse, "shape": list(X.shape)}
+        n_folds = int(folds.max()) + 1
+        with self._transaction() as db:
+            db.execute(
+                "INSERT INTO searches VALUES (?, ?, ?, ?)",
+                (search_id, pickle.dumps(estimator), json.dumps(layout), time.time()),
+            )
+            db.executemany(
+                "INSERT INTO trials (search_id, candidate, fold, params) VALUES (?, ?, ?, ?)",
+                [
+                    (search_id, candidate, fold, pickle.dumps(params))
+                    for candidate, params in enumerate(candidates)
+                    for fold in range(n_folds)
+                ],
+            )
+        return search_id
+
+    def claim(self, worker: str, search_id: str | None = None, lease: float = TRIAL_LEASE_SECONDS):
+        """
+        Leases the next pending trial, or a running one whose lease ran out, to `worker`.
+        Returns None if there is nothing to claim.
+        """
+        now = time.time()
+        condition = "(state = 'pending' OR (state = 'running' AND lease_until < ?))"
+        args = [now]
+        if search_id is not None:
+            condition += " AND search_id = ?"
+            args.append(search_id)
+        with self._transaction() as db:
+            # Trials of crashed workers first, then in publishing order
+            trial = db.execute(
+                f"SELECT * FROM trials WHERE {condition} "
+                "ORDER BY attempts DESC, search_id, candidate, fold LIMIT 1",
+                args,
+            ).fetchone()
+            if trial is None:
+                return None
+            if trial["attempts"] >= MAX_TRIAL_ATTEMPTS:
+                db.execute(
+                    "UPDATE trials SET state = 'failed', error = ? "
+                    "WHERE search_id = ? AND candidate = ? AND fold = ?",
+                    (f"Gave up after {trial['attempts']} workers died", *_key(trial)),
+                )
+                claimed = None
+            else:
+                db.execute(
+                    "UPDATE trials SET state = 'running', worker = ?, lease_until = ?, "
+                    "attempts = attempts + 1 WHERE search_id = ? AND candidate = ? AND fold = ?",
+                    (worker, now + lease, *_key(trial)),
+                )
+                claimed = dict(trial, worker=worker, attempts=trial["attempts"] + 1)
+        if claimed is None:
+            logger.warning(
+                "Trial {}/{} of search {} failed {} times, giving up",
+                trial["candidate"],
+                trial["fold"],
+                trial["search_id"],
+                trial["attempts"],
+            )
+            return self.claim(worker, search_id, lease)
+        return claimed
+
+    def renew(self, trial: dict, lease: float = TRIAL_LEASE_SECONDS):
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE trials SET lease_until = ? WHERE search_id = ? AND candidate = ? "
+                "AND fold = ? AND worker = ? AND state = 'running'",
+                (time.time() + lease, *_key(trial), trial["worker"]),
+            )
+
+    def complete(self, trial: dict, score: float, fit_seconds: float, error: str | None = None):
+        """Records the score of a fit. A fit that raised counts as done with a NaN score."""
+        with self._transaction() as db:
+            # A worker that lost its lease may still finish, the first result counts
+            db.execute(
+                "UPDATE trials SET state = 'done', score = ?, fit_seconds = ?, error = ? "
+                "WHERE search_id = ? AND candidate = ? AND fold = ? AND state = 'running'",
+                (None if math.isnan(score) else score, fit_seconds, error, *_key(trial)),
+            )
+
+    def estimator(self, search_id: str):
+        row = self._db.execute(
+            "SELECT estimator FROM searches WHERE search_id = ?", (search_id,)
+        ).fetchone()
+        return pickle.loads(row["estimator"])
+
+    def load_data(self, search_id: str):
+        """Memory-maps the training data and row folds that `publish` wrote."""
+        row = self._db.execute(
+            "SELECT layout FROM searches WHERE search_id = ?", (search_id,)
+        ).fetchone()
+        layout = json.loads(row["layout"])
+        data_dir = self.data_dir(search_id)
+        if layout["sparse"]:
+            from scipy.sparse import csr_matrix
+
+            parts = [
+                np.load(data_dir / f"X_{field}.npy", mmap_mode="r")
+                for field in ("data", "indices", "indptr")
+            ]
+            X = csr_matrix(tuple(parts), shape=tuple(layout["shape"]), copy=False)
+        else:
+            X = np.load(data_dir / "X.npy", mmap_mode="r")
+        y = np.load(data_dir / "y.npy", mmap_mode="r")
+        return X, y, np.load(data_dir / "folds.npy", mmap_mode="r")
+
+    def progress(self, search_id: str) -> dict[str, int]:
+        rows = self._db.execute(
+            "SELECT state, COUNT(*) AS trials FROM trials WHERE search_id = ? GROUP BY state",
+            (search_id,),
+        )
+        return {row["state"]: row["trials"] for row in rows}
+
+    def results(self, search_id: str) -> list[dict]:
+        rows = self._db.execute(
+            "SELECT candidate, fold, params, state, attempts, score, fit_seconds, error "
+            "FROM trials WHERE search_id = ? ORDER BY candidate, fold",
+            (search_id,),
+        )
+        return [dict(row, params=pickle.loads(row["params"])) for row in rows]
+
+    def remove(self, search_id: str):
+        """Deletes a finished search and its data. Fits still running keep their mapping."""
+        with self._transaction() as db:
+            db.execute("DELETE FROM trials WHERE search_id = ?", (search_id,))
+            db.execute("DELETE FROM searches WHERE search_id = ?", (search_id,))
+        shutil.rmtree(self.data_dir(search_id), ignore_errors=True)
+
+    def close(self):
+        self._db.close()
+
+
+def _key(trial: dict) -> tuple:
+    return trial["search_id"], trial["candidate"], trial["fold"]
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def run_trial(queue: TrialQueue, trial: dict, data: dict, lease: float):
+    """Fits one fold, renewing the lease from a thread until the score is recorded."""
+    from sklearn.base import clone
+    from sklearn.metrics import check_scoring
+
+    search_id = trial["search_id"]
+    if search_id not in data:
+        data.clear()
+        data[search_id] = (queue.estimator(search_id), *queue.load_data(search_id))
+    estimator, X, y, folds = data[search_id]
+
+    stopped = threading.Event()
+
+    def renew():
+        # A separate connection, sqlite connections must not be shared between threads
+        renewing = TrialQueue(queue.directory)
+        while not stopped.wait(lease / 3):
+            renewing.renew(trial, lease)
+        renewing.close()
+
+    renewer = threading.Thread(target=renew, daemon=True)
+    renewer.start()
+    start = time.perf_counter()
+    try:
+        test = folds == trial["fold"]
+        train, test = np.flatnonzero(~test), np.flatnonzero(test)
+        model = clone(estimator).set_params(**pickle.loads(trial["params"]))
+        model.fit(X[train], y[train])
+        score, error = float(check_scoring(model)(model, X[test], y[test])), None
+    except Exception as e:  # noqa: BLE001 - like `error_score=np.nan` in scikit-learn
+        score, error = float("nan"), f"{type(e).__name__}: {e}"
+    finally:
+        stopped.set()
+        renewer.join()
+    queue.complete(trial, score, time.perf_counter() - start, error)
+    logger.info(
+        "Trial {}/{} of search {}: score {:.4f} in {:.2f}s{}",
+        trial["candidate"],
+        trial["fold"],
+        search_id,
+        score,
+        time.perf_counter() - start,
+        f" ({error})" if error else "",
+    )
+
+
+def work(
+    directory: Path = TRIAL_QUEUE_DIR,
+    search_id: str | None = None,
+    idle_seconds: float | None = None,
+    lease: float = TRIAL_LEASE_SECONDS,
+):
+    """
+    Claims and fits trials until the queue has been empty for `idle_seconds`, forever if
+    None. With `search_id`, only fits that search and stops once it is finished.
+    """
+    queue = TrialQueue(directory)
+    name = worker_name()
+    data = {}
+    idle_since = time.monotonic()
+    try:
+        while True:
+            trial = queue.claim(name, search_id, lease)
+            if trial is not None:
+                run_trial(queue, trial, data, lease)
+                idle_since = time.monotonic()
+                continue
+            if search_id is not None and not {"pending", "running"} & set(
+                queue.progress(search_id)
+            ):
+                return
+            if idle_seconds is not None and time.monotonic() - idle_since > idle_seconds:
+                return
+            time.sleep(POLL_SECONDS)
+    finally:
+        queue.close()
+
+
+class QueueSearchCV:
+    """
+    Randomized search whose CV fits run as trials of a `TrialQueue`, by `n_jobs` worker
+    processes it starts itself plus any started with `trial_queue.py`. Candidates
+    and folds are the ones `RandomizedSearchCV(random_state=RANDOM_STATE)` would use, and
+    the best candidate is refit on all rows here. Exposes the attributes `train.py` reads.
+    """
+
+    def __init__(
+        self,
+        estimator,
+        param_distributions: dict,
+        n_iter: int,
+        cv: int,
+        n_jobs: int = 1,
+        directory: Path = TRIAL_QUEUE_DIR,
+        random_state: int = RANDOM_STATE,
+        lease: float = TRIAL_LEASE_SECONDS,
+    ):
+        self.estimator = estimator
+        self.param_distributions = param_distributions
+        self.n_iter = n_iter
+        self.cv = cv
+        self.n_jobs = n_jobs
+        self.directory = directory
+        self.random_state = random_state
+        self.lease = lease
+
+    def _folds(self, X, y) -> np.ndarray:
+        from sklearn.base import is_classifier
+        from sklearn.model_selection import check_cv
+
+        folds = np.empty(len(y), dtype=np.int16)
+        splitter = check_cv(self.cv, y, classifier=is_classifier(self.estimator))
+        for fold, (_, test) in enumerate(splitter.split(X, y)):
+            folds[test] = fold
+        return folds
+
+    def _wait(self, queue: TrialQueue, search_id: str):
+        context = get_context("spawn")
+        args = (self.directory, search_id, None, self.lease)
+        workers = [context.Process(target=work, args=args) for _ in range(self.n_jobs)]
+        for process in workers:
+            process.start()
+
+        # Restarts per worker slot, and when a dead worker's replacement is due
+        restarts = [0] * len(workers)
+        restart_at = [None] * len(workers)
+        reported = -math.inf
+        while True:
+            progress = queue.progress(search_id)
+            if not {"pending", "running"} & set(progress):
+                break
+            if time.monotonic() - reported > PROGRESS_LOG_SECONDS:
+                logger.info("Search {}: {}", search_id, progress)
+                reported = time.monotonic()
+            # Replace local workers that died, their trials are retried after the lease. A
+            # worker that dies before claiming anything never uses up a trial's attempts, so
+            # restarts back off and are capped.
+            for i, process in enumerate(workers):
+                if not process.exitcode:
+                    continue
+                if restart_at[i] is None:
+                    if sum(restarts) >= MAX_TRIAL_ATTEMPTS * len(workers):
+                        for other in workers:
+                            other.terminate()
+                            other.join()
+                        raise RuntimeError(
+                            f"Workers of search {search_id} died {sum(restarts) + 1} times, "
+                            f"the last one with exit code {process.exitcode}"
+                        )
+                    delay = min(POLL_SECONDS * 2 ** restarts[i], self.lease)
+                    restart_at[i] = time.monotonic() + delay
+                    logger.warning(
+                        "Worker exited with {}, restarting in {:.0f}s", process.exitcode, delay
+                    )
+                elif time.monotonic() >= restart_at[i]:
+                    restarts[i] += 1
+                    restart_at[i] = None
+                    workers[i] = context.Process(target=work, args=args)
+                    workers[i].start()
+            time.sleep(POLL_SECONDS)
+
+        for process in workers:
+            process.join()
+
+    def fit(self, X, y):
+        from sklearn.base import clone
+        from sklearn.model_selection import ParameterSampler
+
+        y = np.asarray(y).ravel()
+        candidates = list(
+            ParameterSampler(self.param_distributions, self.n_iter, random_state=self.random_state)
+        )
+        queue = TrialQueue(self.directory)
+        search_id = queue.publish(self.estimator, candidates, X, y, self._folds(X, y))
+        logger.info(
+            "Published {} candidates x {} folds as search {} in {}",
+            len(candidates),
+            self.cv,
+            search_id,
+            self.directory,
+        )
+        try:
+            self._wait(queue, search_id)
+            trials = queue.results(search_id)
+        finally:
+            queue.remove(search_id)
+            queue.close()
+
+        scores = np.full((len(candidates), int(self.cv)), np.nan)
+        fit_times = np.zeros_like(scores)
+        for trial in trials:
+            if trial["score"] is not None:
+                scores[trial["candidate"], trial["fold"]] = trial["score"]
+            fit_times[trial["candidate"], trial["fold"]] = trial["fit_seconds"] or 0.0
+        errors = [trial["error"] for trial in trials if trial["error"]]
+        if errors:
+            logger.warning("{} of {} fits failed, e.g. {}", len(errors), len(trials), errors[0])
+
+        mean_scores = scores.mean(axis=1)
+        if np.isnan(mean_scores).all():
+            raise ValueError(f"All {len(trials)} fits failed, e.g. {errors[0]}")
+        # Failed candidates rank last, ties go to the first candidate like in scikit-learn
+        ranked = np.where(np.isnan(mean_scores), -np.inf, mean_scores)
+        self.best_index_ = int(np.argmax(ranked))
+        self.best_params_ = candidates[self.best_index_]
+        self.best_score_ = float(mean_scores[self.best_index_])
+        self.cv_results_ = {
+            "params": candidates,
+            "mean_test_score": mean_scores,
+            "std_test_score": scores.std(axis=1),
+            "mean_fit_time": fit_times.mean(axis=1),
+            "rank_test_score": np.argsort(np.argsort(-ranked, kind="stable")) + 1,
+        }
+
+        start = time.perf_counter()
+        self.best_estimator_ = clone(self.estimator).set_params(**self.best_params_).fit(X, y)
+        self.refit_time_ = time.perf_counter() - start
+        return self
+
+    def predict(self, X):
+        return self.best_estimator_.predict(X)
+
+
+@app.command()
+def main(directory: Path = TRIAL_QUEUE_DIR, idle_seconds: float | None = None):
+    """
+    Fits trials published by `train.py --search queue` until stopped, or until the queue
+    has had nothing to claim for `--idle-seconds`. Workers on other nodes need the queue
+    directory on a shared filesystem.
+    """
+    logger.info("Worker {} taking trials from {}", worker_name(), directory)
+    work(directory, idle_seconds=idle_seconds)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,182 @@
+import copy
+from typing import Any
+
+from mlflow.pyfunc.model import PythonModel
+import numpy as np
+import pandas as pd
+
+# Rows scored at once, which bounds the feature matrix and preprocessing copies of a call
+PREDICT_CHUNK_ROWS = 100_000
+
+# Column orders whose mapping to the training order is cached
+MAX_CACHED_LAYOUTS = 64
+
+
+def feature_schema(features, names: list[str] | None = None) -> dict[str, str]:
+    """
+    Feature names and dtypes in training order, as `MLFlowWrapper` records them. Training
+    passes the preprocessor's feature names as `names`, so every family records the same
+    columns in the same order. Sparse matrices carry no column names and need them.
+    """
+    if isinstance(features, pd.DataFrame):
+        dtypes = features.dtypes
+        return {name: str(dtypes[name]) for name in (names or dtypes.index)}
+    return {name: str(features.dtype) for name in names}
+
+
+def _rows(model_input) -> int:
+    if isinstance(model_input, dict):
+        return len(next(iter(model_input.values()), ()))
+    if hasattr(model_input, "num_rows"):  # pyarrow RecordBatch or Table
+        return model_input.num_rows
+    return len(model_input)
+
+
+def _slice(model_input, start: int, stop: int):
+    if isinstance(model_input, pd.DataFrame):
+        return model_input.iloc[start:stop]
+    if isinstance(model_input, dict):
+        return {name: values[start:stop] for name, values in model_input.items()}
+    if hasattr(model_input, "num_rows"):
+        return model_input.slice(start, stop - start)
+    return model_input[start:stop]
+
+
+def _check_numeric(name: str, dtype):
+    if not pd.api.types.is_numeric_dtype(dtype):
+        raise ValueError(f"Feature '{name}' must be numeric, got dtype {dtype}")
+
+
+class MLFlowWrapper(PythonModel):
+    """
+    Scores processed features or, when logged with the fitted `LeadPreprocessor`, raw lead
+    records, which are preprocessed first. With the training `schema` (feature name to
+    dtype, in training order) features can also come as a 2D array in that order, a dict
+    of columns or a pyarrow record batch, and are matched to the training order by name.
+    Inputs are scored `PREDICT_CHUNK_ROWS` rows at a time, or `params["chunk_rows"]`.
+    """
+
+    def __init__(self, model, preprocessor=None, schema: dict[str, str] | None = None):
+        self.model = model
+        self.preprocessor = preprocessor
+        self.schema = schema
+
+    def load_context(self, context):
+        import joblib
+
+        from itu_sdse_project.modeling.artifacts import load_model
+
+        self.model = load_model(context.artifacts["model"])
+        if "preprocessor" in context.artifacts:
+            self.preprocessor = joblib.load(context.artifacts["preprocessor"])
+
+    def __getstate__(self):
+        # Column layouts and the unchecked estimator are cached per process
+        return {
+            key: value
+            for key, value in self.__dict__.items()
+            if key not in ("_layouts", "_unchecked")
+        }
+
+    def _estimator(self):
+        """
+        The model without scikit-learn's feature name check, which takes most of the time
+        of small calls and which `schema` already covers. A shallow copy, so the fitted
+        arrays are shared, made again if `model` is replaced.
+        """
+        model, unchecked = self.__dict__.get("_unchecked", (None, None))
+        if model is not self.model:
+            model, unchecked = self.model, self.model
+            # XGBoost exposes it as a property, and does not check arrays against it
+            if "feature_names_in_" in vars(model):
+                unchecked = copy.copy(model)
+                del unchecked.feature_names_in_
+            self._unchecked = (model, unchecked)
+        return unchecked
+
+    def _layout(self, columns: tuple, dtypes: tuple) -> np.ndarray | None:
+        """
+        Positions of the training features among `columns`, or None if they are already
+        the training order. Resolved and checked once per column order and dtypes.
+        """
+        layouts = self.__dict__.setdefault("_layouts", {})
+        key = (columns, dtypes)
+        if key not in layouts:
+            names = list(self.schema)
+            positions = pd.Index(columns).get_indexer(names)
+            missing = [name for name, position in zip(names, positions) if position == -1]
+            if missing:
+                raise ValueError(f"Input is missing features {missing}")
+            for position in positions:
+                _check_numeric(columns[position], dtypes[position])
+            if len(layouts) >= MAX_CACHED_LAYOUTS:
+                layouts.clear()
+            in_order = list(positions) == list(range(len(columns)))
+            layouts[key] = None if in_order else positions
+        return layouts[key]
+
+    def _matrix(self, features) -> np.ndarray:
+        dtype = np.result_type(*self.schema.values())
+        if isinstance(features, pd.DataFrame):
+            positions = self._layout(tuple(features.columns), tuple(features.dtypes.to_numpy()))
+            if positions is not None:
+                features = features.iloc[:, positions]
+            return features.to_numpy(dtype=dtype)
+
+        if isinstance(features, dict):
+            positions = self._layout(
+                tuple(features), tuple(np.asarray(column).dtype for column in features.values())
+            )
+            columns = list(features.values())
+            order = positions if positions is not None else range(len(columns))
+            matrix = np.empty((_rows(features), len(self.schema)), dtype=dtype)
+            for j, position in enumerate(order):
+                matrix[:, j] = columns[position]
+            return matrix
+
+        matrix = np.asarray(features)
+        if matrix.ndim != 2 or matrix.shape[1] != len(self.schema):
+            raise ValueError(
+                f"Expected an array of shape (rows, {len(self.schema)}), got {matrix.shape}"
+            )
+        _check_numeric("<array>", matrix.dtype)
+        return matrix.astype(dtype, copy=False)
+
+    def _to_features(self, chunk):
+        """Preprocesses raw records, and turns features into a matrix in training order."""
+        if hasattr(chunk, "num_rows"):
+            chunk = {name: chunk.column(name).to_numpy() for name in chunk.column_names}
+        preprocessor = getattr(self, "preprocessor", None)
+        if preprocessor is not None:
+            if isinstance(chunk, dict) and not set(preprocessor.feature_names).issubset(chunk):
+                chunk = pd.DataFrame(chunk)
+            if isinstance(chunk, pd.DataFrame) and not preprocessor.is_encoded(chunk):
+                chunk = preprocessor.transform(chunk)
+        if getattr(self, "schema", None) is None:
+            # Logged before the schema was recorded, so only frames can be matched by name
+            return pd.DataFrame(chunk) if isinstance(chunk, dict) else chunk
+
+        return self._matrix(chunk)
+
+    def _score(self, chunk) -> np.ndarray:
+        features = self._to_features(chunk)
+        model = self.model if getattr(self, "schema", None) is None else self._estimator()
+        return model.predict_proba(features)[:, 1]
+
+    # MLflow passes any input through unchanged for a DataFrame hint, which it also
+    # accepts without warnings, unlike a union with the other input types
+    def predict(
+        self, context, model_input: pd.DataFrame, params: dict[str, Any] | None = None
+    ) -> np.ndarray:
+        chunk_rows = (params or {}).get("chunk_rows", PREDICT_CHUNK_ROWS)
+        rows = _rows(model_input)
+        if rows <= chunk_rows:
+            return self._score(model_input)
+
+        scores = None
+        for start in range(0, rows, chunk_rows):
+            chunk_scores = self._score(_slice(model_input, start, start + chunk_rows))
+            if scores is None:
+                scores = np.empty(rows, dtype=chunk_scores.dtype)
+            scores[start : start + len(chunk_scores)] = chunk_scores
+        return scores
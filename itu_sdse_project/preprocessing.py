@@ -0,0 +1,253 @@
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import MinMaxScaler
+
+DROPPED_COLS = [
+    "is_active",
+    "marketing_consent",
+    "first_booking",
+    "existing_customer",
+    "last_seen",
+    "domain",
+    "country",
+    "visited_learn_more_before_booking",
+    "visited_faq",
+]
+# Dtype plan of prepared rows. Numeric columns outside of it are continuous features.
+ID_COLS = ["lead_id"]
+ID_DTYPE = "uint32"
+DATE_COLS = ["date_part"]
+CATEGORY_COLS = ["lead_indicator", "customer_group", "onboarding", "source"]
+# Nearly unique per lead, so they stay strings, which are stored as one Arrow buffer
+STRING_COLS = ["customer_code"]
+# Columns that can never be missing after `filter_rows`, so their mode is never needed
+NON_NULL_COLS = ["lead_id", "lead_indicator", "source", "customer_code"]
+SOURCE_MAPPING = {"li": "socials", "fb": "socials", "organic": "group1", "signup": "group1"}
+
+LABEL_COL = "lead_indicator"
+UNUSED_COLS = ["lead_id", "customer_code", "date_part"]
+CAT_COLS = ["customer_group", "onboarding", "bin_source", "source"]
+
+
+def read_raw(path, **kwargs) -> pd.DataFrame:
+    """Reads `raw_data.csv` without the columns `prepare_columns` drops anyway."""
+    return pd.read_csv(path, usecols=lambda col: col not in DROPPED_COLS, **kwargs)
+
+
+def prepare_columns(data: pd.DataFrame, categorical: bool = True) -> pd.DataFrame:
+    """
+    Parses dates, drops unused raw columns and casts categorical columns to `category`.
+    Rows that are only encoded and thrown away can skip the cast with `categorical=False`.
+    """
+    data = data.drop(DROPPED_COLS, axis=1, errors="ignore")
+    if "date_part" in data:
+        data["date_part"] = pd.to_datetime(data["date_part"])
+    for col in CATEGORY_COLS:
+        if col in data:
+            data[col] = data[col].replace("", np.nan)
+            if categorical:
+                data[col] = data[col].astype("category")
+    for col in STRING_COLS:
+        if col in data:
+            data[col] = data[col].astype("str").replace("", np.nan)
+    return data
+
+
+def filter_rows(data: pd.DataFrame) -> pd.DataFrame:
+    """Keeps labelled signup leads, the rows the model is trained on."""
+    data = prepare_columns(data)
+    data["lead_id"] = data["lead_id"].replace("", np.nan)
+    data = data.dropna(axis=0, subset=["lead_indicator"])
+    data = data.dropna(axis=0, subset=["lead_id"])
+    data = data[data.source == "signup"]
+    # Only labelled rows are guaranteed an id, raw records to score may lack one
+    return data.assign(lead_id=compact_ids(data["lead_id"]))
+
+
+def compact_ids(ids: pd.Series) -> pd.Series:
+    ids = pd.to_numeric(ids)
+    if len(ids) and (ids.min() < 0 or ids.max() > np.iinfo(ID_DTYPE).max or (ids % 1).any()):
+        raise ValueError(f"Lead ids must be integers that fit into {ID_DTYPE}")
+    return ids.astype(ID_DTYPE)
+
+
+def split_columns(data: pd.DataFrame) -> tuple[list[str], list[str]]:
+    """Continuous and categorical columns, the latter including ids and dates."""
+    planned = ID_COLS + DATE_COLS + CATEGORY_COLS + STRING_COLS
+    cat_cols = [
+        col
+        for col, dtype in data.dtypes.items()
+        if col in planned or not pd.api.types.is_numeric_dtype(dtype)
+    ]
+    cont_cols = [
+        col for col, dtype in data.dtypes.items() if col not in cat_cols and dtype.kind in "iuf"
+    ]
+    return cont_cols, cat_cols
+
+
+def fill_missing(values: pd.Series, value) -> pd.Series:
+    """`fillna` that adds `value` to the categories of a categorical column first."""
+    if isinstance(values.dtype, pd.CategoricalDtype) and value not in values.cat.categories:
+        if not values.hasnans:
+            return values
+        values = values.cat.add_categories([value])
+    return values.fillna(value)
+
+
+def levels(values: pd.Series) -> pd.Index:
+    """
+    Distinct values in the order `astype("category")` would give them, also for columns
+    that already are categorical, whose categories keep the order they were read in and
+    may include values that no row has.
+    """
+    uniques = pd.Series(np.asarray(values.dropna().unique()))
+    return uniques.astype("category").cat.categories
+
+
+class LeadPreprocessor:
+    """
+    Fitted cleaning and encoding steps of `make_dataset.py` and `features.py`.
+
+    Holds the clip bounds, imputation values, fitted `MinMaxScaler`, source mapping and
+    dummy vocabulary, so raw lead records can be turned into model features with
+    `transform` without recomputing any statistics.
+    """
+
+    def __init__(
+        self,
+        cont_cols: list[str],
+        cat_cols: list[str],
+        bounds: dict[str, tuple[float, float]],
+        fill_values: dict[str, Any],
+        scaler: MinMaxScaler,
+        source_mapping: dict[str, str] = SOURCE_MAPPING,
+    ):
+        self.cont_cols = cont_cols
+        self.cat_cols = cat_cols
+        self.bounds = bounds
+        self.fill_values = fill_values
+        self.scaler = scaler
+        self.source_mapping = source_mapping
+        self.dummies: dict[str, tuple[str, Any]] = {}
+        self.categories: dict[str, list] = {}
+        self.numeric_cols: list[str] = []
+        self.feature_names: list[str] = []
+
+    @classmethod
+    def from_data(cls, data: pd.DataFrame) -> "LeadPreprocessor":
+        """Fits the cleaning statistics on rows returned by `filter_rows`."""
+        cont_cols, cat_cols = split_columns(data)
+
+        bounds = {}
+        fill_values = {}
+        imputed = {}
+        for col in cont_cols:
+            x = data[col]
+            bounds[col] = (x.mean() - 2 * x.std(), x.mean() + 2 * x.std())
+            clipped = x.clip(lower=bounds[col][0], upper=bounds[col][1])
+            fill_values[col] = clipped.mean()
+            imputed[col] = clipped.fillna(fill_values[col])
+        for col in cat_cols:
+            mode = data[col].mode()
+            if col not in NON_NULL_COLS and len(mode):
+                fill_values[col] = mode[0]
+
+        scaler = MinMaxScaler()
+        scaler.fit(pd.DataFrame(imputed, columns=cont_cols))
+        return cls(cont_cols, cat_cols, bounds, fill_values, scaler)
+
+    def clean(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Clips, imputes and scales prepared rows into the `cleaned_data` layout."""
+        cont_vars = data[self.cont_cols].copy()
+        cat_vars = data[[col for col in self.cat_cols if col in data]].copy()
+
+        for col, (lower, upper) in self.bounds.items():
+            clipped = cont_vars[col].clip(lower=lower, upper=upper)
+            cont_vars[col] = clipped.fillna(self.fill_values[col])
+        if "customer_code" in cat_vars:
+            cat_vars["customer_code"] = fill_missing(cat_vars["customer_code"], "None")
+        for col in cat_vars:
+            if col in self.fill_values:
+                cat_vars[col] = fill_missing(cat_vars[col], self.fill_values[col])
+
+        cont_vars = pd.DataFrame(self.scaler.transform(cont_vars), columns=self.cont_cols)
+        cat_vars = cat_vars.reset_index(drop=True)
+        data = pd.concat([cat_vars, cont_vars], axis=1)
+        data["bin_source"] = data["source"].map(self.source_mapping)
+        return data
+
+    def fit_encoding(self, data: pd.DataFrame, cat_cols: list[str] = CAT_COLS):
+        """Records the dummy vocabulary of cleaned data, without the first level of each column."""
+        self.dummies = {}
+        self.categories = {}
+        for col in cat_cols:
+            self.categories[col] = list(levels(data[col])[1:])
+            for value in self.categories[col]:
+                self.dummies[f"{col}_{value}"] = (col, value)
+        self.numeric_cols = [
+            col for col in data if col not in cat_cols + UNUSED_COLS + [LABEL_COL]
+        ]
+        self.feature_names = self.numeric_cols + list(self.dummies)
+        return self
+
+    def _dummy_positions(self, data: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+        """Row and column index of every set dummy, looked up once per categorical column."""
+        rows, cols = [], []
+        offset = 0
+        for col, categories in self.categories.items():
+            # Factorize first so the vocabulary lookup only runs on the distinct values
+            values, uniques = pd.factorize(data[col])
+            codes = np.append(pd.Index(categories).get_indexer(np.asarray(uniques)), -1)[values]
+            (hits,) = np.nonzero(codes >= 0)
+            rows.append(hits)
+            cols.append(offset + codes[hits])
+            offset += len(categories)
+        return np.concatenate(rows), np.concatenate(cols)
+
+    def encode(
+        self, data: pd.DataFrame, dummy_dtype="float64", numeric_dtype="float64"
+    ) -> pd.DataFrame:
+        """
+        One-hot encodes cleaned rows with the fitted vocabulary in a single pass.
+        Unseen levels become zeros. Pass `dummy_dtype="uint8"` for compact dummy columns
+        and `numeric_dtype="float32"` for compact continuous ones.
+        """
+        rows, cols = self._dummy_positions(data)
+        numeric = data[self.numeric_cols].to_numpy(dtype=numeric_dtype)
+
+        if np.dtype(dummy_dtype) == numeric.dtype:
+            # Column-major, which is how pandas stores the block, so no copy is made
+            X = np.zeros((len(data), len(self.feature_names)), dtype=numeric.dtype, order="F")
+            X[:, : len(self.numeric_cols)] = numeric
+            X[rows, len(self.numeric_cols) + cols] = 1
+            return pd.DataFrame(X, columns=self.feature_names, copy=False)
+
+        dummies = np.zeros((len(data), len(self.dummies)), dtype=dummy_dtype, order="F")
+        dummies[rows, cols] = 1
+        return pd.concat(
+            [
+                pd.DataFrame(numeric, columns=self.numeric_cols, copy=False),
+                pd.DataFrame(dummies, columns=list(self.dummies), copy=False),
+            ],
+            axis=1,
+        )
+
+    def encode_sparse(self, data: pd.DataFrame):
+        """Same as `encode`, but returns a `scipy.sparse` CSR matrix in `feature_names` order."""
+        from scipy import sparse
+
+        rows, cols = self._dummy_positions(data)
+        dummies = sparse.csr_matrix(
+            (np.ones(len(rows)), (rows, cols)), shape=(len(data), len(self.dummies))
+        )
+        numeric = sparse.csr_matrix(data[self.numeric_cols].to_numpy(dtype="float64"))
+        return sparse.hstack([numeric, dummies], format="csr")
+
+    def transform(self, raw: pd.DataFrame) -> pd.DataFrame:
+        """Turns raw lead records, as found in `raw_data.csv`, into model features."""
+        return self.encode(self.clean(prepare_columns(raw, categorical=False)))
+
+    def is_encoded(self, data: pd.DataFrame) -> bool:
+        return set(self.feature_names).issubset(data.columns)
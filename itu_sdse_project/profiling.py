@@ -0,0 +1,176 @@
+from collections import Counter
+from contextlib import contextmanager
+import json
+import os
+from pathlib import Path
+import sys
+import threading
+import time
+
+from loguru import logger
+
+from itu_sdse_project.config import (
+    PROFILE_DIR,
+    PROFILE_INTERVAL,
+    PROFILE_STAGES,
+    PROFILE_TRACE,
+    TRACE_PATH,
+)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb() -> dict[str, float]:
+    """
+    Peak resident memory of this process and of its largest reaped child, in MiB. Pages
+    of a shared memory map count towards every process that touched them.
+    """
+    if resource is None:
+        return {}
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    scale = 1024**2 if sys.platform == "darwin" else 1024
+    return {
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        "peak_worker_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale,
+    }
+
+
+def cpu_seconds() -> float:
+    """CPU time of this process and of its reaped children."""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples the call stack of one thread every `interval` seconds and counts the stacks
+    in the folded format read by flamegraph.pl, speedscope and inferno.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def dump(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("".join(f"{stack} {count}\n" for stack, count in self.stacks.items()))
+
+
+class Stage:
+    """Measurements of a `profile_stage` block. Set `rows` in the block if not known up front."""
+
+    def __init__(self, name: str, rows: int | None = None):
+        self.name = name
+        self.rows = rows
+        self.metrics: dict[str, float] = {}
+
+    def record_memory(self, name: str, data):
+        """Records the in-memory size of a DataFrame, Series or array as `<name>_mb`."""
+        if hasattr(data, "memory_usage"):
+            size = data.memory_usage(deep=True, index=False)
+            size = size.sum() if hasattr(size, "sum") else size
+        else:
+            size = data.nbytes
+        self.metrics[f"{name}_mb"] = float(size) / 1024**2
+
+
+def _write_trace(event: dict, path: Path):
+    # The JSON array format allows leaving out the closing bracket, so events can be
+    # appended by every process without rewriting the file
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        with open(path, "x") as f:
+            f.write("[\n")
+    except FileExistsError:
+        pass
+    with open(path, "a") as f:
+        f.write(json.dumps(event) + ",\n")
+
+
+def _log_to_mlflow(stage: Stage):
+    # Only log into a run somebody else started, data stages must not pay for importing MLflow
+    mlflow = sys.modules.get("mlflow")
+    if mlflow is not None and mlflow.active_run() is not None:
+        mlflow.log_metrics({f"{stage.name}/{key}": value for key, value in stage.metrics.items()})
+
+
+@contextmanager
+def profile_stage(name: str, rows: int | None = None):
+    """
+    Measures wall time, CPU time (including reaped workers), the peak RSS reached so far
+    and rows per second of the block. The measurements are logged as `<name>/<metric>`
+    metrics when an MLflow run is active. With PROFILE_TRACE=1 they are also appended to
+    TRACE_PATH, which chrome://tracing and Perfetto open directly, and with
+    PROFILE_STAGES=1 the block's call stacks are sampled into
+    `PROFILE_DIR/<name>-<pid>.folded`.
+    """
+    stage = Stage(name, rows)
+    sampler = None
+    if PROFILE_STAGES:
+        sampler = StackSampler(threading.get_ident(), PROFILE_INTERVAL)
+        sampler.start()
+
+    start = time.time()
+    start_wall, start_cpu = time.perf_counter(), cpu_seconds()
+    try:
+        yield stage
+    finally:
+        if sampler is not None:
+            sampler.stop()
+    wall = time.perf_counter() - start_wall
+
+    memory = stage.metrics
+    stage.metrics = {"wall_seconds": wall, "cpu_seconds": cpu_seconds() - start_cpu}
+    stage.metrics.update(peak_rss_mb())
+    stage.metrics.update(memory)
+    if stage.rows is not None:
+        stage.metrics["rows"] = stage.rows
+        stage.metrics["rows_per_second"] = stage.rows / wall if wall else 0.0
+
+    if PROFILE_TRACE:
+        _write_trace(
+            {
+                "name": name,
+                "cat": "stage",
+                "ph": "X",
+                "ts": int(start * 1e6),
+                "dur": int(wall * 1e6),
+                "pid": os.getpid(),
+                "tid": threading.get_native_id(),
+                "args": stage.metrics,
+            },
+            TRACE_PATH,
+        )
+    _log_to_mlflow(stage)
+    if sampler is not None:
+        sampler.dump(PROFILE_DIR / f"{name}-{os.getpid()}.folded")
+
+    logger.info(
+        "Stage '{}' took {:.2f}s wall, {:.2f}s CPU{}{}",
+        name,
+        wall,
+        stage.metrics["cpu_seconds"],
+        f", {stage.metrics['rows_per_second']:.0f} rows/s" if stage.rows is not None else "",
+        "".join(f", {key.removesuffix('_mb')} {value:.1f} MiB" for key, value in memory.items()),
+    )
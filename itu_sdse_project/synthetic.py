@@ -0,0 +1,129 @@
+from multiprocessing import Pool
+from pathlib import Path
+
+from loguru import logger
+import numpy as np
+import pandas as pd
+import typer
+
+from itu_sdse_project.config import EXTERNAL_DATA_DIR, RANDOM_STATE
+
+app = typer.Typer()
+
+# Column order of raw_data.csv
+RAW_COLUMNS = [
+    "lead_id",
+    "lead_indicator",
+    "date_part",
+    "is_active",
+    "marketing_consent",
+    "first_booking",
+    "existing_customer",
+    "last_seen",
+    "source",
+    "domain",
+    "country",
+    "visited_learn_more_before_booking",
+    "visited_faq",
+    "purchases",
+    "time_spent",
+    "customer_group",
+    "onboarding",
+    "customer_code",
+    "n_visits",
+]
+
+# Rates of the 12345 row raw_data.csv, and of its signup rows for the label. The other
+# distributions are fitted to the cleaned signup rows in tests/data/training_data.csv
+MISSING_LABEL_RATE = 0.048
+MISSING_CUSTOMER_CODE_RATE = 0.004
+POSITIVE_RATE = 0.47
+SOURCES = ["signup", "organic", "li", "fb"]
+
+# Dates are written without zero padding, as in raw_data.csv
+_DATES = np.array([f"2024-01-{day}" for day in range(1, 32)], dtype=object)
+
+
+def generate_chunk(start: int, rows: int, seed: int) -> pd.DataFrame:
+    """
+    Raw leads `start` to `start + rows`. Every chunk draws from its own stream, derived
+    from `seed` and `start`, so the output does not depend on which process made it.
+    """
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(start,)))
+    label = rng.random(rows) < POSITIVE_RATE
+    # Converting leads visit more often, the only feature the label depends on
+    n_visits = np.where(label, rng.negative_binomial(6, 0.35, rows), rng.geometric(0.2, rows) - 1)
+    codes = rng.integers(ord("A"), ord("Z") + 1, (rows, 10), dtype=np.uint8)
+
+    data = {
+        "lead_id": np.arange(start, start + rows),
+        "lead_indicator": np.where(rng.random(rows) < MISSING_LABEL_RATE, np.nan, label),
+        "date_part": _DATES[rng.integers(0, 31, rows)],
+        "is_active": rng.integers(0, 2, rows),
+        "marketing_consent": rng.random(rows) < 0.5,
+        "first_booking": _DATES[rng.integers(0, 31, rows)],
+        "existing_customer": rng.random(rows) < 0.5,
+        "last_seen": _DATES[rng.integers(0, 31, rows)],
+        "source": np.array(SOURCES, dtype=object)[rng.integers(0, len(SOURCES), rows)],
+        "domain": np.array([".dk", ".com", ".cn"], dtype=object)[rng.integers(0, 3, rows)],
+        "country": np.array(["US", "DK"], dtype=object)[rng.integers(0, 2, rows)],
+        "visited_learn_more_before_booking": rng.integers(0, 11, rows),
+        "visited_faq": rng.integers(0, 11, rows),
+        "purchases": rng.poisson(5, rows),
+        "time_spent": np.round(rng.normal(100, 10, rows), 3),
+        "customer_group": rng.integers(1, 10, rows),
+        "onboarding": rng.random(rows) < 0.52,
+        "customer_code": np.where(
+            rng.random(rows) < MISSING_CUSTOMER_CODE_RATE,
+            None,
+            codes.view("S10").ravel().astype(str).astype(object),
+        ),
+        "n_visits": n_visits,
+    }
+    return pd.DataFrame(data, columns=RAW_COLUMNS)
+
+
+def _chunk_csv(args: tuple[int, int, int]) -> str:
+    start, rows, seed = args
+    return generate_chunk(start, rows, seed).to_csv(index=False, header=False)
+
+
+def generate(
+    rows: int,
+    output_path: Path,
+    chunksize: int = 100_000,
+    workers: int = 1,
+    seed: int = RANDOM_STATE,
+):
+    """
+    Writes `rows` synthetic leads to `output_path` in the raw_data.csv layout. Chunks are
+    generated and formatted across `workers` processes and appended in order, so the file
+    is identical for any number of workers.
+    """
+    chunks = [(start, min(chunksize, rows - start), seed) for start in range(0, rows, chunksize)]
+    with open(output_path, "w", newline="") as f:
+        f.write(",".join(RAW_COLUMNS) + "\n")
+        if workers == 1:
+            f.writelines(map(_chunk_csv, chunks))
+        else:
+            with Pool(workers) as pool:
+                f.writelines(pool.imap(_chunk_csv, chunks))
+
+
+@app.command()
+def main(
+    rows: int = 12_345,
+    # Not data/raw, so the tracked raw data is only replaced on purpose
+    output_path: Path = EXTERNAL_DATA_DIR / "synthetic_raw_data.csv",
+    chunksize: int = 100_000,
+    workers: int = 1,
+    seed: int = RANDOM_STATE,
+):
+    logger.info("Generating {} synthetic raw rows on {} worker(s)", rows, workers)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    generate(rows, output_path, chunksize=chunksize, workers=workers, seed=seed)
+    logger.success("Wrote synthetic raw data to {}", output_path)
+
+
+if __name__ == "__main__":
+    app()
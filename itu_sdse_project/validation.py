@@ -0,0 +1,224 @@
+from collections import Counter
+import json
+from pathlib import Path
+
+from loguru import logger
+import numpy as np
+import pandas as pd
+import typer
+
+from itu_sdse_project.config import PROCESSED_DATA_DIR
+from itu_sdse_project.helpers import artifact_path, iter_artifact
+from itu_sdse_project.preprocessing import LABEL_COL
+from itu_sdse_project.profiling import profile_stage
+
+app = typer.Typer()
+
+features_path_default = artifact_path(PROCESSED_DATA_DIR, "features")
+labels_path_default = artifact_path(PROCESSED_DATA_DIR, "labels")
+preprocessor_path_default = PROCESSED_DATA_DIR / "preprocessor.joblib"
+
+LABELS = (0, 1)
+# Slack on the scaled ranges for values stored as float32
+RANGE_TOLERANCE = 1e-6
+
+
+def _row_hashes(values: np.ndarray) -> np.ndarray:
+    return pd.util.hash_pandas_object(pd.DataFrame(values, copy=False), index=False).to_numpy()
+
+
+def _combine(digest: int, hashes: np.ndarray) -> int:
+    # A sum of row hashes is the same in any row order, unlike a digest of the file
+    return (digest + int(hashes.sum(dtype=np.uint64))) % 2**64
+
+
+class FeatureValidator:
+    """
+    Checks processed features and labels chunk by chunk against the preprocessor that
+    produced them, and raises a ValueError at the first chunk that fails a check:
+
+    - schema: the feature columns and their order, and the dtypes of the artifact format;
+    - nulls: no missing features or labels;
+    - labels: a single label column with values in LABELS, both of which occur;
+    - alignment: one label per feature row;
+    - ranges: scaled columns within what the fitted `MinMaxScaler` maps the clip bounds
+      to, which is [0, 1] for the rows it was fitted on, and dummies either 0 or 1.
+
+    Also sums row hashes of the features, and of the features with their label, into
+    digests that do not depend on the row order.
+    """
+
+    def __init__(self, preprocessor, dtypes: dict[str, str]):
+        self.columns = list(preprocessor.feature_names)
+        self.scaled = len(preprocessor.numeric_cols)
+        self.dtypes = dtypes
+        cont_cols = preprocessor.cont_cols
+        bounds = pd.DataFrame(
+            [[preprocessor.bounds[col][i] for col in cont_cols] for i in (0, 1)],
+            columns=cont_cols,
+        )
+        limits = pd.DataFrame(preprocessor.scaler.transform(bounds), columns=cont_cols)
+        limits = limits[preprocessor.numeric_cols].to_numpy()
+        self.lower = np.minimum(limits[0], 0) - RANGE_TOLERANCE
+        self.upper = np.maximum(limits[1], 1) + RANGE_TOLERANCE
+
+        self.rows = 0
+        self.nulls = np.zeros(len(self.columns), dtype=np.int64)
+        self.minimum = np.full(self.scaled, np.inf)
+        self.maximum = np.full(self.scaled, -np.inf)
+        self.label_counts = Counter()
+        self.features_hash = 0
+        self.rows_hash = 0
+
+    def _fail(self, rows: int, message: str):
+        raise ValueError(f"Rows {self.rows}-{self.rows + rows - 1}: {message}")
+
+    def _check_schema(self, X: pd.DataFrame, y: pd.DataFrame):
+        if list(X.columns) != self.columns:
+            missing = [col for col in self.columns if col not in X.columns]
+            extra = [col for col in X.columns if col not in self.columns]
+            raise ValueError(
+                f"Feature columns differ from the preprocessor's: missing {missing}, "
+                f"unexpected {extra}, or in another order"
+            )
+        if list(y.columns) != [LABEL_COL]:
+            raise ValueError(f"Expected the single label column '{LABEL_COL}', got {list(y)}")
+
+        expected = [self.dtypes["numeric_dtype"]] * self.scaled + [self.dtypes["dummy_dtype"]] * (
+            len(self.columns) - self.scaled
+        )
+        wrong = {
+            col: f"{dtype} instead of {want}"
+            for col, dtype, want in zip(X.columns, X.dtypes, expected)
+            if dtype != np.dtype(want)
+        }
+        if y.dtypes.iloc[0] != np.dtype(self.dtypes["label_dtype"]):
+            wrong[LABEL_COL] = f"{y.dtypes.iloc[0]} instead of {self.dtypes['label_dtype']}"
+        if wrong:
+            raise ValueError(f"Unexpected dtypes: {wrong}")
+
+    def check(self, X: pd.DataFrame, y: pd.DataFrame):
+        if self.rows == 0:
+            self._check_schema(X, y)
+        if len(X) != len(y):
+            self._fail(max(len(X), len(y)), f"{len(X)} feature rows but {len(y)} labels")
+
+        values = X.to_numpy(dtype=np.float64)
+        labels = y.iloc[:, 0].to_numpy(dtype=np.float64)
+        nulls = np.isnan(values).sum(axis=0)
+        self.nulls += nulls
+        if nulls.any() or np.isnan(labels).any():
+            counts = {col: int(n) for col, n in zip(self.columns, nulls) if n}
+            counts[LABEL_COL] = int(np.isnan(labels).sum())
+            self._fail(len(X), f"Missing values per column {counts}")
+
+        unexpected = set(np.unique(labels).tolist()) - set(LABELS)
+        if unexpected:
+            self._fail(len(X), f"Labels {sorted(unexpected)} outside of {LABELS}")
+        self.label_counts.update(dict(zip(*np.unique(labels, return_counts=True))))
+
+        scaled, dummies = values[:, : self.scaled], values[:, self.scaled :]
+        if len(X):
+            self.minimum = np.minimum(self.minimum, scaled.min(axis=0))
+            self.maximum = np.maximum(self.maximum, scaled.max(axis=0))
+        outside = ((scaled < self.lower) | (scaled > self.upper)).any(axis=0)
+        if outside.any():
+            ranges = {
+                col: (float(low), float(high))
+                for col, low, high, bad in zip(self.columns, self.lower, self.upper, outside)
+                if bad
+            }
+            self._fail(len(X), f"Scaled values outside their ranges {ranges}")
+        if ((dummies != 0) & (dummies != 1)).any():
+            self._fail(len(X), "Dummy values other than 0 and 1")
+
+        feature_hashes = _row_hashes(values)
+        self.features_hash = _combine(self.features_hash, feature_hashes)
+        self.rows_hash = _combine(self.rows_hash, _row_hashes(np.column_stack([values, labels])))
+        self.rows += len(X)
+
+    def finish(self) -> dict:
+        missing = [label for label in LABELS if not self.label_counts[label]]
+        if self.rows and missing:
+            raise ValueError(f"Label(s) {missing} never occur, the labels are not binary")
+        return {
+            "rows": self.rows,
+            "nulls": int(self.nulls.sum()),
+            "labels": {str(int(label)): int(n) for label, n in sorted(self.label_counts.items())},
+            "ranges": {
+                col: [float(low), float(high)]
+                for col, low, high in zip(self.columns, self.minimum, self.maximum)
+            },
+            "features_hash": f"{self.features_hash:016x}",
+            "rows_hash": f"{self.rows_hash:016x}",
+        }
+
+
+def validate(
+    features_path: Path,
+    labels_path: Path,
+    preprocessor,
+    dtypes: dict[str, str],
+    chunksize: int = 100_000,
+) -> dict:
+    """
+    Runs `FeatureValidator` over a feature and a label artifact in one streaming pass,
+    `chunksize` rows at a time, and returns its summary. Raises a ValueError on the first
+    failed check, without reading the rest of the files.
+    """
+    validator = FeatureValidator(preprocessor, dtypes)
+    with profile_stage("validate") as stage:
+        features = iter_artifact(features_path, chunksize)
+        labels = iter_artifact(labels_path, chunksize)
+        for X in features:
+            y = next(labels, None)
+            if y is None:
+                raise ValueError(f"{features_path} has more rows than {labels_path}")
+            validator.check(X, y)
+        if next(labels, None) is not None:
+            raise ValueError(f"{labels_path} has more rows than {features_path}")
+        report = validator.finish()
+        stage.rows = report["rows"]
+
+    logger.success(
+        "Validated {} rows of {} and {}: labels {}, content hash {}",
+        report["rows"],
+        features_path,
+        labels_path,
+        report["labels"],
+        report["rows_hash"],
+    )
+    return report
+
+
+@app.command()
+def main(
+    features_path: Path = features_path_default,
+    labels_path: Path = labels_path_default,
+    preprocessor_path: Path = preprocessor_path_default,
+    chunksize: int = 100_000,
+    output: Path | None = None,
+):
+    """
+    Validates processed features and labels in one streaming pass and exits non-zero at
+    the first failed check. `--output` saves the summary, including the row order
+    independent content hashes, as JSON.
+    """
+    import joblib
+
+    from itu_sdse_project.features import feature_dtypes
+
+    preprocessor = joblib.load(preprocessor_path)
+    try:
+        report = validate(
+            features_path, labels_path, preprocessor, feature_dtypes(features_path), chunksize
+        )
+    except ValueError as e:
+        logger.error("Validation of {} failed: {}", features_path, e)
+        raise typer.Exit(code=1)
+    if output is not None:
+        output.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,62 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression
+
+from itu_sdse_project.modeling.artifacts import background_logger, load_model, save_model
+
+
+def test_models_load_the_same_from_every_format(tmp_path):
+    X = pd.read_csv("tests/data/X.csv")
+    y = pd.read_csv("tests/data/y.csv").iloc[:, 0]
+    # Wide enough that compression has something to save
+    X = pd.concat([X] * 50, axis=1, ignore_index=True)
+    model = LogisticRegression(max_iter=1000).fit(X, y)
+
+    save_model(model, tmp_path / "mmap.pkl", fmt="mmap")
+    save_model(model, tmp_path / "compressed.pkl", fmt="compressed")
+    assert (tmp_path / "compressed.pkl").stat().st_size < (tmp_path / "mmap.pkl").stat().st_size
+
+    mapped = load_model(tmp_path / "mmap.pkl")
+    assert isinstance(mapped.coef_, np.memmap)
+    assert not isinstance(load_model(tmp_path / "compressed.pkl").coef_, np.memmap)
+    for path in ["mmap.pkl", "compressed.pkl"]:
+        assert np.array_equal(load_model(tmp_path / path).predict_proba(X), model.predict_proba(X))
+
+    with pytest.raises(ValueError, match="Unknown model format"):
+        save_model(model, tmp_path / "model.pkl", fmt="lzma")
+
+
+def test_overwriting_a_model_keeps_mapped_readers_intact(tmp_path):
+    path = tmp_path / "model.pkl"
+    save_model({"weights": np.arange(100_000, dtype="float64")}, path, fmt="mmap")
+    mapped = load_model(path)
+
+    save_model({"weights": np.zeros(10)}, path, fmt="mmap")
+    # The old file was replaced, not truncated, so its pages are still there
+    assert np.array_equal(mapped["weights"], np.arange(100_000))
+    assert len(load_model(path)["weights"]) == 10
+    assert [p.name for p in tmp_path.iterdir()] == ["model.pkl"]
+
+
+def test_queued_jobs_read_the_model_they_were_submitted_for(tmp_path):
+    path = tmp_path / "model.pkl"
+    save_model([1], path)
+    background = background_logger()
+
+    def log(path):
+        time.sleep(0.2)
+        return load_model(path)
+
+    first = background.submit(log, path, paths=[path])
+    # Waits for the job reading the file before overwriting it
+    save_model([2], path)
+    assert first.result() == [1]
+
+    background.submit(log, tmp_path / "missing.pkl")
+    with pytest.raises(FileNotFoundError):
+        background.flush()
+    # Reported once
+    background.flush()
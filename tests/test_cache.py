@@ -0,0 +1,44 @@
+import os
+
+from scipy.stats import uniform
+
+from itu_sdse_project.cache import StageCache, fingerprint, run_stage
+
+
+def test_fingerprint_tracks_content_not_path_or_key_order(tmp_path):
+    first, second = tmp_path / "a.csv", tmp_path / "b.csv"
+    first.write_text("x\n1\n")
+    second.write_text("x\n1\n")
+
+    assert fingerprint(first, {"a": 1, "b": uniform(0, 1)}) == fingerprint(
+        second, {"b": uniform(0, 1), "a": 1}
+    )
+    assert fingerprint(first, {"b": uniform(0, 1)}) != fingerprint(first, {"b": uniform(0, 2)})
+
+    second.write_text("x\n22\n")
+    assert fingerprint(first) != fingerprint(second)
+
+
+def test_run_stage_skips_unchanged_inputs_and_evicts_oldest(tmp_path):
+    cache = StageCache(tmp_path / "cache", max_bytes=50)
+    source, output = tmp_path / "source.txt", tmp_path / "output.txt"
+    calls = []
+
+    def run():
+        calls.append(source.read_text())
+        output.write_text(source.read_text().upper())
+
+    source.write_text("first")
+    first_key = run_stage("stage", [source], [output], run, cache=cache)
+    output.unlink()
+    run_stage("stage", [source], [output], run, cache=cache)
+    assert calls == ["first"]
+    assert output.read_text() == "FIRST"
+
+    # Backdate the first entry so the second is the most recently used
+    os.utime(tmp_path / "cache" / "stage" / first_key, (0, 0))
+    source.write_text("second")
+    second_key = run_stage("stage", [source], [output], run, cache=cache)
+    assert calls == ["first", "second"]
+    assert not (tmp_path / "cache" / "stage" / first_key).exists()
+    assert (tmp_path / "cache" / "stage" / second_key).exists()
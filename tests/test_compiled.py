@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+from sklearn.tree import DecisionTreeClassifier
+import xgboost as xgb
+from xgboost import XGBClassifier, XGBRFClassifier
+
+from itu_sdse_project.helpers import load_data
+from itu_sdse_project.modeling.compiled import CompiledScorer, compile_model, load_scorer
+
+
+@pytest.mark.parametrize(
+    "model",
+    [
+        LogisticRegression(max_iter=1000),
+        XGBRFClassifier(random_state=42, max_depth=6, subsample=0.5),
+        XGBClassifier(random_state=42, n_estimators=30),
+    ],
+    ids=["log_reg", "xgboost_rf", "xgboost"],
+)
+def test_compiled_scorer_matches_model(tmp_path, model):
+    X_train, X_test, y_train, _ = load_data()
+    model.fit(X_train, y_train.iloc[:, 0])
+
+    compile_model(model).save(tmp_path / "scorer.npz")
+    scorer = load_scorer(tmp_path / "scorer.npz")
+
+    expected = model.predict_proba(X_test)
+    # Columns are matched by name, not position
+    assert np.allclose(scorer.predict_proba(X_test[X_test.columns[::-1]]), expected, atol=1e-6)
+
+
+def test_compiled_trees_follow_default_direction_of_missing_values():
+    X_train, X_test, y_train, _ = load_data(dtype="float32")
+    rng = np.random.default_rng(0)
+    X_train = X_train.mask(rng.random(X_train.shape) < 0.2)
+    X_test = X_test.mask(rng.random(X_test.shape) < 0.2)
+    model = XGBRFClassifier(random_state=42, max_depth=5).fit(X_train, y_train.iloc[:, 0])
+
+    expected = model.get_booster().predict(xgb.DMatrix(X_test), output_margin=True)
+    assert np.array_equal(compile_model(model).margin(X_test), expected)
+
+
+def test_unsupported_models_are_rejected():
+    X_train, _, y_train, _ = load_data()
+    model = DecisionTreeClassifier().fit(X_train, y_train.iloc[:, 0])
+
+    with pytest.raises(ValueError, match="DecisionTreeClassifier"):
+        compile_model(model)
+
+
+def test_incomplete_scorers_cannot_be_created():
+    class NoProba(CompiledScorer):
+        def _arrays(self):
+            return {}
+
+    with pytest.raises(TypeError, match="positive_proba"):
+        NoProba(None)
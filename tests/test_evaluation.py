@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from sklearn.metrics import average_precision_score, f1_score, precision_recall_curve
+
+from itu_sdse_project.modeling.evaluation import (
+    CURVE_POINTS,
+    evaluate,
+    summarize,
+    threshold_curves,
+)
+
+
+@pytest.fixture
+def holdout():
+    rng = np.random.default_rng(0)
+    y = rng.integers(0, 2, 20_000)
+    # Rounded, so many rows share a score like the leaves of a forest do
+    scores = np.round(rng.random(len(y)) * 0.6 + y * 0.3, 3).astype("float32")
+    return y, scores
+
+
+def test_metrics_match_scikit_learn(holdout):
+    y, scores = holdout
+    metrics, curve = evaluate(y, scores)
+
+    assert metrics["f1_score"] == pytest.approx(f1_score(y, scores > 0.5))
+    assert metrics["pr_auc"] == pytest.approx(average_precision_score(y, scores))
+
+    precision, recall, thresholds = precision_recall_curve(y, scores)
+    curves = threshold_curves(y, scores)
+    assert np.array_equal(curves["thresholds"][::-1], thresholds)
+    assert np.allclose(curves["precision"][::-1], precision[:-1])
+    assert np.allclose(curves["recall"][::-1], recall[:-1])
+
+    best = np.argmax(curves["f1"])
+    assert metrics["best_f1_score"] == pytest.approx(f1_score(y, scores >= thresholds[::-1][best]))
+    assert metrics["best_f1_score"] >= metrics["f1_score"]
+    assert len(curve["thresholds"]) == min(CURVE_POINTS, len(thresholds))
+
+
+def test_lift_splits_ties_at_the_cut():
+    y = np.array([1, 1, 0, 1, 0, 0, 0, 0, 0, 0] * 10)
+    # The top 10% cut goes through the middle of the 20 rows scored 0.9
+    scores = np.where(np.arange(len(y)) < 20, 0.9, 0.1)
+    metrics = summarize(threshold_curves(y, scores))
+    # 6 of the 20 tied rows are positive, so half of them bring in 3, against 3 on average
+    assert metrics["lift_top_10pct"] == pytest.approx(1.0)
+    assert metrics["lift_top_1pct"] == pytest.approx(1.0)
+
+    order = np.argsort(-np.arange(len(y)))
+    assert summarize(threshold_curves(y[order], scores[order])) == metrics
+
+
+def test_degenerate_holdouts():
+    metrics, curve = evaluate(np.zeros(5), np.full(5, 0.7))
+    assert metrics["f1_score"] == metrics["pr_auc"] == metrics["lift_top_10pct"] == 0.0
+    assert curve["thresholds"] == [pytest.approx(0.7)]
+
+    with pytest.raises(ValueError, match="5 labels but 4 scores"):
+        evaluate(np.zeros(5), np.zeros(4))
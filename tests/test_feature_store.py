@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from itu_sdse_project.feature_store import FeatureStore
+from itu_sdse_project.helpers import write_artifact
+
+
+@pytest.fixture
+def features():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "purchases": rng.random(1_000).astype("float32"),
+            "source_signup": rng.integers(0, 2, 1_000).astype("uint8"),
+        }
+    )
+
+
+def test_lookups_return_the_newest_row_of_each_lead(tmp_path, features):
+    store = FeatureStore(tmp_path, max_segments=3)
+    store.append(np.arange(1_000), features)
+    # Leads 900-999 change, 1000-1099 are new
+    updated = features.iloc[:200] + 1
+    store.append(np.arange(900, 1_100), updated)
+
+    assert len(store) == 1_100
+    assert store.dtype == "float32"
+    assert np.array_equal(store.get(5), features.iloc[5].to_numpy())
+    assert np.array_equal(store.get(950), updated.iloc[50].to_numpy())
+
+    found = store.lookup([1_099, 3, 900])
+    assert found.index.tolist() == [1_099, 3, 900]
+    expected = pd.concat([updated.iloc[[199]], features.iloc[[3]], updated.iloc[[0]]])
+    assert np.array_equal(found.to_numpy(), expected.to_numpy())
+    with pytest.raises(KeyError, match=r"2 leads are not in the feature store .* \[5000, -1\]"):
+        store.lookup([5_000, 3, -1])
+    with pytest.raises(KeyError):
+        store.get(5_000)
+
+
+def test_appends_are_compacted_and_seen_by_open_readers(tmp_path, features):
+    writer = FeatureStore(tmp_path, max_segments=3)
+    writer.append(np.arange(100), features.iloc[:100])
+    reader = FeatureStore(tmp_path)
+    expected = reader.lookup(np.arange(100))
+
+    for i in range(3):
+        writer.append([i], features.iloc[[500 + i]])
+    # The fourth segment went over max_segments, so everything was rewritten into one
+    assert writer.segments == 1
+    assert sorted(path.name for path in tmp_path.glob("*.npy")) == [
+        "000004.features.npy",
+        "000004.ids.npy",
+    ]
+    assert len(reader) == 100
+    assert np.array_equal(reader.lookup([0, 1, 2]), features.iloc[500:503])
+    assert np.array_equal(reader.lookup(np.arange(3, 100)), expected.iloc[3:])
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet"])
+def test_sync_builds_the_store_from_artifacts_once(tmp_path, features, suffix):
+    features_path = tmp_path / f"features{suffix}"
+    ids_path = tmp_path / f"cleaned{suffix}"
+    write_artifact(features, features_path)
+    write_artifact(pd.DataFrame({"lead_id": np.arange(1_000)[::-1], "other": 0}), ids_path)
+
+    store = FeatureStore(tmp_path / "store")
+    assert store.sync(features_path, ids_path, chunksize=300)
+    assert not store.sync(features_path, ids_path, chunksize=300)
+    assert np.allclose(store.lookup([999, 0]), features.iloc[[0, 999]])
+    assert store.columns == list(features.columns)
+
+
+def test_sync_rejects_features_and_ids_of_different_lengths(tmp_path, features):
+    features_path = tmp_path / "features.csv"
+    ids_path = tmp_path / "cleaned.csv"
+    write_artifact(features, features_path)
+    write_artifact(pd.DataFrame({"lead_id": np.arange(1_000)}), ids_path)
+    store = FeatureStore(tmp_path / "store")
+    store.sync(features_path, ids_path, chunksize=300)
+    files = sorted((tmp_path / "store").iterdir())
+
+    # One more row in the last chunk, and one more chunk
+    for extra in (100, 200):
+        longer = pd.concat([features, features.iloc[:extra]], ignore_index=True)
+        write_artifact(longer, features_path)
+        with pytest.raises(ValueError, match="different numbers of rows"):
+            store.sync(features_path, ids_path, chunksize=300)
+        # The half-written segment is gone and the store still serves the old one
+        assert sorted((tmp_path / "store").iterdir()) == files
+        assert np.allclose(store.lookup([5]), features.iloc[[5]])
@@ -0,0 +1,49 @@
+import mlflow
+import pytest
+
+from itu_sdse_project.modeling.leaderboard import Leaderboard
+
+
+@pytest.fixture
+def tracking(tmp_path):
+    previous = mlflow.get_tracking_uri()
+    mlflow.set_tracking_uri(f"sqlite:///{tmp_path / 'mlflow.db'}")
+    mlflow.set_experiment("leaderboard")
+    yield
+    mlflow.set_tracking_uri(previous)
+
+
+def _log_run(family: str, f1: float, data_version: str) -> str:
+    with mlflow.start_run(run_name=f"{family}_20250101_000000") as run:
+        mlflow.log_metric("f1_score", f1)
+        mlflow.log_param("data_version", data_version)
+        mlflow.initialize_logged_model(name=f"{family}_model", source_run_id=run.info.run_id)
+    return run.info.run_id
+
+
+def test_leaderboard_syncs_incrementally_and_rebuilds(tracking, tmp_path):
+    best_xgb = _log_run("xgboost", 0.8, "0000-a")
+    best_lr = _log_run("log_reg", 0.7, "0000-a")
+    best_new_data = _log_run("log_reg", 0.6, "0000-b")
+
+    path = tmp_path / "leaderboard.db"
+    leaderboard = Leaderboard(path, "leaderboard")
+    assert leaderboard.sync() == 3
+    assert leaderboard.sync() == 0
+
+    best = leaderboard.best()
+    assert best["run_id"] == best_xgb
+    assert best["model_uri"] == f"runs:/{best_xgb}/xgboost_model"
+    assert best["metrics"] == {"f1_score": 0.8}
+    assert leaderboard.best(family="log_reg")["run_id"] == best_lr
+    assert leaderboard.best(data_version="0000-b")["run_id"] == best_new_data
+    assert leaderboard.best(family="xgboost", data_version="0000-b") is None
+
+    newest = _log_run("xgboost", 0.9, "0000-b")
+    assert leaderboard.sync() == 1
+    assert leaderboard.best()["run_id"] == newest
+
+    path.unlink()
+    rebuilt = Leaderboard(path, "leaderboard")
+    assert rebuilt.sync() == 4
+    assert rebuilt.best()["run_id"] == newest
@@ -0,0 +1,37 @@
+import runpy
+
+import numpy as np
+import pandas as pd
+
+from itu_sdse_project.preprocessing import DROPPED_COLS
+
+make_dataset = runpy.run_path("data/interim/make_dataset.py")
+
+
+def _write_raw_data(path):
+    data = pd.read_csv("tests/data/training_data.csv").drop("bin_source", axis=1)
+    for col in DROPPED_COLS:
+        data[col] = 0
+
+    rng = np.random.default_rng(0)
+    data.loc[rng.random(len(data)) < 0.1, "source"] = "organic"
+    data.loc[rng.random(len(data)) < 0.05, "lead_indicator"] = np.nan
+    data.loc[rng.random(len(data)) < 0.05, "time_spent"] = np.nan
+    data.loc[rng.random(len(data)) < 0.05, "customer_code"] = np.nan
+    data.to_csv(path, index=False)
+
+
+def test_streaming_clean_matches_in_memory_clean(tmp_path):
+    raw_path = tmp_path / "raw_data.csv"
+    _write_raw_data(raw_path)
+
+    make_dataset["clean"](raw_path, tmp_path / "in_memory.csv")
+    make_dataset["clean_streaming"](raw_path, tmp_path / "single.csv", chunksize=10**6)
+    make_dataset["clean_streaming"](raw_path, tmp_path / "chunked.csv", chunksize=500)
+
+    expected = (tmp_path / "in_memory.csv").read_bytes()
+    assert (tmp_path / "single.csv").read_bytes() == expected
+
+    pd.testing.assert_frame_equal(
+        pd.read_csv(tmp_path / "chunked.csv"), pd.read_csv(tmp_path / "in_memory.csv")
+    )
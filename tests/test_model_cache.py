@@ -0,0 +1,70 @@
+import mlflow
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression
+
+from itu_sdse_project.modeling.artifacts import save_model
+from itu_sdse_project.modeling.model_cache import ModelCache
+from itu_sdse_project.modeling.serve import MicroBatcher, ModelRefresher
+from itu_sdse_project.modeling.wrapper import MLFlowWrapper, feature_schema
+
+
+@pytest.fixture
+def registry(tmp_path):
+    """A model registry of its own, with two versions of "model" fitted with different C."""
+    tracking_uri = mlflow.get_tracking_uri()
+    mlflow.set_tracking_uri(f"sqlite:///{tmp_path / 'mlflow.db'}")
+    X = pd.read_csv("tests/data/X.csv")
+    y = pd.read_csv("tests/data/y.csv").iloc[:, 0]
+
+    models = []
+    for C in [0.01, 100]:
+        model = LogisticRegression(C=C, max_iter=1000).fit(X, y)
+        path = tmp_path / f"model_{C}.pkl"
+        save_model(model, path)
+        with mlflow.start_run(experiment_id="0"):
+            info = mlflow.pyfunc.log_model(
+                name="model",
+                python_model=MLFlowWrapper(None, schema=feature_schema(X)),
+                artifacts={"model": str(path)},
+            )
+        mlflow.register_model(info.model_uri, "model")
+        models.append(model)
+    client = mlflow.MlflowClient()
+    client.set_registered_model_alias("model", "staging", "1")
+    try:
+        yield client, X, models
+    finally:
+        mlflow.set_tracking_uri(tracking_uri)
+
+
+def test_alias_moves_are_swapped_in_from_the_cache(registry, tmp_path, monkeypatch):
+    client, X, models = registry
+    downloads = []
+    download_artifacts = mlflow.artifacts.download_artifacts
+    monkeypatch.setattr(
+        mlflow.artifacts,
+        "download_artifacts",
+        lambda *args, **kwargs: downloads.append(args) or download_artifacts(*args, **kwargs),
+    )
+    cache = ModelCache(root=tmp_path / "cache", max_bytes=1, max_loaded=1)
+
+    model, key = cache.get("staging")
+    assert cache.get("staging") == (model, key)
+    assert len(downloads) == 1
+    batcher = MicroBatcher(model, max_wait_ms=1, version=key)
+    refresher = ModelRefresher(batcher, cache, "staging", interval=60)
+    assert not refresher.refresh()
+
+    client.set_registered_model_alias("model", "staging", "2")
+    assert refresher.refresh()
+    assert batcher.version.startswith("2-")
+    scores = batcher.submit(X.head(10)).result(timeout=5)
+    assert np.allclose(scores, models[1].predict_proba(X.head(10))[:, 1])
+
+    # Only the version in use is kept, on disk and in memory
+    assert [entry.name for entry in (tmp_path / "cache" / "model").iterdir()] == [batcher.version]
+    client.set_registered_model_alias("model", "staging", "1")
+    assert refresher.refresh()
+    assert len(downloads) == 3
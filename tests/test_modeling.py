@@ -46,6 +46,34 @@ def test_training_and_mlflow_logging(model_name):
         pytest.fail(f"MLFlow validation failed after training {model_name}. Error: {e}")
 
 
+@pytest.mark.parametrize("model_name", ["log-reg", "xgboost"])
+def test_halving_search_logs_like_random_search(model_name):
+    """
+    Ensures the successive halving search mode logs the same run contents as the default.
+    """
+    command = [
+        "python",
+        "itu_sdse_project/modeling/train.py",
+        model_name,
+        "--search",
+        "halving",
+        "--force",
+    ]
+    result = subprocess.run(command, capture_output=True, text=True)
+    assert result.returncode == 0, f"Halving search for {model_name} failed: {result.stderr}"
+
+    client = MlflowClient()
+    experiment = client.get_experiment_by_name(EXPERIMENT_NAME)
+    latest_run = client.search_runs(
+        experiment_ids=[experiment.experiment_id],
+        order_by=["start_time DESC"],
+        max_results=1
+    )[0]
+
+    assert {"f1_score", "pr_auc", "best_threshold"} <= set(latest_run.data.metrics)
+    assert latest_run.data.params["search"] == "halving"
+
+
 def test_model_selection_and_registration():
     """
     Verifies 'selection.py' chooses the model with the highest f1-score
@@ -0,0 +1,57 @@
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression
+
+from itu_sdse_project.feature_store import FeatureStore
+from itu_sdse_project.modeling import predict
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_batch_scoring_keeps_input_order(tmp_path, workers):
+    X = pd.read_csv("tests/data/X.csv")
+    y = pd.read_csv("tests/data/y.csv").iloc[:, 0]
+    model = LogisticRegression().fit(X, y)
+
+    features_path = tmp_path / "features.csv"
+    model_path = tmp_path / "model.pkl"
+    output_path = tmp_path / "predictions.parquet"
+    X.to_csv(features_path, index=False)
+    joblib.dump(model, model_path)
+
+    predict.batch(
+        features_path=features_path,
+        model_path=model_path,
+        output_path=output_path,
+        chunksize=250,
+        workers=workers,
+    )
+
+    scores = pd.read_parquet(output_path)["probability"].to_numpy()
+    assert np.allclose(scores, model.predict_proba(X)[:, 1])
+
+
+def test_leads_are_scored_from_the_feature_store(tmp_path):
+    X = pd.read_csv("tests/data/X.csv")
+    y = pd.read_csv("tests/data/y.csv").iloc[:, 0]
+    model = LogisticRegression().fit(X, y)
+    joblib.dump(model, tmp_path / "model.pkl")
+
+    lead_ids = np.arange(len(X)) * 7
+    FeatureStore(tmp_path / "store").append(lead_ids, X)
+    wanted = pd.DataFrame({"lead_id": lead_ids[::-3]})
+    wanted.to_csv(tmp_path / "leads.csv", index=False)
+
+    predict.leads(
+        tmp_path / "leads.csv",
+        model_path=tmp_path / "model.pkl",
+        output_path=tmp_path / "predictions.csv",
+        feature_store=tmp_path / "store",
+        chunksize=100,
+    )
+
+    predictions = pd.read_csv(tmp_path / "predictions.csv")
+    assert predictions["lead_id"].tolist() == wanted["lead_id"].tolist()
+    expected = model.predict_proba(X.iloc[::-3])[:, 1]
+    assert np.allclose(predictions["probability"], expected)
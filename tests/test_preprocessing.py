@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import f1_score
+
+from itu_sdse_project.preprocessing import (
+    DROPPED_COLS,
+    LABEL_COL,
+    LeadPreprocessor,
+    filter_rows,
+    split_columns,
+)
+
+
+def _raw_data():
+    data = pd.read_csv("tests/data/training_data.csv").drop("bin_source", axis=1)
+    for col in DROPPED_COLS:
+        data[col] = 0
+    data.loc[::7, "time_spent"] = np.nan
+    data.loc[::11, "customer_code"] = np.nan
+    return data
+
+
+def test_preprocessor_transforms_raw_rows_like_training_pipeline():
+    raw = _raw_data()
+    training_rows = filter_rows(raw)
+
+    preprocessor = LeadPreprocessor.from_data(training_rows)
+    cleaned = preprocessor.clean(training_rows)
+    preprocessor.fit_encoding(cleaned)
+
+    expected_columns = list(pd.read_csv("tests/data/X.csv", nrows=0).columns)
+    assert preprocessor.feature_names == expected_columns
+
+    expected = preprocessor.encode(cleaned)
+    features = preprocessor.transform(raw.drop(LABEL_COL, axis=1))
+
+    assert features.equals(expected)
+    assert features.notna().all().all()
+
+
+def test_preprocessor_maps_unseen_levels_to_baseline():
+    raw = _raw_data()
+    preprocessor = LeadPreprocessor.from_data(filter_rows(raw))
+    preprocessor.fit_encoding(preprocessor.clean(filter_rows(raw)))
+
+    record = raw.drop(LABEL_COL, axis=1).head(1).copy()
+    record["customer_group"] = 99
+    features = preprocessor.transform(record)
+
+    dummy_cols = [col for col in features if col.startswith("customer_group_")]
+    assert (features[dummy_cols] == 0).all().all()
+
+
+def test_compact_and_sparse_encodings_match_dense():
+    raw = _raw_data()
+    preprocessor = LeadPreprocessor.from_data(filter_rows(raw))
+    cleaned = preprocessor.clean(filter_rows(raw))
+    preprocessor.fit_encoding(cleaned)
+
+    dense = preprocessor.encode(cleaned)
+    compact = preprocessor.encode(cleaned, dummy_dtype="uint8")
+    sparse = preprocessor.encode_sparse(cleaned)
+
+    assert list(compact.columns) == list(dense.columns)
+    assert (compact[list(preprocessor.dummies)].dtypes == "uint8").all()
+    assert compact.astype("float64").equals(dense)
+    assert np.array_equal(sparse.toarray(), dense.to_numpy())
+
+
+def test_prepared_rows_follow_the_dtype_plan():
+    raw = _raw_data()
+    training_rows = filter_rows(raw)
+    preprocessor = LeadPreprocessor.from_data(training_rows)
+    cleaned = preprocessor.clean(training_rows)
+
+    assert cleaned["lead_id"].dtype == "uint32"
+    assert cleaned["date_part"].dtype.kind == "M"
+    for col in ["lead_indicator", "customer_group", "onboarding", "source"]:
+        assert isinstance(cleaned[col].dtype, pd.CategoricalDtype), col
+    # Planned columns are never mistaken for continuous ones, whatever their dtype
+    assert split_columns(training_rows)[0] == ["purchases", "time_spent", "n_visits"]
+
+    # The vocabulary ignores category order and categories no row has
+    shuffled = cleaned.assign(
+        customer_group=cleaned["customer_group"]
+        .cat.add_categories([99])
+        .cat.reorder_categories([99, *cleaned["customer_group"].cat.categories[::-1]])
+    )
+    assert preprocessor.fit_encoding(shuffled).feature_names == list(
+        pd.read_csv("tests/data/X.csv", nrows=0).columns
+    )
+
+
+def test_compact_features_train_the_same_model():
+    raw = _raw_data()
+    preprocessor = LeadPreprocessor.from_data(filter_rows(raw))
+    cleaned = preprocessor.clean(filter_rows(raw))
+    preprocessor.fit_encoding(cleaned)
+    y = cleaned[LABEL_COL].astype("uint8")
+
+    scores = []
+    for dtypes in [{}, {"numeric_dtype": "float32", "dummy_dtype": "uint8"}]:
+        # Logistic regression trains on float64, see `train.log_reg`
+        X = preprocessor.encode(cleaned, **dtypes).astype("float64")
+        model = LogisticRegression(max_iter=1000).fit(X[:2000], y[:2000])
+        scores.append(f1_score(y[2000:], model.predict(X[2000:])))
+    assert scores[0] == scores[1]
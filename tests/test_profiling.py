@@ -0,0 +1,72 @@
+import json
+import time
+
+import mlflow
+import numpy as np
+
+from itu_sdse_project import profiling
+
+
+def _read_trace(path):
+    # The trace is an unterminated JSON array, as chrome://tracing and Perfetto accept
+    return json.loads(path.read_text().rstrip().rstrip(",") + "]")
+
+
+def _busy_loop(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_stages_are_traced_and_logged_to_active_run(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_TRACE", True)
+    monkeypatch.setattr(profiling, "TRACE_PATH", tmp_path / "trace.json")
+
+    with profiling.profile_stage("outside_run", rows=100):
+        pass
+
+    previous = mlflow.get_tracking_uri()
+    mlflow.set_tracking_uri(f"sqlite:///{tmp_path / 'mlflow.db'}")
+    mlflow.set_experiment("profiling")
+    try:
+        with mlflow.start_run() as run, profiling.profile_stage("inside_run") as stage:
+            stage.rows = 50
+            stage.record_memory("buffer", np.zeros(1024**2 // 8))
+        metrics = mlflow.get_run(run.info.run_id).data.metrics
+    finally:
+        mlflow.set_tracking_uri(previous)
+
+    events = _read_trace(tmp_path / "trace.json")
+    assert [event["name"] for event in events] == ["outside_run", "inside_run"]
+    assert events[0]["ph"] == "X"
+    assert events[0]["args"]["rows"] == 100
+    assert metrics["inside_run/rows"] == 50
+    assert metrics["inside_run/buffer_mb"] == 1.0
+    assert {"inside_run/wall_seconds", "inside_run/cpu_seconds"} <= set(metrics)
+
+
+def test_sampling_profiler_writes_folded_stacks(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "TRACE_PATH", tmp_path / "trace.json")
+    monkeypatch.setattr(profiling, "PROFILE_STAGES", True)
+    monkeypatch.setattr(profiling, "PROFILE_DIR", tmp_path / "profiles")
+
+    with profiling.profile_stage("busy"):
+        _busy_loop(0.2)
+
+    (folded,) = (tmp_path / "profiles").glob("busy-*.folded")
+    samples = {}
+    for line in folded.read_text().splitlines():
+        stack, count = line.rsplit(" ", 1)
+        samples[stack] = int(count)
+    assert sum(samples.values()) > 5
+    assert any(stack.split(";")[-1].startswith("_busy_loop") for stack in samples)
+
+
+def test_trace_is_opt_in(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_TRACE", False)
+    monkeypatch.setattr(profiling, "TRACE_PATH", tmp_path / "trace.json")
+
+    with profiling.profile_stage("untraced", rows=10):
+        pass
+
+    assert not (tmp_path / "trace.json").exists()
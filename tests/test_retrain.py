@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split
+from xgboost import XGBRFClassifier
+
+from itu_sdse_project import helpers
+from itu_sdse_project.feature_store import FeatureStore
+from itu_sdse_project.helpers import artifact_path, read_artifact, write_artifact
+from itu_sdse_project.modeling import retrain
+from itu_sdse_project.preprocessing import LABEL_COL, LeadPreprocessor, filter_rows
+from itu_sdse_project.synthetic import generate
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet"])
+def test_new_leads_are_appended_with_frozen_statistics(tmp_path, monkeypatch, suffix):
+    for name in ["cleaned", "features", "labels"]:
+        monkeypatch.setattr(retrain, f"{name}_path", tmp_path / f"{name}{suffix}")
+    monkeypatch.setattr(retrain, "feature_store_dir", tmp_path / "feature_store")
+    raw_path = tmp_path / "raw_data.csv"
+    generate(3_000, raw_path, chunksize=1_000)
+
+    # The store as the last full run left it, before the last 500 leads arrived
+    known = filter_rows(pd.read_csv(raw_path, nrows=2_500))
+    preprocessor = LeadPreprocessor.from_data(known)
+    cleaned = preprocessor.clean(known)
+    preprocessor.fit_encoding(cleaned)
+    write_artifact(cleaned, retrain.cleaned_path)
+    write_artifact(preprocessor.encode(cleaned), retrain.features_path)
+    write_artifact(cleaned[LABEL_COL].astype("float64"), retrain.labels_path)
+    store = FeatureStore(retrain.feature_store_dir)
+    store.sync(retrain.features_path, retrain.cleaned_path)
+
+    leads = retrain.find_new_leads(raw_path, retrain.cleaned_path, chunksize=700)
+    assert (leads["lead_id"] >= 2_500).all()
+    assert len(leads) == len(filter_rows(pd.read_csv(raw_path, skiprows=range(1, 2_501))))
+
+    first_new_row = retrain.append_leads(leads, preprocessor)
+    features = read_artifact(retrain.features_path)
+    expected = preprocessor.encode(preprocessor.clean(leads))
+    assert first_new_row == len(cleaned)
+    assert np.allclose(features.iloc[first_new_row:].to_numpy(), expected.to_numpy())
+    assert len(read_artifact(retrain.labels_path)) == len(features)
+    assert retrain.find_new_leads(raw_path, retrain.cleaned_path).empty
+
+    # The new leads went into the store as a segment of their own, which is still in sync
+    assert store.segments == 2
+    assert np.allclose(store.lookup(leads["lead_id"]).to_numpy(), expected.to_numpy())
+    assert not store.sync(retrain.features_path, retrain.cleaned_path)
+
+
+def test_update_split_keeps_parent_training_rows_out_of_test(tmp_path, monkeypatch):
+    monkeypatch.setattr(helpers, "INTERIM_DATA_DIR", tmp_path)
+    monkeypatch.setattr(helpers, "PROCESSED_DATA_DIR", tmp_path)
+    monkeypatch.setattr(retrain, "cleaned_path", artifact_path(tmp_path, "cleaned_data"))
+    monkeypatch.setattr(retrain, "features_path", artifact_path(tmp_path, "features"))
+    monkeypatch.setattr(retrain, "labels_path", artifact_path(tmp_path, "labels"))
+    monkeypatch.setattr(retrain, "feature_store_dir", tmp_path / "feature_store")
+    raw_path = tmp_path / "raw_data.csv"
+    generate(8_000, raw_path)
+
+    known = filter_rows(pd.read_csv(raw_path, nrows=4_000))
+    preprocessor = LeadPreprocessor.from_data(known)
+    cleaned = preprocessor.clean(known)
+    preprocessor.fit_encoding(cleaned)
+    write_artifact(cleaned, retrain.cleaned_path)
+    write_artifact(preprocessor.encode(cleaned), retrain.features_path)
+    write_artifact(cleaned[LABEL_COL].astype("float64"), retrain.labels_path)
+    # The full run splits stratified on the label, exactly as before
+    full_train, full_test, _, _ = helpers.load_data()
+    split_rows = len(full_train) + len(full_test)
+    y = read_artifact(retrain.labels_path)
+    expected = train_test_split(y, random_state=42, test_size=0.15, stratify=y)[1]
+    assert full_test.index.equals(expected.index)
+
+    # Two updates in a row, each splitting its new leads without moving older rows
+    parent_train, parent_test = full_train, full_test
+    for rows in (6_000, 8_000):
+        pd.read_csv(raw_path, nrows=rows).to_csv(tmp_path / "partial.csv", index=False)
+        leads = retrain.find_new_leads(tmp_path / "partial.csv", retrain.cleaned_path)
+        first_new_row = retrain.append_leads(leads, preprocessor)
+        X_train, X_test, y_train, y_test = helpers.load_data(stable_from=split_rows)
+
+        assert not X_test.index.isin(parent_train.index).any()
+        assert parent_test.index.isin(X_test.index).all()
+        assert (X_train.index >= first_new_row).any() and (X_test.index >= first_new_row).any()
+        assert X_train.index.equals(y_train.index) and X_test.index.equals(y_test.index)
+        parent_train, parent_test = X_train, X_test
+
+    # About 15% of each class of the new leads is held out
+    new_train = y_train[y_train.index >= split_rows].iloc[:, 0]
+    new_test = y_test[y_test.index >= split_rows].iloc[:, 0]
+    for label in (0, 1):
+        held_out = (new_test == label).sum()
+        assert held_out / (held_out + (new_train == label).sum()) == pytest.approx(0.15, abs=0.05)
+
+
+def test_updates_continue_from_the_parent_model():
+    X = pd.read_csv("tests/data/X.csv")
+    y = pd.read_csv("tests/data/y.csv").iloc[:, 0]
+    new_rows = np.arange(len(X)) >= 2_500
+
+    parent = XGBRFClassifier(n_estimators=10, max_depth=4, random_state=42)
+    parent.fit(X[~new_rows], y[~new_rows])
+    parent_scores = parent.predict_proba(X)
+    updated = retrain.update_model("xgboost", parent, X, y, new_rows)
+    assert updated.get_booster().num_boosted_rounds() == 2
+    # Boosting only adds trees, the parent's forest is the first round
+    assert np.array_equal(updated.predict_proba(X, iteration_range=(0, 1)), parent_scores)
+
+    parent = LogisticRegression(max_iter=1000).fit(X[~new_rows], y[~new_rows])
+    updated = retrain.update_model("log_reg", parent, X, y, new_rows)
+    refit = LogisticRegression(max_iter=1000).fit(X, y)
+    # Both stop within the solver's tolerance of the same optimum
+    assert np.allclose(updated.predict_proba(X), refit.predict_proba(X), atol=1e-2)
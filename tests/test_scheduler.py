@@ -0,0 +1,25 @@
+from itu_sdse_project.modeling.scheduler import share_budget, split_budget
+
+
+def test_split_budget_never_oversubscribes():
+    for cores in (1, 8, 64):
+        for n_fits in (3, 30, 100):
+            cv_jobs, threads = split_budget(cores, n_fits, max_estimator_threads=cores)
+            assert cv_jobs * threads <= cores
+            assert cv_jobs == min(cores, n_fits)
+
+    assert split_budget(64, 30, max_estimator_threads=64) == (30, 2)
+    assert split_budget(64, 30) == (30, 1)
+
+
+def test_share_budget_uses_all_cores_in_proportion():
+    assert share_budget(64, {"xgboost": 100, "log_reg": 30}) == {"xgboost": 50, "log_reg": 14}
+    assert share_budget(2, {"xgboost": 100, "log_reg": 30}) == {"xgboost": 1, "log_reg": 1}
+
+
+def test_share_budget_never_oversubscribes():
+    assert share_budget(1, {"xgboost": 100, "log_reg": 30}) is None
+    assert share_budget(3, {"a": 1, "b": 1, "c": 100}) == {"a": 1, "b": 1, "c": 1}
+    for cores in range(3, 70):
+        shares = share_budget(cores, {"a": 1, "b": 7, "c": 100})
+        assert sum(shares.values()) == cores and min(shares.values()) >= 1
@@ -0,0 +1,135 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from itu_sdse_project.feature_store import FeatureStore
+from itu_sdse_project.modeling.serve import MicroBatcher, ScoringServer, make_handler
+
+
+class SumModel:
+    def __init__(self):
+        self.calls = 0
+
+    def predict(self, context, model_input):
+        self.calls += 1
+        return model_input.sum(axis=1).to_numpy()
+
+
+def test_micro_batcher_groups_concurrent_requests():
+    model = SumModel()
+    batcher = MicroBatcher(model, max_batch_rows=1000, max_wait_ms=50)
+
+    futures = [batcher.submit(pd.DataFrame({"a": [i], "b": [i]})) for i in range(20)]
+    scores = [future.result(timeout=5)[0] for future in futures]
+
+    assert scores == [2 * i for i in range(20)]
+    assert model.calls < 20
+    assert batcher.metrics.summary()["batches"] == model.calls
+
+
+class PickyModel(SumModel):
+    def predict(self, context, model_input):
+        if (model_input["a"] < 0).any():
+            raise ValueError("Negative purchases")
+        if (model_input["a"] > 100).any():
+            raise RuntimeError("Model exploded")
+        return super().predict(context, model_input)
+
+
+def test_bad_records_only_fail_their_own_request():
+    batcher = MicroBatcher(PickyModel(), max_batch_rows=1000, max_wait_ms=50)
+    futures = [batcher.submit(pd.DataFrame({"a": [a], "b": [1]})) for a in [1, -1, 2]]
+
+    assert futures[0].result(timeout=5).tolist() == [2]
+    with pytest.raises(ValueError, match="Negative"):
+        futures[1].result(timeout=5)
+    assert futures[2].result(timeout=5).tolist() == [3]
+
+
+def test_batcher_survives_a_failing_batch(monkeypatch):
+    batcher = MicroBatcher(SumModel(), max_wait_ms=1)
+    monkeypatch.setattr(batcher.metrics, "record_batch", lambda rows: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        batcher.submit(pd.DataFrame({"a": [1], "b": [1]})).result(timeout=5)
+
+    monkeypatch.undo()
+    assert batcher.submit(pd.DataFrame({"a": [1], "b": [1]})).result(timeout=5).tolist() == [2]
+
+
+def test_scoring_service_accepts_records_and_json_lines():
+    batcher = MicroBatcher(SumModel(), max_wait_ms=1)
+    server = ScoringServer(("127.0.0.1", 0), make_handler(batcher))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def post(body):
+        request = urllib.request.Request(f"{url}/predict", data=body.encode("utf-8"))
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())["probabilities"]
+
+    try:
+        with ThreadPoolExecutor(4) as executor:
+            single = list(executor.map(post, [json.dumps({"a": i, "b": 1}) for i in range(8)]))
+        batch = post('{"a": 1, "b": 2}\n{"a": 3, "b": 4}\n')
+        with urllib.request.urlopen(f"{url}/metrics") as response:
+            metrics = json.loads(response.read())
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert single == [[i + 1] for i in range(8)]
+    assert batch == [3, 7]
+    assert metrics["requests"] == 9
+
+
+def test_leads_are_scored_with_their_stored_features(tmp_path):
+    store = FeatureStore(tmp_path)
+    store.append([10, 20], pd.DataFrame({"a": [1.0, 2.0], "b": [3.0, 5.0]}))
+    batcher = MicroBatcher(SumModel(), max_wait_ms=1)
+    server = ScoringServer(("127.0.0.1", 0), make_handler(batcher, store))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/predict/leads"
+
+    def post(body):
+        with urllib.request.urlopen(urllib.request.Request(url, data=body.encode())) as response:
+            return json.loads(response.read())["probabilities"]
+
+    try:
+        scores = post('[{"lead_id": 20}, {"lead_id": 10}]')
+        with pytest.raises(urllib.error.HTTPError) as error:
+            post('{"lead_id": 30}')
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert np.allclose(scores, [7, 4])
+    assert error.value.code == 404
+
+
+def test_client_errors_are_400_and_model_errors_500():
+    batcher = MicroBatcher(PickyModel(), max_wait_ms=1)
+    server = ScoringServer(("127.0.0.1", 0), make_handler(batcher))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/predict"
+
+    def status(body):
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url, data=body.encode())):
+                return 200
+        except urllib.error.HTTPError as error:
+            return error.code
+
+    try:
+        codes = [status(body) for body in ['{"a": 1, "b": 1}', "{not json", '{"a": -1, "b": 1}']]
+        codes.append(status('{"a": 1000, "b": 1}'))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert codes == [200, 400, 400, 500]
@@ -0,0 +1,26 @@
+import pandas as pd
+
+from itu_sdse_project.preprocessing import filter_rows
+from itu_sdse_project.synthetic import RAW_COLUMNS, generate
+
+
+def test_generated_file_does_not_depend_on_workers(tmp_path):
+    generate(2_500, tmp_path / "serial.csv", chunksize=1_000)
+    generate(2_500, tmp_path / "parallel.csv", chunksize=1_000, workers=2)
+
+    assert (tmp_path / "serial.csv").read_bytes() == (tmp_path / "parallel.csv").read_bytes()
+
+
+def test_generated_data_matches_raw_schema(tmp_path):
+    generate(20_000, tmp_path / "raw_data.csv", chunksize=6_000)
+    raw = pd.read_csv(tmp_path / "raw_data.csv")
+
+    assert list(raw.columns) == RAW_COLUMNS
+    assert raw["lead_id"].tolist() == list(range(20_000))
+    assert 0.03 < raw["lead_indicator"].isna().mean() < 0.07
+    assert raw["customer_code"].isna().any()
+
+    signups = filter_rows(raw)
+    assert 0.2 < len(signups) / len(raw) < 0.3
+    assert 0.42 < signups["lead_indicator"].astype(float).mean() < 0.52
+    assert set(signups["customer_group"]) == set(range(1, 10))
@@ -0,0 +1,76 @@
+import time
+
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import RandomizedSearchCV
+
+from itu_sdse_project.config import RANDOM_STATE
+from itu_sdse_project.helpers import load_data
+from itu_sdse_project.modeling import trial_queue
+from itu_sdse_project.modeling.trial_queue import MAX_TRIAL_ATTEMPTS, QueueSearchCV, TrialQueue
+
+
+def test_queue_search_matches_randomized_search(tmp_path):
+    X_train, _, y_train, _ = load_data()
+    y_train = y_train.iloc[:, 0]
+    # lbfgs does not support l1, so some candidates fail like they do in scikit-learn
+    params = {"C": [100, 1.0, 0.01], "solver": ["lbfgs", "liblinear"], "penalty": ["l1", "l2"]}
+    model = LogisticRegression(max_iter=1000)
+
+    search = QueueSearchCV(model, params, n_iter=5, cv=3, n_jobs=2, directory=tmp_path)
+    search.fit(X_train, y_train)
+    expected = RandomizedSearchCV(model, params, n_iter=5, cv=3, random_state=RANDOM_STATE)
+    expected.fit(X_train, y_train)
+
+    assert search.cv_results_["params"] == expected.cv_results_["params"]
+    assert np.allclose(
+        search.cv_results_["mean_test_score"],
+        expected.cv_results_["mean_test_score"],
+        equal_nan=True,
+    )
+    assert search.best_params_ == expected.best_params_
+    assert list(search.best_estimator_.feature_names_in_) == list(X_train.columns)
+    # Finished searches leave neither trials nor training data behind
+    assert [path.name for path in tmp_path.iterdir()] == ["queue.db"]
+
+
+def test_trials_of_dead_workers_are_retried(tmp_path):
+    X_train, _, y_train, _ = load_data()
+    queue = TrialQueue(tmp_path)
+    folds = np.arange(len(y_train)) % 2
+    search_id = queue.publish(LogisticRegression(), [{"C": 1.0}], X_train, y_train, folds)
+
+    # A worker that dies stops renewing its lease, here one that lasts no time at all
+    first = queue.claim("dead", lease=0)
+    time.sleep(0.01)
+    retried = queue.claim("alive")
+    assert (retried["fold"], retried["attempts"]) == (first["fold"], 2)
+    queue.complete(retried, 0.5, fit_seconds=1.0)
+    # The dead worker's result no longer counts
+    queue.complete(first, 0.0, fit_seconds=1.0)
+
+    for _ in range(MAX_TRIAL_ATTEMPTS):
+        assert queue.claim("dead", lease=0)["fold"] != first["fold"]
+        time.sleep(0.01)
+    assert queue.claim("alive") is None
+
+    assert queue.progress(search_id) == {"done": 1, "failed": 1}
+    scores = {trial["fold"]: trial["score"] for trial in queue.results(search_id)}
+    assert scores == {first["fold"]: 0.5, 1 - first["fold"]: None}
+
+
+def crashing_worker(*args):
+    raise SystemExit(3)
+
+
+def test_search_fails_when_workers_keep_dying(tmp_path, monkeypatch):
+    X_train, _, y_train, _ = load_data()
+    # Spawned workers import this module and crash before claiming a trial
+    monkeypatch.setattr(trial_queue, "work", crashing_worker)
+    monkeypatch.setattr(trial_queue, "POLL_SECONDS", 0.01)
+
+    search = QueueSearchCV(LogisticRegression(), {"C": [1.0]}, n_iter=1, cv=2, directory=tmp_path)
+    with pytest.raises(RuntimeError, match=f"died {MAX_TRIAL_ATTEMPTS + 1} times"):
+        search.fit(X_train, y_train.iloc[:, 0])
+    assert [path.name for path in tmp_path.iterdir()] == ["queue.db"]
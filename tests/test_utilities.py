@@ -1,5 +1,8 @@
 import pytest
 import importlib
+import os
+import subprocess
+import sys
 import numpy as np
 from pathlib import Path
 import pandas as pd
@@ -13,6 +16,17 @@ EXPECTED_CONFIG_SCHEMA = {
     "DATA_VERSION": str,
     "EXPERIMENT_NAME": str,
     "MODEL_NAME": str,
+    "ARTIFACT_FORMAT": str,
+    "MODEL_FORMAT": str,
+    "TRAINING_CORES": int,
+    "FULL_REFIT_DAYS": int,
+    "STAGE_CACHE_MAX_BYTES": int,
+    "MODEL_CACHE_MAX_BYTES": int,
+    "MODEL_CACHE_MAX_LOADED": int,
+    "FEATURE_STORE_MAX_SEGMENTS": int,
+    "PROFILE_STAGES": bool,
+    "PROFILE_TRACE": bool,
+    "PROFILE_INTERVAL": float,
 
     # Paths
     "PROJ_ROOT": Path,
@@ -22,8 +36,15 @@ EXPECTED_CONFIG_SCHEMA = {
     "PROCESSED_DATA_DIR": Path,
     "EXTERNAL_DATA_DIR": Path,
     "MODELS_DIR": Path,
+    "LEADERBOARD_PATH": Path,
+    "STAGE_CACHE_DIR": Path,
+    "MODEL_CACHE_DIR": Path,
+    "FEATURE_STORE_DIR": Path,
+    "TRIAL_QUEUE_DIR": Path,
     "REPORTS_DIR": Path,
     "FIGURES_DIR": Path,
+    "TRACE_PATH": Path,
+    "PROFILE_DIR": Path,
 }
 
 
@@ -43,6 +64,31 @@ def test_config_schema_integrity():
 
 
 
+@pytest.mark.parametrize(
+    "module",
+    ["itu_sdse_project.config", "itu_sdse_project.features", "itu_sdse_project.modeling.predict"],
+)
+def test_entry_points_do_not_import_mlflow(module):
+    """
+    MLflow takes seconds to import, so only code that tracks or loads models may pull it in.
+    """
+    code = f"import sys, {module}; assert 'mlflow' not in sys.modules"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    assert result.returncode == 0, f"Importing {module} imported mlflow: {result.stderr}"
+
+
+def test_proj_root_can_be_overridden(tmp_path):
+    code = (
+        "from itu_sdse_project.config import MODELS_DIR, RAW_DATA_DIR; "
+        "print(RAW_DATA_DIR, MODELS_DIR)"
+    )
+    env = {**os.environ, "PROJ_ROOT": str(tmp_path)}
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True
+    )
+    assert result.stdout.split() == [str(tmp_path / "data" / "raw"), str(tmp_path / "models")]
+
+
 def test_create_dummy_cols_basic():
     df = pd.DataFrame({
         'ID': [1, 2, 3],
@@ -70,4 +116,84 @@ def test_impute_missing_values_numeric_mean():
 
     imputed_series = helpers.impute_missing_values(series, method="mean")
 
-    assert imputed_series.equals(expected_series), "Mean imputation failed for numeric data."
\ No newline at end of file
+    assert imputed_series.equals(expected_series), "Mean imputation failed for numeric data."
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet", ".feather"])
+def test_artifact_round_trip_in_chunks(tmp_path, suffix):
+    df = pd.DataFrame({
+        'lead_indicator': [1.0, 0.0, 1.0, 0.0],
+        'purchases': [0.25, 0.5, np.nan, 1.0],
+        'source': ['signup', 'signup', 'li', 'fb'],
+    })
+    path = tmp_path / f"data{suffix}"
+
+    with helpers.ArtifactWriter(path) as writer:
+        writer.write(df.iloc[:2])
+        writer.write(df.iloc[2:])
+
+    assert helpers.artifact_columns(path) == list(df.columns)
+    assert helpers.read_artifact(path).equals(df)
+    assert helpers.read_artifact(path, columns=['purchases']).equals(df[['purchases']])
+
+
+@pytest.mark.parametrize("suffix", [".parquet", ".feather"])
+def test_artifact_column_typed_by_first_chunk_with_values(tmp_path, suffix, monkeypatch):
+    path = tmp_path / f"data{suffix}"
+    chunks = [
+        pd.DataFrame({'purchases': [0.25, 0.5], 'customer_code': [np.nan, np.nan]}),
+        pd.DataFrame({'purchases': [1.0], 'customer_code': ['x']}),
+    ]
+    with helpers.ArtifactWriter(path) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+    data = helpers.read_artifact(path)
+    assert data['customer_code'].tolist()[2] == 'x'
+    assert data['customer_code'].isna().sum() == 2
+
+    # Past the limit the file is opened with the types known so far, and nulls stay null
+    monkeypatch.setattr(helpers, "PENDING_MAX_ROWS", 1)
+    with helpers.ArtifactWriter(path) as writer:
+        writer.write(chunks[0])
+        writer.write(chunks[0])
+    assert helpers.read_artifact(path)['customer_code'].isna().all()
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet", ".feather"])
+def test_append_artifact_keeps_column_order(tmp_path, suffix):
+    df = pd.DataFrame({'lead_id': [1, 2], 'purchases': [0.25, 0.5]})
+    path = tmp_path / f"data{suffix}"
+    helpers.write_artifact(df, path)
+
+    helpers.append_artifact(pd.DataFrame({'purchases': [1.0], 'lead_id': [3]}), path)
+
+    expected = pd.DataFrame({'lead_id': [1, 2, 3], 'purchases': [0.25, 0.5, 1.0]})
+    assert helpers.read_artifact(path).equals(expected)
+    assert list(tmp_path.iterdir()) == [path]
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_shared_training_buffers_match_in_memory_split(sparse):
+    X_train, _, y_train, _ = helpers.load_data()
+
+    with helpers.shared_data_dir() as shared_dir:
+        X_shared, _, y_shared, _ = helpers.load_data(
+            sparse=sparse, dtype="float32", shared_dir=shared_dir
+        )
+        dense = X_shared.toarray() if sparse else X_shared.to_numpy()
+
+        assert dense.dtype == np.float32
+        assert np.allclose(dense, X_train.to_numpy())
+        assert np.array_equal(y_shared, y_train.iloc[:, 0].to_numpy())
+        assert isinstance(y_shared, np.memmap)
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet"])
+def test_read_sparse_matches_dense_read(tmp_path, suffix):
+    X = pd.read_csv("tests/data/X.csv")
+    path = tmp_path / f"X{suffix}"
+    helpers.write_artifact(X, path)
+
+    matrix = helpers.read_sparse(path, "float32", chunksize=300)
+    assert matrix.format == "csr" and matrix.dtype == np.float32
+    assert np.array_equal(matrix.toarray(), X.to_numpy(dtype="float32"))
@@ -0,0 +1,82 @@
+import pandas as pd
+import pytest
+
+from itu_sdse_project.features import feature_dtypes
+from itu_sdse_project.helpers import write_artifact
+from itu_sdse_project.preprocessing import CAT_COLS, LABEL_COL, LeadPreprocessor, filter_rows
+from itu_sdse_project.synthetic import generate
+from itu_sdse_project.validation import validate
+
+
+@pytest.fixture
+def processed(tmp_path):
+    generate(10_000, tmp_path / "raw_data.csv")
+    rows = filter_rows(pd.read_csv(tmp_path / "raw_data.csv"))
+    preprocessor = LeadPreprocessor.from_data(rows)
+    cleaned = preprocessor.clean(rows)
+    preprocessor.fit_encoding(cleaned, CAT_COLS)
+    dtypes = feature_dtypes(tmp_path / "features.parquet")
+    X = preprocessor.encode(
+        cleaned, dummy_dtype=dtypes["dummy_dtype"], numeric_dtype=dtypes["numeric_dtype"]
+    )
+    y = cleaned[[LABEL_COL]].astype(dtypes["label_dtype"])
+    return preprocessor, X, y
+
+
+def with_value(frame: pd.DataFrame, row: int, value) -> pd.DataFrame:
+    frame = frame.copy()
+    frame.iloc[row, 0] = value
+    return frame
+
+
+def run(tmp_path, processed, X, y, suffix=".parquet"):
+    preprocessor = processed[0]
+    write_artifact(X, tmp_path / f"features{suffix}")
+    write_artifact(y, tmp_path / f"labels{suffix}")
+    dtypes = feature_dtypes(tmp_path / f"features{suffix}")
+    return validate(
+        tmp_path / f"features{suffix}", tmp_path / f"labels{suffix}", preprocessor, dtypes, 500
+    )
+
+
+def test_content_hashes_do_not_depend_on_row_order(tmp_path, processed):
+    _, X, y = processed
+    report = run(tmp_path, processed, X, y)
+    assert report["rows"] == len(X)
+    assert report["nulls"] == 0
+    assert sum(report["labels"].values()) == len(X)
+
+    order = X.sample(frac=1, random_state=0).index
+    shuffled = run(tmp_path, processed, X.loc[order], y.loc[order])
+    assert shuffled["rows_hash"] == report["rows_hash"]
+
+    # The features alone still match when labels move to other rows
+    relabelled = run(tmp_path, processed, X, y.loc[order])
+    assert relabelled["features_hash"] == report["features_hash"]
+    assert relabelled["rows_hash"] != report["rows_hash"]
+
+
+@pytest.mark.parametrize(
+    "corrupt, message",
+    [
+        (lambda X, y: (X.drop(columns=X.columns[-1]), y), "Feature columns differ"),
+        (lambda X, y: (X.astype("float64"), y), "Unexpected dtypes"),
+        (lambda X, y: (X, y.iloc[:-1]), r"feature rows but \d+ labels"),
+        (lambda X, y: (X, y.iloc[:500]), "more rows than"),
+        (lambda X, y: (with_value(X, 10, float("nan")), y), "Missing values"),
+        (lambda X, y: (X, with_value(y, 10, 2)), r"Labels \[2.0\]"),
+        (lambda X, y: (X.assign(**{X.columns[0]: X.iloc[:, 0] * 2}), y), "outside their ranges"),
+        (lambda X, y: (X, y * 0), "not binary"),
+    ],
+)
+def test_invalid_artifacts_fail(tmp_path, processed, corrupt, message):
+    _, X, y = processed
+    with pytest.raises(ValueError, match=message):
+        run(tmp_path, processed, *corrupt(X, y))
+
+
+def test_failures_name_the_first_bad_chunk(tmp_path, processed):
+    _, X, y = processed
+    X = with_value(X.astype("float64"), 1_200, 5.0)
+    with pytest.raises(ValueError, match="Rows 1000-1499"):
+        run(tmp_path, processed, X, y.astype("float64"), suffix=".csv")
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+from scipy import sparse
+from sklearn.linear_model import LogisticRegression
+
+from itu_sdse_project.modeling.wrapper import MLFlowWrapper, feature_schema
+from itu_sdse_project.preprocessing import DROPPED_COLS, LABEL_COL, LeadPreprocessor, filter_rows
+
+
+def _fitted_wrapper():
+    raw = pd.read_csv("tests/data/training_data.csv").drop("bin_source", axis=1)
+    for col in DROPPED_COLS:
+        raw[col] = 0
+    preprocessor = LeadPreprocessor.from_data(filter_rows(raw))
+    cleaned = preprocessor.clean(filter_rows(raw))
+    preprocessor.fit_encoding(cleaned)
+    features = preprocessor.encode(cleaned)
+    model = LogisticRegression(max_iter=1000).fit(features, cleaned[LABEL_COL].astype(int))
+    return MLFlowWrapper(model, preprocessor, feature_schema(features)), features, raw
+
+
+def test_features_are_matched_to_training_order_for_every_input_type():
+    wrapper, features, _ = _fitted_wrapper()
+    expected = wrapper.model.predict_proba(features)[:, 1]
+    shuffled = features[features.columns[::-1]].assign(lead_id=np.arange(len(features)))
+
+    inputs = {
+        "frame": features,
+        "shuffled frame": shuffled,
+        "array": features.to_numpy(),
+        "columns": {name: shuffled[name].to_numpy() for name in shuffled.columns},
+        "record batch": pa.RecordBatch.from_pandas(shuffled, preserve_index=False),
+    }
+    for name, model_input in inputs.items():
+        assert np.allclose(wrapper.predict(None, model_input), expected), name
+        chunked = wrapper.predict(None, model_input, params={"chunk_rows": 100})
+        assert np.allclose(chunked, expected), name
+
+
+def test_raw_records_are_preprocessed_in_chunks():
+    wrapper, _, raw = _fitted_wrapper()
+    records = raw.drop(LABEL_COL, axis=1)
+    expected = wrapper.model.predict_proba(wrapper.preprocessor.transform(records))[:, 1]
+
+    assert np.allclose(wrapper.predict(None, records, params={"chunk_rows": 250}), expected)
+
+
+def test_inputs_that_do_not_match_the_schema_are_rejected():
+    wrapper, features, _ = _fitted_wrapper()
+    wrapper.preprocessor = None
+
+    with pytest.raises(ValueError, match="missing features"):
+        wrapper.predict(None, features.iloc[:, 1:])
+    with pytest.raises(ValueError, match="must be numeric"):
+        wrapper.predict(None, features.astype({features.columns[0]: str}))
+    with pytest.raises(ValueError, match="shape"):
+        wrapper.predict(None, features.to_numpy()[:, 1:])
+
+
+def test_dense_and_sparse_features_log_the_same_schema():
+    X = pd.read_csv("tests/data/X.csv")
+    names = list(X.columns[::-1])
+    schema = feature_schema(X, names)
+    assert list(schema) == names
+    assert schema == feature_schema(sparse.csr_matrix(X.to_numpy()), names)